@@ -0,0 +1,274 @@
+from types import MappingProxyType
+
+try:
+    import numpy as np
+except ImportError: # NumPy is optional; the server falls back to the dictionary-based Room
+    np = None
+
+import protocol
+from room import Room, ROOM_CAPACITY # Importing room also puts shared/ on the import path
+import simulation
+from simulation import (DISPLAY_W, DISPLAY_H, CAR_WIDTH, CAR_HEIGHT, THING_WIDTH, THING_HEIGHT,
+                        START_X, START_Y, SPAWN_GAP, MULTIPLAYER_RULES)
+from snapshots import CHECKSUM_MASK, Snapshot, player_number, player_id_from_number
+
+# --- Array-Backed World ---
+# The same match rules as Room, but with the world stored as a structure of arrays: one
+# contiguous NumPy array per field instead of one small dictionary per obstacle or player.
+# Player and obstacle movement, scoring and the player x obstacle overlap test each run as a
+# single vectorized step over the whole room, and snapshots (obstacle checksum included) are
+# read straight from the arrays. Each obstacle that left the screen is respawned in place by
+# the simulation core's spawn_obstacle(), which is handed only the obstacles near the lanes
+# the spawn may try, so the arrays never grow or reallocate.
+# Obstacles come from the simulation core's seeded spawn stream, so an ArrayWorld and a
+# simulation.State with the same rules and seed see the same obstacles.
+
+
+class ArrayWorld:
+    """
+    Obstacles and player seats of one room, stored as parallel arrays.
+        obstacles: id, x, y, speed, img_index                    (one entry per obstacle)
+        players:   active, number, x, y, score, crashed, car_img,
+                   input_seq, input_x, input_y                   (one entry per seat)
+    """
+
+    def __init__(self, rules=MULTIPLAYER_RULES, seed=0, capacity=ROOM_CAPACITY):
+        """
+        Args:
+            rules (simulation.Rules): The rules to play by (edge crashes are not supported).
+            seed (int): Seed of the obstacle spawn stream.
+            capacity (int): Number of player seats.
+        """
+        if np is None:
+            raise RuntimeError("The array-backed world needs NumPy (pip install numpy)")
+        self.rules = rules
+        self.seed = seed
+        self.road_offset = 0
+        count = len(rules.obstacle_offsets)
+        self.obstacle_id_counter = 0 # Obstacles spawned so far; ids are spawn numbers
+        self.obstacle_id = np.zeros(count, dtype=np.int64)
+        self.obstacle_x = np.zeros(count, dtype=np.float64)
+        self.obstacle_y = np.zeros(count, dtype=np.float64)
+        self.obstacle_speed = np.zeros(count, dtype=np.int64)
+        self.obstacle_img = np.zeros(count, dtype=np.int64)
+        self.set_obstacles(range(count), simulation.new_game(seed, rules).obstacles)
+        self.obstacle_id_counter = count
+
+        self.player_slots = {} # {player_id: seat index}
+        self.player_active = np.zeros(capacity, dtype=bool)
+        self.player_number = np.zeros(capacity, dtype=np.int64)
+        self.player_x = np.zeros(capacity, dtype=np.float64)
+        self.player_y = np.zeros(capacity, dtype=np.float64)
+        self.player_score = np.zeros(capacity, dtype=np.int64)
+        self.player_crashed = np.zeros(capacity, dtype=bool)
+        self.player_car_img = np.zeros(capacity, dtype=np.int64)
+        self.player_input_seq = np.zeros(capacity, dtype=np.int64)
+        self.player_input_x = np.zeros(capacity, dtype=np.int64) # Held axes, -1..1
+        self.player_input_y = np.zeros(capacity, dtype=np.int64)
+
+    # --- Obstacles ---
+    def respawn_obstacles(self, indices):
+        """
+        Replaces the obstacles at `indices` with the next spawns of the stream, placed above the
+        screen clear of the others exactly as simulation.respawn_and_score() places them. Only
+        the obstacles near one of the lanes a spawn may try can be in its way, so only those
+        are handed to simulation.spawn_obstacle().
+        Args:
+            indices (ndarray): Positions in the obstacle arrays to refill, ascending.
+        """
+        reach = THING_WIDTH + SPAWN_GAP # simulation._in_the_way(): lanes further apart never meet
+        for index in indices.tolist():
+            self.obstacle_id_counter += 1
+            spawn = self.obstacle_id_counter
+            lanes = np.array(simulation.spawn_lanes(self.seed, spawn), dtype=np.float64)
+            near = np.flatnonzero((np.abs(self.obstacle_x[:, None] - lanes) < reach).any(axis=1))
+            obstacle = simulation.spawn_obstacle(self.rules, self.seed, spawn, -THING_HEIGHT, self.obstacles(near))
+            self.set_obstacles([index], [obstacle]) # Written at once, so the next spawn avoids it
+
+    def obstacles(self, indices=None):
+        """Returns the obstacles at `indices` (all when omitted) as simulation.Obstacle records, in array order."""
+        if indices is None:
+            indices = slice(None)
+        return list(map(simulation.Obstacle, self.obstacle_id[indices].tolist(), self.obstacle_x[indices].tolist(),
+                        self.obstacle_y[indices].tolist(), self.obstacle_speed[indices].tolist(),
+                        self.obstacle_img[indices].tolist()))
+
+    def set_obstacles(self, indices, obstacles):
+        """Writes simulation.Obstacle records into the arrays at `indices`."""
+        indices = list(indices)
+        self.obstacle_id[indices] = [obstacle.id for obstacle in obstacles]
+        self.obstacle_x[indices] = [obstacle.x for obstacle in obstacles]
+        self.obstacle_y[indices] = [obstacle.y for obstacle in obstacles]
+        self.obstacle_speed[indices] = [obstacle.speed for obstacle in obstacles]
+        self.obstacle_img[indices] = [obstacle.img_index for obstacle in obstacles]
+
+    # --- Players ---
+    def add_player(self, player_id, car_img_index):
+        """Seats a new player at the start position; returns the seat index."""
+        slot = int(np.flatnonzero(~self.player_active)[0])
+        self.player_slots[player_id] = slot
+        self.player_active[slot] = True
+        self.player_number[slot] = player_number(player_id)
+        self.player_car_img[slot] = car_img_index
+        self.player_input_seq[slot] = 0
+        self.player_input_x[slot] = 0
+        self.player_input_y[slot] = 0
+        self.reset_player(slot)
+        return slot
+
+    def remove_player(self, player_id):
+        slot = self.player_slots.pop(player_id)
+        self.player_active[slot] = False
+
+    def reset_player(self, slot):
+        self.player_x[slot] = START_X
+        self.player_y[slot] = START_Y
+        self.player_score[slot] = 0
+        self.player_crashed[slot] = False
+
+    # --- Simulation ---
+    # The phases of simulation.step(), each one vectorized over the whole room. step() runs
+    # them in order; ArrayRoom calls them one by one to time each.
+    def step(self):
+        """
+        Advances the world by one tick.
+        Returns:
+            ndarray: Seat indices of the players who crashed during this tick.
+        """
+        self.move_players()
+        self.move_obstacles()
+        self.respawn_and_score()
+        crashed_now = self.detect_collisions()
+        self.advance_road()
+        return crashed_now
+
+    def move_players(self):
+        """Moves every racing player by their held input."""
+        racing = self.player_active & ~self.player_crashed
+        step = self.rules.player_speed * self.rules.speed_scale
+        self.player_x = np.where(racing, np.clip(self.player_x + self.player_input_x * step, 0, DISPLAY_W - CAR_WIDTH),
+                                 self.player_x)
+        self.player_y = np.where(racing, np.clip(self.player_y + self.player_input_y * step, 0, DISPLAY_H - CAR_HEIGHT),
+                                 self.player_y)
+
+    def move_obstacles(self):
+        self.obstacle_y += self.obstacle_speed * self.rules.speed_scale
+
+    def respawn_and_score(self):
+        """Respawns the obstacles that left the screen and scores them for every player still racing."""
+        passed = np.flatnonzero(self.obstacle_y > DISPLAY_H)
+        if len(passed):
+            self.player_score[self.player_active & ~self.player_crashed] += len(passed)
+            self.respawn_obstacles(passed)
+
+    def detect_collisions(self):
+        """
+        Marks every racing player whose car overlaps an obstacle as crashed.
+        Returns:
+            ndarray: Seat indices of the players who crashed now.
+        """
+        # Player x obstacle AABB overlap matrix, one row per seat
+        player_x = self.player_x[:, None]
+        player_y = self.player_y[:, None]
+        overlap = ((player_x < self.obstacle_x + THING_WIDTH) &
+                   (player_x + CAR_WIDTH > self.obstacle_x) &
+                   (player_y < self.obstacle_y + THING_HEIGHT) &
+                   (player_y + CAR_HEIGHT > self.obstacle_y))
+        crashed_now = self.player_active & ~self.player_crashed & overlap.any(axis=1)
+        self.player_crashed |= crashed_now
+        return np.flatnonzero(crashed_now)
+
+    def advance_road(self):
+        self.road_offset = (self.road_offset + self.rules.road_speed * self.rules.speed_scale) % DISPLAY_H
+
+    def obstacle_checksum(self, tick):
+        """simulation.obstacle_checksum() of the obstacles, hashed straight from the arrays."""
+        fields = np.column_stack((self.obstacle_id,
+                                  self.obstacle_x.astype(np.int64), # Truncates toward zero, like int()
+                                  self.obstacle_y.astype(np.int64),
+                                  self.obstacle_speed,
+                                  self.obstacle_img))
+        return simulation.checksum_fields(simulation.mix64(self.seed ^ tick), fields.ravel().tolist())
+
+    def capture_snapshot(self, seq, tick, game_active):
+        """Builds a Snapshot directly from the arrays (same layout as snapshots.capture_snapshot)."""
+        checksum = self.obstacle_checksum(tick)
+        active = self.player_active
+        players = dict(zip(
+            self.player_number[active].tolist(),
+            zip(np.rint(self.player_x[active]).astype(np.int64).tolist(),
+                np.rint(self.player_y[active]).astype(np.int64).tolist(),
+                self.player_score[active].tolist(),
+                self.player_crashed[active].tolist(),
+                self.player_car_img[active].tolist(),
+                self.player_input_seq[active].tolist())
+        ))
+        return Snapshot(seq, tick, bool(game_active), checksum & CHECKSUM_MASK, MappingProxyType(players))
+
+
+class ArrayRoom(Room):
+    """
+    A Room whose world is an ArrayWorld instead of a simulation.State. Inputs are stored in
+    the world's arrays, so player_inputs stays empty.
+    """
+
+    def spawn_initial_obstacles(self):
+        self.world = ArrayWorld(self.rules, self.seed)
+
+    def create_player(self, player_id, car_img_index):
+        self.world.add_player(player_id, car_img_index)
+
+    def delete_player(self, player_id):
+        self.world.remove_player(player_id)
+
+    def store_input(self, player_id, seq, x_axis, y_axis):
+        world = self.world
+        slot = world.player_slots.get(player_id) # Player may already be gone
+        if slot is not None and seq > world.player_input_seq[slot]:
+            world.player_input_seq[slot] = seq
+            world.player_input_x[slot] = x_axis
+            world.player_input_y[slot] = y_axis
+
+    def hold_still(self, player_id):
+        slot = self.world.player_slots.get(player_id)
+        if slot is not None:
+            self.world.player_input_x[slot] = 0
+            self.world.player_input_y[slot] = 0
+
+    def running_score(self, player_id):
+        slot = self.world.player_slots.get(player_id)
+        if slot is None or self.world.player_crashed[slot]:
+            return None
+        return int(self.world.player_score[slot])
+
+    def reset_player(self, player_id):
+        slot = self.world.player_slots.get(player_id)
+        if slot is not None:
+            print(f"Player {player_id} requested reset.")
+            self.world.reset_player(slot)
+
+    def update_game_state(self):
+        """
+        Advances the match by one tick: the world's vectorized phases, run one at a time so each
+        is timed under the same name as in Room.
+        """
+        world = self.world
+        timer = self.phase_timer
+        timer.start()
+        world.move_players()
+        timer.lap('input')
+        world.move_obstacles()
+        timer.lap('obstacles')
+        world.respawn_and_score()
+        timer.lap('respawn_scoring')
+        for slot in world.detect_collisions():
+            player_id = player_id_from_number(world.player_number[slot])
+            print(f"Room {self.room_id}: player {player_id} crashed!")
+            self.send_event(protocol.EVENT_PLAYER_CRASHED, player_id)
+            self.record_score(player_id, int(world.player_score[slot]))
+        timer.lap('collision')
+        world.advance_road()
+        self.tick += 1
+
+    def capture_snapshot(self, seq):
+        return self.world.capture_snapshot(seq, self.tick, self.game_state['game_active'])
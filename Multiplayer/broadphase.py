@@ -0,0 +1,96 @@
+# --- Collision Broadphase ---
+# Checking every player against every obstacle costs players x obstacles AABB tests per tick.
+# The broadphase buckets obstacles into a uniform grid of lanes (columns) and rows, so a player
+# only has to be tested against the obstacles sharing one of the cells its box covers. Entries
+# are updated incrementally: an obstacle moving inside its cells costs nothing, and only a
+# crossing into a new row (or a respawn) touches the buckets.
+
+CELL_WIDTH = 160   # Lane width in pixels (about two car widths)
+CELL_HEIGHT = 160  # Row height in pixels (a bit more than one car length)
+
+
+class SpatialHash:
+    """
+    Uniform grid over the road, mapping each cell to the entities whose box overlaps it.
+    Usage:
+        index = SpatialHash()
+        index.insert(obstacle_id, obstacle, x, y, w, h)
+        index.move(obstacle_id, x, new_y)
+        for obstacle in index.query(px, py, pw, ph): narrowphase(obstacle)
+    """
+
+    def __init__(self, cell_width=CELL_WIDTH, cell_height=CELL_HEIGHT):
+        self.cell_width = cell_width
+        self.cell_height = cell_height
+        self._cells = {}    # {(column, row): {key: entity}}
+        self._entries = {}  # {key: (entity, width, height, (column range, row range))}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _cell_range(self, x, y, w, h):
+        """Returns the inclusive (first column, last column, first row, last row) a box covers."""
+        return (int(x // self.cell_width), int((x + w) // self.cell_width),
+                int(y // self.cell_height), int((y + h) // self.cell_height))
+
+    def _link(self, key, entity, cells):
+        col0, col1, row0, row1 = cells
+        for column in range(col0, col1 + 1):
+            for row in range(row0, row1 + 1):
+                bucket = self._cells.get((column, row))
+                if bucket is None:
+                    bucket = self._cells[(column, row)] = {}
+                bucket[key] = entity
+
+    def _unlink(self, key, cells):
+        col0, col1, row0, row1 = cells
+        for column in range(col0, col1 + 1):
+            for row in range(row0, row1 + 1):
+                bucket = self._cells[(column, row)]
+                del bucket[key]
+                if not bucket:
+                    del self._cells[(column, row)] # Keep the grid as sparse as the road
+
+    def insert(self, key, entity, x, y, w, h):
+        """
+        Adds an entity with its bounding box.
+        Args:
+            key (hashable): Unique key of the entity (e.g. the obstacle id).
+            entity (object): Returned by query() for boxes that share a cell with it.
+            x, y, w, h (float): The entity's bounding box.
+        """
+        cells = self._cell_range(x, y, w, h)
+        self._entries[key] = (entity, w, h, cells)
+        self._link(key, entity, cells)
+
+    def move(self, key, x, y):
+        """Updates an entity's position; the buckets are only touched when it changes cells."""
+        entity, w, h, old_cells = self._entries[key]
+        cells = self._cell_range(x, y, w, h)
+        if cells == old_cells:
+            return
+        self._unlink(key, old_cells)
+        self._link(key, entity, cells)
+        self._entries[key] = (entity, w, h, cells)
+
+    def remove(self, key):
+        """Removes an entity; unknown keys are ignored."""
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._unlink(key, entry[3])
+
+    def query(self, x, y, w, h):
+        """
+        Returns:
+            list: Every entity sharing at least one cell with the box (each entity once).
+                These are candidates only; the caller still runs the exact overlap test.
+        """
+        col0, col1, row0, row1 = self._cell_range(x, y, w, h)
+        cells = self._cells
+        found = {}
+        for column in range(col0, col1 + 1):
+            for row in range(row0, row1 + 1):
+                bucket = cells.get((column, row))
+                if bucket:
+                    found.update(bucket)
+        return list(found.values())
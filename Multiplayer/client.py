@@ -1,14 +1,37 @@
 import pygame
+import os
 import time
-import random
-import json
 import socket
 import threading
 import sys # Import sys for a cleaner exit
+import argparse
+import getpass
+from collections import deque
+
+# Images, sounds and the asset loader are shared with the single-player game
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'shared'))
+
+import protocol
+from assets import Assets
+import udp
+from interpolation import SnapshotBuffer, INTERPOLATION_DELAY
+from obstaclestream import ObstacleStream
+from prediction import LocalPredictor
+from render import GameRenderer, get_font, render_text
+from sessions import RECONNECT_GRACE
+from snapshots import SnapshotHistory, snapshot_to_game_state
 
 # --- Client Configuration ---
 HOST = '127.0.0.1'  # The server's hostname or IP address
 PORT = 65432        # The port used by the server
+interpolation_delay = INTERPOLATION_DELAY # Seconds obstacles and other cars are drawn in the past (set with --interp-delay)
+INPUT_SEND_RATE = 30 # Held-input packets sent to the server per second
+frame_rate = 60      # Frames drawn per second at most (set with --fps, e.g. 144)
+use_udp = False      # Ask the server for a UDP data channel (set with --udp)
+player_name = ''     # Name on the server's leaderboard (set with --name)
+LEADERBOARD_ROWS = 10 # Leaderboard entries shown on the crash screen
+udp_link = None      # udp.LinkSimulator for outgoing datagrams (set with --sim-loss/--sim-latency)
+RECONNECT_ATTEMPT_INTERVAL = 0.5 # Seconds between attempts to get back in after the connection dropped
 
 # --- Pygame Initialization ---
 pygame.init()
@@ -31,27 +54,13 @@ BRIGHT_RED = (255, 0, 0)
 WHITE = (255, 255, 255)
 BLUE = (0, 0, 255) # Added for placeholder
 
-# --- Game Assets (User must provide these files in 'image/' and 'sound/' directories) ---
-# IMPORTANT: The user needs to ensure these files exist in the specified paths.
-# If they don't exist, Pygame will raise an error, and placeholders will be used.
+# --- Game Assets (loaded and cached by shared/assets.py) ---
+assets = Assets()
 try:
-    IMG_ROAD = pygame.image.load('image/road.jpg').convert_alpha()
-    PLAYER_CAR_IMG = pygame.image.load('image/1.png').convert_alpha() # Image for this client's car
-    # Images for other players' cars and obstacles
-    OTHER_CAR_IMGS = [
-        pygame.image.load('image/2.png').convert_alpha(),
-        pygame.image.load('image/3.png').convert_alpha(),
-        pygame.image.load('image/4.png').convert_alpha(),
-        pygame.image.load('image/5.png').convert_alpha(),
-        pygame.image.load('image/6.png').convert_alpha()
-    ]
-
-    CRASH_SOUND = pygame.mixer.Sound("sound/crash.wav")
-    pygame.mixer.music.load("sound/jazz.wav")
-    SOUNDS_LOADED = True
-except pygame.error as e:
-    print(f"Warning: Could not load game assets. Please ensure 'image/' and 'sound/' directories exist with the required files. Error: {e}")
-    SOUNDS_LOADED = False
+    IMG_ROAD = assets.image('road.jpg')
+    PLAYER_CAR_IMG, *OTHER_CAR_IMGS = assets.cars() # This client's car, then other players' cars and obstacles
+except (pygame.error, FileNotFoundError) as e:
+    print(f"Warning: Could not load game images from shared/image/. Error: {e}")
     # Create placeholder surfaces if images fail to load
     IMG_ROAD = pygame.Surface((DISPLAY_W, DISPLAY_H))
     IMG_ROAD.fill(GREY)
@@ -74,65 +83,343 @@ pause = False           # Flag for pausing the game
 
 # --- Network Communication ---
 client_socket = None    # Socket object for communication with the server
+session_token = 0       # From the welcome; a reconnect sends it to get the same player, car and score back
+reconnecting = False    # True while the receive thread is getting back in after a drop; nothing is sent meanwhile
+frame_decoder = protocol.FrameDecoder() # Reassembles length-prefixed frames from the socket stream
 state_lock = threading.Lock() # Lock for thread-safe access to current_game_state
+received_snapshots = SnapshotHistory() # Recent snapshots, needed to apply delta updates
+snapshot_buffer = None  # Timestamped snapshots for smooth rendering; created once the tick rate is known
+obstacle_stream = None  # Generates the obstacles from the room seed; created with the snapshot buffer
+input_seq = 0           # Sequence number of the last held-input packet sent
+predictor = LocalPredictor() # Predicts our own car from local input between server snapshots
+receive_lock = threading.Lock() # Serializes frame handling between the TCP and UDP receive threads
+applied_snapshot_seq = 0 # Newest snapshot expanded into current_game_state (UDP may reorder)
+leaderboard_page = None # (offset, total, entries) of the last leaderboard page received
+
+# --- UDP Data Channel (optional, see udp.py) ---
+udp_socket = None       # Datagram socket, created when the server offers a channel
+udp_server_addr = None  # Server address datagrams go to and must come from
+udp_token = None        # Session token from the offer
+udp_bound = False       # True once the server confirmed the bind; snapshots and inputs then use UDP
+udp_reliable = udp.ReliableChannel() # Commands sent over UDP, resent until acknowledged
+udp_lock = threading.Lock() # Guards udp_reliable, used from the game loop and the UDP thread
+recent_inputs = deque(maxlen=udp.INPUT_REDUNDANCY) # Newest input frames, repeated in every input datagram
+
+def handle_frames(frames):
+    """
+    Applies frames received from the server over TCP or UDP.
+    Decodes snapshot frames and updates the client's `current_game_state`.
+    Args:
+        frames (list): (msg_type, payload) tuples.
+    """
+    global current_game_state, applied_snapshot_seq, leaderboard_page
+    with receive_lock:
+        # Every snapshot is a delta against a baseline we acknowledged earlier, so each one is
+        # decoded, but only the newest one in this batch is expanded for rendering and acked.
+        latest_snapshot = None
+        new_snapshots = []
+        for msg_type, payload in frames:
+            if msg_type == protocol.MSG_SNAPSHOT:
+                baseline_seq = protocol.snapshot_baseline_seq(payload)
+                baseline = received_snapshots.get(baseline_seq)
+                if baseline_seq and baseline is None:
+                    continue # Baseline already evicted; the server falls back to a full snapshot
+                snapshot = protocol.decode_snapshot(payload, baseline)
+                received_snapshots.add(snapshot)
+                new_snapshots.append(snapshot)
+                if latest_snapshot is None or snapshot.seq > latest_snapshot.seq:
+                    latest_snapshot = snapshot
+            elif msg_type == protocol.MSG_EVENT:
+                event, player_id = protocol.decode_event(payload)
+                if event == protocol.EVENT_PLAYER_JOINED and player_id != client_player_id:
+                    print(f"{player_id} joined the match.")
+                elif event == protocol.EVENT_PLAYER_LEFT:
+                    print(f"{player_id} left the match.")
+                elif event == protocol.EVENT_PLAYER_CRASHED:
+                    print(f"{player_id} crashed.")
+            elif msg_type == protocol.MSG_LEADERBOARD:
+                leaderboard_page = protocol.decode_leaderboard(payload)
+            elif msg_type == protocol.MSG_UDP_OFFER:
+                token, port = protocol.decode_udp_offer(payload)
+                if use_udp:
+                    start_udp(token, port)
+            elif msg_type == protocol.MSG_REJECT:
+                print(f"Server closed the session: {protocol.decode_reject(payload)}")
+
+        if new_snapshots:
+            # Generate the obstacles up to the new snapshots before the renderer can ask for them.
+            # After joining a running match that means simulating every tick since it started,
+            # so it runs outside state_lock; the lock is only held to swap the result in.
+            caught_up = obstacle_stream.catch_up(max(snapshot.tick for snapshot in new_snapshots) + 1)
+            with state_lock:
+                obstacle_stream.extend(caught_up)
+                for snapshot in new_snapshots:
+                    snapshot_buffer.add(snapshot) # Every snapshot is an interpolation keyframe
+
+        if latest_snapshot is not None and latest_snapshot.seq > applied_snapshot_seq:
+            applied_snapshot_seq = latest_snapshot.seq
+            new_state = snapshot_to_game_state(latest_snapshot)
+            own_state = new_state['players'].get(client_player_id)
+            with state_lock:
+                current_game_state = new_state
+                if not obstacle_stream.verify(latest_snapshot.tick, latest_snapshot.obstacle_checksum):
+                    print(f"Obstacles out of sync with the server at tick {latest_snapshot.tick} "
+                          f"({obstacle_stream.desyncs} times so far).")
+                if own_state:
+                    # Correct the predicted car and replay the inputs the server has not seen yet
+                    predictor.reconcile(own_state['x'], own_state['y'], own_state['input_seq'], own_state['crashed'])
+            # Tell the server this snapshot can be used as the baseline for the next deltas
+            if udp_bound:
+                send_datagram(udp.DGRAM_DATA, protocol.encode_ack(latest_snapshot.seq))
+            else:
+                client_socket.sendall(protocol.encode_ack(latest_snapshot.seq))
 
-def receive_data():
+def receive_data(initial_frames=()):
     """
-    Receives game state updates from the server in a separate thread.
-    Parses JSON data and updates the client's `current_game_state`.
+    Receives frames from the server's TCP stream in a separate thread.
+    Args:
+        initial_frames (list): Frames already read from the socket during the handshake.
     """
-    global current_game_state, game_running, client_player_id
+    global game_running
+    frames = list(initial_frames)
     while game_running:
         try:
-            # Receive data (up to 4096 bytes)
-            data = client_socket.recv(4096).decode('utf-8')
+            handle_frames(frames)
+
+            data = client_socket.recv(65536)
             if not data:
-                print("Server disconnected.")
-                game_running = False
-                break
-            
-            with state_lock:
-                current_game_state = json.loads(data)
-                # Note: client_player_id is set in the main block after initial connection.
-                # This thread just continuously updates the game state.
+                raise ConnectionError("server closed the connection")
+            frames = frame_decoder.feed(data)
 
         except socket.error as e:
-            print(f"Socket error during receive: {e}")
+            if not game_running:
+                break # Closed by quit_game
+            print(f"Connection lost ({e}); reconnecting...")
+            frames = reconnect()
+            if frames is None:
+                game_running = False
+                break
+        except protocol.ProtocolError as e:
+            # The stream is no longer in sync with the frame boundaries; nothing after this can be trusted.
+            print(f"Protocol error: {e}")
             game_running = False
             break
-        except json.JSONDecodeError as e:
-            # This can happen if multiple JSONs are concatenated or a partial JSON is received.
-            # In a real game, you'd use a more robust message framing protocol (e.g., prefixing with length).
-            print(f"JSON decode error: {e}, Data: {data[:200]}...")
         except Exception as e:
             print(f"Unexpected error in receive_data: {e}")
             game_running = False
             break
 
-def send_input(x_change=0, y_change=0, command=None):
+def handshake(token=0):
+    """
+    Connects to the server, sends the hello and waits for the server's first frame, which is
+    either a welcome carrying our player ID or a rejection.
+    Args:
+        token (int): Session token of an earlier welcome, to get the same player back after a drop.
+    Returns:
+        tuple: (socket, its FrameDecoder, frames received so far; the welcome or rejection first)
+    Raises:
+        OSError: If the server cannot be reached or closes the connection during the handshake.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        sock.connect((HOST, PORT))
+        # A reconnect stays on TCP: the old UDP channel went with the old connection
+        flags = protocol.HELLO_FLAG_UDP if use_udp and not token else 0
+        sock.sendall(protocol.encode_hello(flags, player_name, token))
+        decoder = protocol.FrameDecoder()
+        frames = []
+        while not frames:
+            data = sock.recv(4096)
+            if not data:
+                raise ConnectionError("Server closed the connection during the handshake")
+            frames = decoder.feed(data)
+    except (OSError, protocol.ProtocolError):
+        sock.close()
+        raise
+    return sock, decoder, frames
+
+def start_match(welcome):
+    """Sets the client up for the match of a decoded welcome: our ID, the room's obstacles and the render buffer."""
+    global client_player_id, session_token, obstacle_stream, snapshot_buffer, received_snapshots, applied_snapshot_seq
+    _, client_player_id, server_tick_rate, room_seed, session_token, _ = welcome
+    with receive_lock, state_lock:
+        obstacle_stream = ObstacleStream(room_seed, server_tick_rate)
+        snapshot_buffer = SnapshotBuffer(server_tick_rate, obstacle_stream, delay=interpolation_delay)
+        received_snapshots = SnapshotHistory()
+        applied_snapshot_seq = 0
+    return server_tick_rate
+
+def reconnect():
+    """
+    Gets back into the match after the connection dropped, by reconnecting with our session
+    token until the server's grace period is over. A resumed session keeps our player, car and
+    score; the server sends a full snapshot right behind the welcome, so one round trip after
+    the hello we are in sync again. If the seat is gone, we join as a new player.
+    Returns:
+        list or None: Frames received after the welcome, or None if we could not get back in.
+    """
+    global client_socket, frame_decoder, reconnecting, udp_bound
+    reconnecting = True
+    client_socket.close()
+    if udp_socket:
+        udp_socket.close() # Its thread stops on the next receive; TCP carries everything from now on
+    udp_bound = False
+    give_up_at = time.monotonic() + RECONNECT_GRACE
+    while game_running and time.monotonic() < give_up_at:
+        started = time.monotonic()
+        try:
+            sock, decoder, frames = handshake(session_token)
+        except (OSError, protocol.ProtocolError) as e:
+            print(f"Reconnect failed ({e}); retrying...")
+            time.sleep(RECONNECT_ATTEMPT_INTERVAL)
+            continue
+        msg_type, payload = frames[0]
+        if msg_type != protocol.MSG_WELCOME:
+            sock.close()
+            print(f"Reconnect rejected: {protocol.decode_reject(payload) if msg_type == protocol.MSG_REJECT else msg_type}")
+            return None
+        welcome = protocol.decode_welcome(payload)
+        client_socket, frame_decoder = sock, decoder
+        if welcome[5] & protocol.WELCOME_FLAG_RESUMED:
+            print(f"Reconnected as {client_player_id} in {(time.monotonic() - started) * 1000:.0f} ms.")
+        else:
+            start_match(welcome)
+            print(f"Our seat was given up; rejoined as {client_player_id}.")
+        reconnecting = False
+        return frames[1:]
+    print("Could not reconnect to the server.")
+    return None
+
+def start_udp(token, port):
+    """Opens the UDP socket for an offered channel and starts binding it in a separate thread."""
+    global udp_socket, udp_server_addr, udp_token
+    if udp_socket is not None:
+        return # Already offered once
+    udp_token = token
+    udp_server_addr = (client_socket.getpeername()[0], port)
+    udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    udp_thread = threading.Thread(target=udp_receive)
+    udp_thread.daemon = True
+    udp_thread.start()
+
+def send_datagram(kind, body=b''):
+    """Sends one datagram on the UDP channel, through the link simulator if one is set."""
+    data = udp.encode_datagram(kind, udp_token, body)
+    try:
+        if udp_link:
+            udp_link.send(udp_socket.sendto, data, udp_server_addr)
+        else:
+            udp_socket.sendto(data, udp_server_addr)
+    except OSError as e:
+        print(f"Socket error during datagram send: {e}")
+
+def udp_receive():
+    """
+    Binds the UDP channel, then receives snapshots and events from it and resends
+    unacknowledged commands. If the bind never succeeds, TCP keeps carrying everything.
+    """
+    global udp_bound
+    udp_socket.settimeout(udp.RESEND_INTERVAL / 2)
+    bind_attempts = 0
+    next_bind_time = 0.0
+    while game_running:
+        now = time.monotonic()
+        if not udp_bound:
+            if bind_attempts >= udp.BIND_ATTEMPTS:
+                print("UDP channel could not be bound; staying on TCP.")
+                return
+            if now >= next_bind_time:
+                send_datagram(udp.DGRAM_BIND)
+                bind_attempts += 1
+                next_bind_time = now + udp.BIND_INTERVAL
+        else:
+            with udp_lock:
+                resends = udp_reliable.due_resends()
+            for body in resends:
+                send_datagram(udp.DGRAM_RELIABLE, body)
+
+        try:
+            data, addr = udp_socket.recvfrom(65536)
+        except socket.timeout:
+            continue
+        except OSError:
+            return # Socket closed on exit
+        if addr != udp_server_addr:
+            continue
+        try:
+            kind, token, body = udp.decode_datagram(data)
+            if token != udp_token:
+                continue
+            if kind == udp.DGRAM_BIND_ACK:
+                if not udp_bound:
+                    udp_bound = True
+                    print("UDP channel bound; snapshots and inputs now travel over UDP.")
+            elif kind == udp.DGRAM_DATA:
+                handle_frames(udp.decode_frames(body))
+            elif kind == udp.DGRAM_RELIABLE:
+                with udp_lock:
+                    ack, frames = udp_reliable.accept(body)
+                send_datagram(udp.DGRAM_RELIABLE_ACK, ack)
+                if frames is not None:
+                    handle_frames(udp.decode_frames(frames))
+            elif kind == udp.DGRAM_RELIABLE_ACK:
+                with udp_lock:
+                    udp_reliable.acknowledge(body)
+        except protocol.ProtocolError as e:
+            print(f"Bad datagram from server: {e}") # Unlike on TCP, one bad datagram does not desync the rest
+
+def send_input(x_axis=0, y_axis=0, command=None):
     """
-    Sends player movement input or commands to the server.
+    Sends the held movement input or a command to the server.
+    Held input is a state, not a step: the server moves the car by it on every tick until a
+    newer input (higher sequence number) replaces it.
     Args:
-        x_change (int): Change in X-coordinate.
-        y_change (int): Change in Y-coordinate.
-        command (str, optional): A specific command string (e.g., 'reset_player').
+        x_axis (int): -1 steering left, 1 steering right, 0 neither.
+        y_axis (int): -1 moving up, 1 moving down, 0 neither.
+        command (int, optional): A protocol command id (e.g., protocol.CMD_RESET_PLAYER).
     """
-    if client_socket and client_player_id: # Ensure we have a socket and our ID before sending
+    global input_seq
+    if client_socket and client_player_id and not reconnecting: # Ensure we have a socket and our ID before sending
         try:
-            message_data = {}
             if command:
-                message_data['command'] = command
+                if udp_bound:
+                    with udp_lock:
+                        body = udp_reliable.wrap(protocol.encode_command(command))
+                    send_datagram(udp.DGRAM_RELIABLE, body)
+                else:
+                    client_socket.sendall(protocol.encode_command(command))
             else:
-                message_data['x_change'] = x_change
-                message_data['y_change'] = y_change
-            client_socket.sendall(json.dumps(message_data).encode('utf-8'))
+                input_seq += 1
+                with state_lock:
+                    predictor.record_input(input_seq, x_axis, y_axis, time.monotonic())
+                frame = protocol.encode_input(input_seq, x_axis, y_axis)
+                if udp_bound:
+                    # Repeat the last few inputs so a lost datagram costs nothing; the server skips stale ones
+                    recent_inputs.append(frame)
+                    send_datagram(udp.DGRAM_DATA, b''.join(recent_inputs))
+                else:
+                    client_socket.sendall(frame)
         except socket.error as e:
-            print(f"Socket error during send: {e}")
-            global game_running
-            game_running = False
+            if not reconnecting: # Otherwise the receive thread is already getting back in
+                print(f"Socket error during send: {e}")
+                global game_running
+                game_running = False
         except Exception as e:
             print(f"Error sending input/command: {e}")
 
+def request_leaderboard(offset=0, count=LEADERBOARD_ROWS):
+    """Asks the server for a page of its leaderboard; the reply lands in `leaderboard_page`."""
+    frame = protocol.encode_leaderboard_request(offset, count)
+    try:
+        if udp_bound:
+            with udp_lock:
+                body = udp_reliable.wrap(frame)
+            send_datagram(udp.DGRAM_RELIABLE, body)
+        elif client_socket:
+            client_socket.sendall(frame)
+    except socket.error as e:
+        print(f"Socket error during send: {e}")
+
 # --- Pygame Utility Functions ---
 def text_objects(text, font, color=BLACK):
     """Renders text into a surface and its rectangle."""
@@ -141,7 +428,7 @@ def text_objects(text, font, color=BLACK):
 
 def message_display(text, color=BLACK):
     """Displays a large message in the center of the screen."""
-    largetext = pygame.font.Font('freesansbold.ttf', 115)
+    largetext = get_font('freesansbold.ttf', 115)
     textsurf, textrect = text_objects(text, largetext, color)
     textrect.center = ((DISPLAY_W / 2), (DISPLAY_H / 2))
     gameD.blit(textsurf, textrect)
@@ -169,8 +456,8 @@ def button(msg, x, y, w, h, ic, ac, action=None):
     else:
         pygame.draw.rect(gameD, ic, (x, y, w, h))
 
-    smallText = pygame.font.SysFont("comicsansms", 20)
-    textSurf, textRect = text_objects(msg, smallText)
+    textSurf = render_text(msg, "comicsansms", 20, BLACK)
+    textRect = textSurf.get_rect()
     textRect.center = ((x + (w / 2)), (y + (h / 2)))
     gameD.blit(textSurf, textRect)
 
@@ -179,42 +466,56 @@ def quit_game():
     global game_running
     game_running = False # Signal other threads to stop
     if client_socket:
+        try:
+            client_socket.sendall(protocol.encode_command(protocol.CMD_LEAVE)) # Free our seat now, not after the grace period
+        except socket.error:
+            pass
         client_socket.close() # Close the socket
+    if udp_socket:
+        udp_socket.close()
     pygame.quit()
     sys.exit() # Use sys.exit() for a clean exit
 
 def unpause():
     """Unpauses the game and resumes music."""
     global pause
-    if SOUNDS_LOADED:
-        pygame.mixer.music.unpause()
+    assets.unpause_music()
     pause = False
 
 def crashed_screen():
     """Displays the 'You Crashed' screen and handles play/quit options."""
-    global game_running, pause
+    global game_running, pause, leaderboard_page
     
-    if SOUNDS_LOADED:
-        pygame.mixer.music.stop()
-        pygame.mixer.Sound.play(CRASH_SOUND)
+    assets.stop_music()
+    assets.play_sound('crash.wav') # Loaded on the first crash
     gameD.fill(YELLOW)
 
-    largeText = pygame.font.SysFont("comicsansms", 115)
+    largeText = get_font("comicsansms", 115)
     TextSurf, TextRect = text_objects("You Crashed", largeText)
     TextRect.center = ((DISPLAY_W / 2), (DISPLAY_H / 2))
     gameD.blit(TextSurf, TextRect)
 
+    # If the server keeps a leaderboard, the run just ended is on it already; show its top
+    leaderboard_page = None
+    request_leaderboard()
+    shown_page = None
+
     exit_crashed_screen = False # Flag to exit this screen's loop
 
     while not exit_crashed_screen:
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 quit_game()
+
+        page = leaderboard_page
+        if page is not None and page is not shown_page and page[1]: # page[1]: players ranked
+            shown_page = page
+            draw_leaderboard(page)
             
         # Action for the "Play Again" button
         def play_again_action():
             nonlocal exit_crashed_screen
-            send_input(command='reset_player') # Tell server to reset our player
+            send_input(command=protocol.CMD_RESET_PLAYER) # Tell server to reset our player
             pause = False # Ensure game is not paused when resuming
             exit_crashed_screen = True # Set flag to exit this screen
 
@@ -226,18 +527,26 @@ def crashed_screen():
 
     # After exiting this loop, control returns to the main game_loop
 
+def draw_leaderboard(page):
+    """Draws a leaderboard page (offset, total, entries) in the top left corner."""
+    offset, total, entries = page
+    lines = [f"LEADERBOARD ({total} players)"] + [
+        f"{offset + rank}. {name}  {best}" for rank, (name, best, games, total_score) in enumerate(entries, 1)
+    ]
+    for row, line in enumerate(lines):
+        gameD.blit(render_text(line, None, 25, BLACK), (20, 20 + row * 25))
+
 def paused_screen():
     """Displays the 'Paused' screen and handles continue/quit options."""
     global pause
-    if SOUNDS_LOADED:
-        pygame.mixer.music.pause()
+    assets.pause_music()
     while pause:
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 quit_game()
 
         gameD.fill(YELLOW)
-        largeText = pygame.font.SysFont("comicsansms", 115)
+        largeText = get_font("comicsansms", 115)
         TextSurf, TextRect = text_objects("Paused", largeText)
         TextRect.center = ((DISPLAY_W / 2), (DISPLAY_H / 2))
         gameD.blit(TextSurf, TextRect)
@@ -257,7 +566,7 @@ def game_intro():
                 quit_game()
             
         gameD.fill(YELLOW)
-        largeText = pygame.font.SysFont("comicsansms", 115)
+        largeText = get_font("comicsansms", 115)
         TextSurf, TextRect = text_objects("Watch Out!", largeText)
         TextRect.center = ((DISPLAY_W / 2), (DISPLAY_H / 2))
         gameD.blit(TextSurf, TextRect)
@@ -269,53 +578,6 @@ def game_intro():
         pygame.display.update()
         clock.tick(60)
 
-# --- Game Rendering Functions ---
-def draw_road(roady):
-    """Draws the road background, creating a continuous scrolling effect."""
-    gameD.blit(IMG_ROAD, (0, roady))
-    gameD.blit(IMG_ROAD, (0, roady - DISPLAY_H)) # Draw a second image above for seamless scrolling
-
-def draw_player_car(x, y):
-    """Draws this client's player car."""
-    gameD.blit(PLAYER_CAR_IMG, (x, y))
-
-def draw_other_car(img_index, x, y):
-    """
-    Draws other players' cars or obstacles based on an image index.
-    Args:
-        img_index (int): Index of the image in OTHER_CAR_IMGS list.
-        x, y (int): Coordinates to draw the car/obstacle.
-    """
-    if 0 <= img_index < len(OTHER_CAR_IMGS):
-        gameD.blit(OTHER_CAR_IMGS[img_index], (x, y))
-    else:
-        # Fallback if img_index is out of bounds (should not happen if server sends valid indices)
-        pygame.draw.rect(gameD, BLUE, (x, y, 65, 130)) # Placeholder blue rectangle
-
-def display_scores(players_data):
-    """
-    Displays the scores and status of all players.
-    Args:
-        players_data (dict): Dictionary of all players' data from the server state.
-    """
-    font = pygame.font.SysFont(None, 25)
-    y_offset = 0
-    for player_id, data in players_data.items():
-        color = BLACK
-        if player_id == client_player_id:
-            color = GREEN # Highlight this client's score
-        
-        # Display player ID and score
-        score_text = font.render(f"{player_id}: SCORE {data['score']}", True, color)
-        gameD.blit(score_text, (0, y_offset))
-        
-        # Display "CRASHED!" if the player has crashed
-        if data['crashed']:
-            crashed_text = font.render("CRASHED!", True, RED)
-            gameD.blit(crashed_text, (score_text.get_width() + 10, y_offset)) # Position next to score
-        
-        y_offset += 30 # Move down for the next player's score
-
 # --- Main Game Loop (Client-side) ---
 def game_loop():
     """
@@ -324,11 +586,16 @@ def game_loop():
     """
     global pause, game_running
 
-    if SOUNDS_LOADED:
-        pygame.mixer.music.play(-1) # Loop background music indefinitely
+    assets.play_music('jazz.wav') # Streamed and looped indefinitely (silent if the file is missing)
 
-    # Variables to track player input changes (sent to server)
-    x_change, y_change = 0, 0
+    # Only the parts of the screen that changed are redrawn and uploaded (see render.py)
+    renderer = GameRenderer(gameD, IMG_ROAD, PLAYER_CAR_IMG, OTHER_CAR_IMGS)
+
+    # Held directions, sent to the server at a fixed rate (INPUT_SEND_RATE)
+    x_axis, y_axis = 0, 0
+    input_interval = 1.0 / INPUT_SEND_RATE
+    next_input_time = time.monotonic()
+    sent_axes = (0, 0)
 
     while game_running:
         for event in pygame.event.get():
@@ -337,55 +604,55 @@ def game_loop():
 
             if event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_LEFT:
-                    x_change = -5
+                    x_axis = -1
                 elif event.key == pygame.K_RIGHT:
-                    x_change = 5
+                    x_axis = 1
                 elif event.key == pygame.K_UP:
-                    y_change = -5
+                    y_axis = -1
                 elif event.key == pygame.K_DOWN:
-                    y_change = 5
+                    y_axis = 1
                 elif event.key == pygame.K_p:
                     pause = True
                     paused_screen() # Call paused_screen, which blocks until unpaused
-                send_input(x_change, y_change) # Send input immediately on key down
+                    renderer.invalidate()
 
             if event.type == pygame.KEYUP:
                 # Stop movement when key is released
                 if event.key == pygame.K_LEFT or event.key == pygame.K_RIGHT:
-                    x_change = 0
+                    x_axis = 0
                 if event.key == pygame.K_UP or event.key == pygame.K_DOWN:
-                    y_change = 0
-                send_input(x_change, y_change) # Send input to stop movement
+                    y_axis = 0
+
+        # Resend the held input at a fixed cadence, however many key events happened.
+        # Repeats are harmless (the server keeps the newest) and cover for lost packets.
+        # A change is sent right away so the predicted car reacts within this frame.
+        now = time.monotonic()
+        if now >= next_input_time or (x_axis, y_axis) != sent_axes:
+            send_input(x_axis, y_axis)
+            sent_axes = (x_axis, y_axis)
+            next_input_time = max(next_input_time + input_interval, now)
 
         # Acquire lock to safely read the game state updated by the receive_data thread
         with state_lock:
-            # Draw road
-            road_offset = current_game_state.get('road_offset', 0)
-            draw_road(road_offset)
-
-            # Draw all players' cars
+            # The world is drawn interpolated between buffered snapshots, slightly in the past;
+            # this client's own car, crash flag and the scores come from the newest state.
+            render_state = snapshot_buffer.sample() or current_game_state
             players_data = current_game_state.get('players', {})
-            for p_id, p_data in players_data.items():
-                if p_id == client_player_id:
-                    # Draw this client's car
-                    draw_player_car(p_data['x'], p_data['y'])
-                    # If this client's player has crashed, display the crashed screen
-                    if p_data['crashed'] and not pause:
-                        crashed_screen() # This function will block until "Play Again" or "Quit"
-                else:
-                    # Draw other players' cars using their assigned image index
-                    draw_other_car(p_data.get('car_img_index', 0), p_data['x'], p_data['y'])
-
-            # Draw obstacles
-            obstacles_data = current_game_state.get('obstacles', [])
-            for obstacle in obstacles_data:
-                draw_other_car(obstacle['img_index'], obstacle['x'], obstacle['y'])
-
-            # Display scores for all players
-            display_scores(players_data)
-
-        pygame.display.update() # Update the entire screen
-        clock.tick(60) # Limit client-side FPS to 60
+            own_data = players_data.get(client_player_id)
+            own_position = None
+            if own_data:
+                # Draw this client's car where local prediction has it, not where the server last saw it
+                own_position = predictor.position(now) or (own_data['x'], own_data['y'])
+
+        # If this client's player has crashed, display the crashed screen
+        if own_data and own_data['crashed'] and not pause:
+            crashed_screen() # This function will block until "Play Again" or "Quit"
+            renderer.invalidate()
+            continue
+
+        dirty_rects = renderer.draw(render_state, players_data, client_player_id, own_position)
+        pygame.display.update(dirty_rects) # Upload only the changed parts of the screen
+        clock.tick(frame_rate)
 
     # Cleanup on game exit (will be handled by quit_game() if called)
     if client_socket:
@@ -395,22 +662,36 @@ def game_loop():
 
 # --- Main Client Logic ---
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Watch Out multiplayer client")
+    parser.add_argument('--host', default=HOST, help="Server address")
+    parser.add_argument('--port', type=int, default=PORT, help="Server TCP port")
+    parser.add_argument('--interp-delay', type=float, default=INTERPOLATION_DELAY,
+                        help="Seconds other cars and obstacles are rendered behind the server (default %(default)s)")
+    parser.add_argument('--fps', type=int, default=frame_rate, help="Frame rate cap (default %(default)s)")
+    parser.add_argument('--udp', action='store_true',
+                        help="Use a UDP channel for snapshots and inputs if the server offers one")
+    parser.add_argument('--sim-loss', type=float, default=0.0, help="Drop this fraction of outgoing datagrams (testing)")
+    parser.add_argument('--sim-latency', type=float, default=0.0, help="Delay outgoing datagrams by this many seconds (testing)")
+    parser.add_argument('--name', default=getpass.getuser(), help="Your name on the leaderboard (default %(default)s)")
+    args = parser.parse_args()
+    HOST, PORT, interpolation_delay, use_udp = args.host, args.port, args.interp_delay, args.udp
+    player_name = args.name
+    frame_rate = args.fps
+    if args.sim_loss or args.sim_latency:
+        udp_link = udp.LinkSimulator(loss=args.sim_loss, latency=args.sim_latency)
+
     try:
-        client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         print(f"Attempting to connect to server at {HOST}:{PORT}...")
-        client_socket.connect((HOST, PORT))
-        
-        # First, receive the assigned player ID from the server
-        # The server sends a JSON message like {'your_id': 'player_1'}
-        initial_response_data = client_socket.recv(1024).decode('utf-8')
-        initial_response = json.loads(initial_response_data)
+        client_socket, frame_decoder, initial_frames = handshake()
+        msg_type, payload = initial_frames[0]
 
-        if 'your_id' in initial_response:
-            client_player_id = initial_response['your_id']
-            print(f"Successfully connected. Assigned player ID: {client_player_id}")
+        if msg_type == protocol.MSG_WELCOME:
+            server_tick_rate = start_match(protocol.decode_welcome(payload))
+            print(f"Successfully connected. Assigned player ID: {client_player_id} ({server_tick_rate} ticks per second)")
 
             # Start a separate thread to continuously receive game state updates from the server
-            receive_thread = threading.Thread(target=receive_data)
+            # Frames that arrived in the same recv() as the welcome are handed over to it
+            receive_thread = threading.Thread(target=receive_data, args=(initial_frames[1:],))
             receive_thread.daemon = True # Daemon thread exits when main program exits
             receive_thread.start()
 
@@ -418,20 +699,20 @@ if __name__ == "__main__":
             game_intro()
             game_loop()
 
-        elif 'status' in initial_response and initial_response['status'] == 'rejected':
-            # Handle server rejection (e.g., max players reached)
-            print(f"Connection rejected by server: {initial_response.get('message', 'Unknown reason')}")
+        elif msg_type == protocol.MSG_REJECT:
+            # Handle server rejection (e.g., max players reached or protocol mismatch)
+            print(f"Connection rejected by server: {protocol.decode_reject(payload)}")
             game_running = False # Prevent game from starting
         else:
             # Handle unexpected initial response from the server
-            print(f"Unexpected initial response from server: {initial_response_data}")
+            print(f"Unexpected initial message type from server: {msg_type}")
             game_running = False
 
     except ConnectionRefusedError:
         print(f"ERROR: Could not connect to server at {HOST}:{PORT}. Make sure the server is running.")
         game_running = False
-    except json.JSONDecodeError as e:
-        print(f"ERROR: Failed to decode initial server response as JSON: {e}. Data: {initial_response_data[:100]}...")
+    except protocol.ProtocolError as e:
+        print(f"ERROR: Server sent an invalid handshake: {e}")
         game_running = False
     except Exception as e:
         print(f"An unexpected error occurred during client setup: {e}")
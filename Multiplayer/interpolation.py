@@ -0,0 +1,129 @@
+import time
+from collections import deque
+
+from snapshots import player_id_from_number
+
+# --- Snapshot Interpolation ---
+# The server sends 20-60 snapshots per second but the client renders at 60 FPS or more, and
+# snapshots arrive with network jitter. Drawing whatever arrived last makes everything move in
+# visible steps. Instead the client keeps a short buffer of timestamped snapshots and renders
+# the world slightly in the past (INTERPOLATION_DELAY), blending remote-player positions
+# between the two snapshots that bracket the render time. When packets are late and the render
+# time runs past the newest snapshot, motion is extrapolated for a short while. Obstacles and
+# the road are not in snapshots; they are taken from the client's obstacle stream at the same
+# render tick.
+#
+# Snapshot times come from the server tick number, so they are free of network jitter. The
+# offset between the local clock and the server tick clock is estimated from arrival times.
+
+INTERPOLATION_DELAY = 0.1  # Seconds the client renders behind the estimated server time
+MAX_EXTRAPOLATION = 0.25   # Seconds positions may be extrapolated past the newest snapshot
+BUFFER_SIZE = 32           # Snapshots kept for interpolation
+CLOCK_SMOOTHING = 0.05     # Weight of a new arrival in the clock offset estimate
+
+
+class SnapshotBuffer:
+    """
+    Timestamped snapshot buffer that produces interpolated game states for rendering.
+    Usage:
+        buffer = SnapshotBuffer(tick_rate, ObstacleStream(seed, tick_rate))
+        buffer.add(snapshot)          # receive thread, for every decoded snapshot
+        state = buffer.sample()       # render loop, once per frame
+    """
+
+    def __init__(self, tick_rate, obstacles, delay=INTERPOLATION_DELAY, max_extrapolation=MAX_EXTRAPOLATION,
+                 clock=time.monotonic):
+        """
+        Args:
+            tick_rate (float): The server's simulation ticks per second (from the welcome).
+            obstacles (ObstacleStream): Generates the obstacles and road for any tick.
+            delay (float): Interpolation delay in seconds.
+            max_extrapolation (float): Upper bound on extrapolation past the newest snapshot.
+            clock (callable): Monotonic time source in seconds, replaceable for testing.
+        """
+        self.tick_interval = 1.0 / tick_rate
+        self.obstacles = obstacles
+        self.delay = delay
+        self.max_extrapolation = max_extrapolation
+        self._clock = clock
+        self._snapshots = deque(maxlen=BUFFER_SIZE) # Ordered by tick
+        self._clock_offset = None # Local time minus server time, smoothed
+
+        self.extrapolated_frames = 0 # Frames rendered past the newest snapshot (packets late)
+
+    def add(self, snapshot):
+        """Adds a decoded snapshot; out-of-order and duplicate ticks are ignored."""
+        if self._snapshots and snapshot.tick <= self._snapshots[-1].tick:
+            return
+        self._snapshots.append(snapshot)
+
+        offset = self._clock() - snapshot.tick * self.tick_interval
+        if self._clock_offset is None or offset < self._clock_offset:
+            self._clock_offset = offset # An early arrival means less delay; adopt it right away
+        else:
+            self._clock_offset += (offset - self._clock_offset) * CLOCK_SMOOTHING
+
+    def latest(self):
+        """Returns the newest snapshot, or None before the first one arrived."""
+        return self._snapshots[-1] if self._snapshots else None
+
+    def render_time(self):
+        """Returns the server time (in seconds) the client should draw now."""
+        return self._clock() - self._clock_offset - self.delay
+
+    def sample(self):
+        """
+        Returns:
+            dict or None: Game state in the layout of snapshots.snapshot_to_game_state, with
+                player positions interpolated to render_time() and the obstacles and road there.
+        """
+        snapshots = self._snapshots
+        if not snapshots:
+            return None
+        render_tick = self.render_time() / self.tick_interval
+
+        newest = snapshots[-1]
+        if len(snapshots) == 1 or render_tick <= snapshots[0].tick:
+            return self._blend(snapshots[0], snapshots[0], 0.0)
+        if render_tick >= newest.tick:
+            # Late packets: keep moving along the last known velocity for a short while
+            self.extrapolated_frames += 1
+            max_ticks = self.max_extrapolation / self.tick_interval
+            previous = snapshots[-2]
+            ahead = min(render_tick - newest.tick, max_ticks)
+            return self._blend(previous, newest, 1.0 + ahead / (newest.tick - previous.tick))
+
+        # Find the pair of snapshots bracketing the render tick (the buffer is short)
+        for index in range(len(snapshots) - 1, 0, -1):
+            older = snapshots[index - 1]
+            if older.tick <= render_tick:
+                newer = snapshots[index]
+                return self._blend(older, newer, (render_tick - older.tick) / (newer.tick - older.tick))
+        return self._blend(snapshots[0], snapshots[0], 0.0)
+
+    def _blend(self, older, newer, alpha):
+        """
+        Positions are blended between `older` and `newer` (alpha above 1 extrapolates);
+        everything else is taken from `newer`. Players who only exist in `newer` are drawn
+        where it has them. Obstacles and the road come from the stream at the blended tick.
+        """
+        def lerp(a, b):
+            return a + (b - a) * alpha
+
+        players = {}
+        for number, (x, y, score, crashed, car_img_index, input_seq) in newer.players.items():
+            old = older.players.get(number)
+            if old is not None:
+                x, y = lerp(old[0], x), lerp(old[1], y)
+            players[player_id_from_number(number)] = {
+                'x': x, 'y': y, 'score': score, 'crashed': crashed, 'car_img_index': car_img_index,
+                'input_seq': input_seq
+            }
+        obstacles, road_offset = self.obstacles.sample(lerp(older.tick, newer.tick))
+        return {
+            'players': players,
+            'obstacles': obstacles,
+            'road_offset': road_offset,
+            'game_active': newer.game_active,
+            'tick': newer.tick
+        }
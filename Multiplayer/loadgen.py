@@ -0,0 +1,525 @@
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+import protocol
+from obstaclestream import ObstacleStream
+from room import ROOM_CAPACITY, TICK_RATE
+from snapshots import SnapshotHistory, player_number
+
+# --- Headless Load Generator ---
+# Opens many synthetic clients against the server, without pygame. Every bot speaks the real
+# wire protocol: hello, held-input packets at the client's input rate, snapshot decoding with
+# delta baselines and acks, obstacles generated from the room seed and checked against every
+# snapshot's checksum, and a reset after each crash so it keeps playing. For each sweep point
+# the tool measures
+#
+#   - snapshots received per second per client,
+#   - end-to-end input latency: from sending an input until a snapshot reports it applied
+#     (the player's input_seq), as percentiles,
+#   - bytes per second down and up,
+#   - obstacle desyncs: snapshots whose obstacle checksum the bot's own obstacles did not match,
+#   - with --reconnect-interval, reconnect time: bots drop their connection that often and
+#     resume their session, timed until the welcome and until the full resync snapshot,
+#   - tick overruns and dropped ticks, parsed from the tick budget report of a server it
+#     started itself (not available with --server),
+#
+# and writes everything to a JSON report so runs can be compared across releases.
+# --check-malformed checks instead that clients sending malformed frames are dropped.
+#
+#     python loadgen.py --players 4,40,200 --duration 10 --report loadgen-report.json
+
+INPUT_SEND_RATE = 30        # Held-input packets per second per bot (same as the pygame client)
+CONNECT_SPREAD = 1.0        # Seconds over which bot connections are spread
+SERVER_START_TIMEOUT = 10.0 # Seconds to wait for a spawned server to listen
+BUDGET_LINE = re.compile(r"Tick budget: (\d+) rooms .*?(\d+) us per room tick.*?(\d+) overruns, (\d+) dropped ticks")
+
+
+def percentile(sorted_values, fraction):
+    """Returns the value at `fraction` (0..1) of an already sorted list, or None if it is empty."""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class Bot:
+    """One synthetic player connection."""
+
+    def __init__(self, index, pattern, rng, reconnect_interval=0.0):
+        """
+        Args:
+            index (int): Bot number, used to vary the scripted pattern.
+            pattern (str): 'random' (random held directions) or 'sweep' (scripted left-right weave).
+            rng (random.Random): Source of the random pattern.
+            reconnect_interval (float): Drop the connection this often (seconds) and resume the
+                session on a new one; 0 keeps one connection.
+        """
+        self.index = index
+        self.pattern = pattern
+        self.rng = rng
+        self.reconnect_interval = reconnect_interval
+        self.player_id = None
+        self.rejected = None        # Reject reason, if the server turned us away
+        self.snapshots = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.crashes = 0
+        self.obstacles = None       # ObstacleStream of our room, created from the welcome
+        self.latencies = []         # Seconds from input sent to input applied in a snapshot
+        self.session_token = 0      # From the welcome; sent in the hello of every reconnect
+        self.reconnects = 0         # Connections opened after the first
+        self.resumed = 0            # ... that got the same player back
+        self.welcome_times = []     # Seconds from starting a reconnect to its welcome
+        self.resync_times = []      # Seconds from starting a reconnect to its first snapshot
+        self._history = SnapshotHistory()
+        self._sent_inputs = {}      # {input seq: send time}, oldest first
+        self._input_seq = 0
+        self._axes = (0, 0)
+        self._crashed = False
+        self._reconnect_started = None # When the reconnect now waiting for its first snapshot began
+
+    def next_axes(self, now):
+        """Returns the held (x axis, y axis) for the next input packet."""
+        if self.pattern == 'sweep':
+            phase = now * 0.5 + self.index * 0.37 # Each bot weaves out of step with the others
+            return (1 if math.sin(phase * 2 * math.pi) > 0 else -1), 0
+        if self.rng.random() < 0.1: # Change direction now and then
+            self._axes = (self.rng.choice((-1, 0, 1)), self.rng.choice((-1, 0, 1)))
+        return self._axes
+
+    async def run(self, host, port, duration):
+        """Plays for `duration` seconds, dropping and resuming the connection every reconnect interval."""
+        deadline = time.monotonic() + duration
+        while True:
+            until = deadline
+            if self.reconnect_interval:
+                until = min(deadline, time.monotonic() + self.reconnect_interval)
+            last = until >= deadline
+            if not await self._play(host, port, until, leave=last) or last:
+                return
+
+    async def _play(self, host, port, until, leave):
+        """
+        Plays one connection until `until`. The last one says goodbye with CMD_LEAVE; the others
+        just close, like a dropped connection, so the server holds the seat.
+        Returns:
+            bool: True if the connection lasted until `until`.
+        """
+        started = time.monotonic()
+        reconnecting = bool(self.session_token)
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+        except OSError as e:
+            self.rejected = f"connect failed: {e}"
+            return False
+        decoder = protocol.FrameDecoder()
+        self._write(writer, protocol.encode_hello(session_token=self.session_token))
+        sender = None
+        try:
+            frames = []
+            while not frames:
+                data = await reader.read(4096)
+                if not data:
+                    self.rejected = "closed during handshake"
+                    return False
+                self.bytes_in += len(data)
+                frames = decoder.feed(data)
+            msg_type, payload = frames[0]
+            if msg_type != protocol.MSG_WELCOME:
+                self.rejected = protocol.decode_reject(payload) if msg_type == protocol.MSG_REJECT else f"message {msg_type}"
+                return False
+            _, self.player_id, tick_rate, seed, self.session_token, flags = protocol.decode_welcome(payload)
+            if reconnecting:
+                self.reconnects += 1
+                self.welcome_times.append(time.monotonic() - started)
+                if flags & protocol.WELCOME_FLAG_RESUMED:
+                    self.resumed += 1
+                    self._reconnect_started = started
+            if self.obstacles is None or self.obstacles.seed != seed: # A new room unless resumed
+                self.obstacles = ObstacleStream(seed, tick_rate)
+                self._history = SnapshotHistory()
+            number = player_number(self.player_id)
+            self._sent_inputs.clear() # Inputs sent on a dropped connection never arrive
+            sender = asyncio.create_task(self._send_inputs(writer))
+
+            frames = frames[1:]
+            while time.monotonic() < until:
+                for msg_type, payload in frames:
+                    if msg_type == protocol.MSG_SNAPSHOT:
+                        self._on_snapshot(writer, number, payload)
+                try:
+                    data = await asyncio.wait_for(reader.read(65536), until - time.monotonic())
+                except asyncio.TimeoutError:
+                    break
+                if not data:
+                    return False
+                self.bytes_in += len(data)
+                frames = decoder.feed(data)
+            if leave:
+                self._write(writer, protocol.encode_command(protocol.CMD_LEAVE))
+            return True
+        except (ConnectionError, OSError, protocol.ProtocolError) as e:
+            print(f"Bot {self.index}: {e}")
+            return False
+        finally:
+            if sender:
+                sender.cancel()
+            writer.close()
+
+    def _on_snapshot(self, writer, number, payload):
+        history = self._history
+        baseline_seq = protocol.snapshot_baseline_seq(payload)
+        baseline = history.get(baseline_seq)
+        if baseline_seq and baseline is None:
+            return
+        snapshot = protocol.decode_snapshot(payload, baseline)
+        history.add(snapshot)
+        self.snapshots += 1
+        self._write(writer, protocol.encode_ack(snapshot.seq))
+        self.obstacles.verify(snapshot.tick, snapshot.obstacle_checksum)
+        if self._reconnect_started is not None:
+            self.resync_times.append(time.monotonic() - self._reconnect_started)
+            self._reconnect_started = None
+
+        own = snapshot.players.get(number)
+        if own is None:
+            return
+        _, _, _, crashed, _, input_seq = own
+        now = time.monotonic()
+        sent_inputs = self._sent_inputs
+        while sent_inputs:
+            seq = next(iter(sent_inputs))
+            if seq > input_seq:
+                break
+            self.latencies.append(now - sent_inputs.pop(seq))
+        if crashed and not self._crashed:
+            self.crashes += 1
+            self._write(writer, protocol.encode_command(protocol.CMD_RESET_PLAYER))
+        self._crashed = crashed
+
+    async def _send_inputs(self, writer):
+        interval = 1.0 / INPUT_SEND_RATE
+        while True:
+            now = time.monotonic()
+            self._input_seq += 1
+            x_axis, y_axis = self.next_axes(now)
+            self._sent_inputs[self._input_seq] = now
+            self._write(writer, protocol.encode_input(self._input_seq, x_axis, y_axis))
+            await asyncio.sleep(interval)
+
+    def _write(self, writer, frame):
+        self.bytes_out += len(frame)
+        writer.write(frame)
+
+
+async def run_bots(host, port, players, duration, pattern, seed, reconnect_interval=0.0):
+    """Runs `players` bots against the server for `duration` seconds and returns them."""
+    rng = random.Random(seed)
+    bots = [Bot(index, pattern, random.Random(rng.random()), reconnect_interval) for index in range(players)]
+
+    async def start(bot):
+        await asyncio.sleep(rng.uniform(0.0, CONNECT_SPREAD)) # Avoid a thundering herd on accept
+        await bot.run(host, port, duration)
+
+    await asyncio.gather(*(start(bot) for bot in bots))
+    return bots
+
+
+def start_server(port, tick_rate, extra_args):
+    """
+    Starts server.py as a subprocess with a one-second budget report and waits until it listens.
+    Its output goes to a temporary file rather than a pipe, so a chatty server never blocks on
+    a full pipe while it is being measured.
+    Returns:
+        tuple: (process, log file)
+    """
+    server_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'server.py')
+    log = tempfile.TemporaryFile(mode='w+')
+    process = subprocess.Popen(
+        [sys.executable, '-u', server_path, '--port', str(port), '--tick-rate', str(tick_rate),
+         '--report-interval', '1'] + extra_args,
+        stdout=log, stderr=subprocess.STDOUT, text=True)
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while time.monotonic() < deadline and process.poll() is None:
+        log.seek(0)
+        if 'Server listening' in log.read():
+            return process, log
+        time.sleep(0.05)
+    process.kill()
+    log.seek(0)
+    raise RuntimeError(f"Server did not start:\n{log.read()}")
+
+
+def stop_server(server):
+    """Stops a spawned server and returns the last tick budget report it printed."""
+    process, log = server
+    process.terminate()
+    process.wait(timeout=10)
+    log.seek(0)
+    output = log.read()
+    log.close()
+    budget = None
+    for match in BUDGET_LINE.finditer(output):
+        budget = {
+            'rooms': int(match.group(1)),
+            'us_per_room_tick': int(match.group(2)),
+            'tick_overruns': int(match.group(3)),
+            'dropped_ticks': int(match.group(4)),
+        }
+    return budget
+
+
+def summarize(players, duration, bots, budget):
+    """Builds the report entry for one sweep point."""
+    connected = [bot for bot in bots if bot.player_id]
+    latencies = sorted(latency for bot in connected for latency in bot.latencies)
+    welcome_times = sorted(seconds for bot in connected for seconds in bot.welcome_times)
+    resync_times = sorted(seconds for bot in connected for seconds in bot.resync_times)
+
+    def ms(value):
+        return None if value is None else round(value * 1000, 2)
+
+    return {
+        'players': players,
+        'rooms': math.ceil(players / ROOM_CAPACITY),
+        'connected': len(connected),
+        'rejected': len(bots) - len(connected),
+        'duration_s': duration,
+        'snapshots_per_second_per_client': round(
+            sum(bot.snapshots for bot in connected) / duration / len(connected), 2) if connected else 0,
+        'input_latency_ms': {
+            'p50': ms(percentile(latencies, 0.5)),
+            'p90': ms(percentile(latencies, 0.9)),
+            'p99': ms(percentile(latencies, 0.99)),
+            'max': ms(latencies[-1] if latencies else None),
+            'samples': len(latencies),
+        },
+        'bytes_per_second': {
+            'down': round(sum(bot.bytes_in for bot in bots) / duration),
+            'up': round(sum(bot.bytes_out for bot in bots) / duration),
+        },
+        'crashes': sum(bot.crashes for bot in connected),
+        'obstacle_desyncs': sum(bot.obstacles.desyncs for bot in connected),
+        'reconnects': {
+            'count': sum(bot.reconnects for bot in connected),
+            'resumed': sum(bot.resumed for bot in connected),
+            # From opening the new connection: TCP connect plus one round trip for hello -> welcome
+            'welcome_ms': {'p50': ms(percentile(welcome_times, 0.5)), 'p99': ms(percentile(welcome_times, 0.99))},
+            # ... until the full snapshot is decoded (it travels right behind the welcome)
+            'resync_ms': {'p50': ms(percentile(resync_times, 0.5)), 'p99': ms(percentile(resync_times, 0.99))},
+        },
+        'server': budget, # None when running against an external server
+    }
+
+
+# --- Malformed Frame Check ---
+# A truncated hello is refused. A client that breaks the protocol later is dropped, and its seat is freed at once instead of being
+# held for a reconnect. For each malformed frame the check joins, sends the frame, waits for the
+# server to close the connection, then tries to resume with the session token: it must get a
+# new player, not the old seat back. Asking for leaderboard pages and never reading the replies
+# is treated the same way: the server must hang up before UNREAD_REPLIES_LIMIT bytes of requests.
+UNREAD_REPLIES_LIMIT = 64 << 20
+LEADERBOARD_ROWS = 10 # Entries asked for per leaderboard request
+
+MALFORMED_FRAMES = (
+    ('1-byte input', protocol.encode_frame(protocol.MSG_INPUT, b'\x00')),
+    ('empty command', protocol.encode_frame(protocol.MSG_COMMAND)),
+    ('empty leaderboard request', protocol.encode_frame(protocol.MSG_LEADERBOARD_REQUEST)),
+    ('2-byte ack', protocol.encode_frame(protocol.MSG_ACK, b'\x00\x00')),
+)
+
+
+async def join(host, port, session_token=0):
+    """
+    Says hello and reads the welcome.
+    Returns:
+        tuple: (reader, writer, decoded welcome)
+    Raises:
+        ConnectionError: If the server answers with anything but a welcome.
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(protocol.encode_hello(session_token=session_token))
+    decoder = protocol.FrameDecoder()
+    frames = []
+    while not frames:
+        data = await reader.read(4096)
+        if not data:
+            raise ConnectionError("closed during handshake")
+        frames = decoder.feed(data)
+    msg_type, payload = frames[0]
+    if msg_type != protocol.MSG_WELCOME:
+        raise ConnectionError(f"no welcome (message {msg_type})")
+    return reader, writer, protocol.decode_welcome(payload)
+
+
+async def check_truncated_hello(host, port, timeout=2.0):
+    """A hello cut short after the version must be refused, not welcomed. Returns 1 on failure."""
+    reader, writer = await asyncio.open_connection(host, port)
+    hello = protocol.encode_hello()
+    payload = hello[protocol.FRAME_HEADER.size:protocol.FRAME_HEADER.size + protocol.HELLO_PREFIX.size + 1]
+    writer.write(protocol.encode_frame(protocol.MSG_HELLO, payload))
+    decoder = protocol.FrameDecoder()
+    welcomed = False
+    try:
+        while not welcomed and (data := await asyncio.wait_for(reader.read(4096), timeout)):
+            welcomed = any(msg_type == protocol.MSG_WELCOME for msg_type, _ in decoder.feed(data))
+    except asyncio.TimeoutError:
+        welcomed = True # Still waiting for more: the server did not treat it as an error
+    writer.close()
+    if welcomed:
+        print("FAIL truncated hello: not refused")
+        return 1
+    print("ok   truncated hello: refused")
+    return 0
+
+
+async def check_unread_replies(host, port, timeout=2.0, limit=UNREAD_REPLIES_LIMIT):
+    """
+    Asks for leaderboard pages without ever reading the answers. The server must hang up once
+    too many replies pile up, and free the seat. Returns 1 on failure.
+    """
+    reader, writer, welcome = await join(host, port)
+    session_token = welcome[4]
+    requests = protocol.encode_leaderboard_request(0, LEADERBOARD_ROWS) * 1024
+    sent = 0
+    closed = False
+    try:
+        while sent < limit:
+            writer.write(requests)
+            await asyncio.wait_for(writer.drain(), timeout)
+            sent += len(requests)
+    except (ConnectionError, OSError):
+        closed = True
+    except asyncio.TimeoutError:
+        pass # The server stopped reading without hanging up
+    writer.transport.abort()
+    if not closed:
+        print(f"FAIL unread replies: connection still open after {sent} bytes of requests")
+        return 1
+    _, writer, welcome = await join(host, port, session_token)
+    writer.write(protocol.encode_command(protocol.CMD_LEAVE))
+    writer.close()
+    if welcome[5] & protocol.WELCOME_FLAG_RESUMED:
+        print("FAIL unread replies: the seat was held and resumed")
+        return 1
+    print(f"ok   unread replies: dropped after {sent} bytes of requests, seat freed")
+    return 0
+
+
+async def check_malformed(host, port, timeout=2.0):
+    """Runs the malformed frame check; returns the number of failed cases."""
+    failures = await check_truncated_hello(host, port, timeout)
+    failures += await check_unread_replies(host, port, timeout)
+    for name, frame in MALFORMED_FRAMES:
+        reader, writer, welcome = await join(host, port)
+        session_token = welcome[4]
+        writer.write(frame)
+        closed = False
+        try:
+            while await asyncio.wait_for(reader.read(65536), timeout):
+                pass
+            closed = True
+        except asyncio.TimeoutError:
+            pass
+        writer.close()
+        if not closed:
+            print(f"FAIL {name}: connection still open after {timeout:.0f} s")
+            failures += 1
+            continue
+        _, writer, welcome = await join(host, port, session_token)
+        writer.write(protocol.encode_command(protocol.CMD_LEAVE))
+        writer.close()
+        if welcome[5] & protocol.WELCOME_FLAG_RESUMED:
+            print(f"FAIL {name}: the seat was held and resumed")
+            failures += 1
+        else:
+            print(f"ok   {name}: dropped, seat freed")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless load generator for the Watch Out server")
+    parser.add_argument('--players', default='4,16,64',
+                        help="Comma-separated player counts to sweep (rooms = players / %d)" % ROOM_CAPACITY)
+    parser.add_argument('--duration', type=float, default=10.0, help="Seconds to measure at each sweep point")
+    parser.add_argument('--pattern', choices=('random', 'sweep'), default='random', help="Bot input pattern")
+    parser.add_argument('--seed', type=int, default=1, help="Seed for bot behaviour")
+    parser.add_argument('--reconnect-interval', type=float, default=0.0, metavar='SECONDS',
+                        help="Drop every bot's connection this often and resume its session (measures reconnect time)")
+    parser.add_argument('--server', help="host:port of a running server (default: start one per sweep point)")
+    parser.add_argument('--port', type=int, default=65500, help="Port for servers started by the load generator")
+    parser.add_argument('--tick-rate', type=int, default=TICK_RATE, help="Tick rate of servers started by the load generator")
+    parser.add_argument('--server-arg', action='append', default=[],
+                        help="Extra argument for started servers (repeatable, e.g. --server-arg=--array-world)")
+    parser.add_argument('--report', default='loadgen-report.json', help="Where to write the JSON report")
+    parser.add_argument('--check-malformed', action='store_true',
+                        help="Instead of measuring, check that malformed frames drop the client and free its seat")
+    args = parser.parse_args()
+
+    if args.check_malformed:
+        server = None
+        if args.server:
+            host, port = args.server.rsplit(':', 1)
+            port = int(port)
+        else:
+            host, port = '127.0.0.1', args.port
+            server = start_server(port, args.tick_rate, args.server_arg)
+        try:
+            failures = asyncio.run(check_malformed(host, port))
+        finally:
+            if server:
+                stop_server(server)
+        sys.exit(1 if failures else 0)
+
+    runs = []
+    for players in [int(count) for count in args.players.split(',')]:
+        server = None
+        if args.server:
+            host, port = args.server.rsplit(':', 1)
+            port = int(port)
+        else:
+            host, port = '127.0.0.1', args.port
+            server = start_server(port, args.tick_rate, args.server_arg)
+        try:
+            bots = asyncio.run(run_bots(host, port, players, args.duration, args.pattern, args.seed,
+                                        args.reconnect_interval))
+        finally:
+            budget = stop_server(server) if server else None
+        run = summarize(players, args.duration, bots, budget)
+        runs.append(run)
+        latency = run['input_latency_ms']
+        print(f"{players} players / {run['rooms']} rooms: {run['snapshots_per_second_per_client']} snapshots/s per client, "
+              f"input latency p50 {latency['p50']} ms p99 {latency['p99']} ms, "
+              f"{run['bytes_per_second']['down']} B/s down, {run['obstacle_desyncs']} obstacle desyncs, "
+              f"overruns {budget['tick_overruns'] if budget else 'n/a'}")
+        reconnects = run['reconnects']
+        if reconnects['count']:
+            print(f"  {reconnects['count']} reconnects, {reconnects['resumed']} resumed: welcome p50 "
+                  f"{reconnects['welcome_ms']['p50']} ms, full resync p50 {reconnects['resync_ms']['p50']} ms "
+                  f"p99 {reconnects['resync_ms']['p99']} ms")
+
+    report = {
+        'generated_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'protocol_version': protocol.PROTOCOL_VERSION,
+        'tick_rate': args.tick_rate,
+        'pattern': args.pattern,
+        'reconnect_interval_s': args.reconnect_interval,
+        'server_args': args.server_arg,
+        'runs': runs,
+    }
+    with open(args.report, 'w') as report_file:
+        json.dump(report, report_file, indent=2)
+    print(f"Report written to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
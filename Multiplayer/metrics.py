@@ -0,0 +1,196 @@
+import asyncio
+import bisect
+import time
+from collections import deque
+
+# --- Server Metrics ---
+# Rolling histograms of where the tick spends its time, plus a tiny local HTTP (or Unix socket)
+# endpoint that serves them in the Prometheus text exposition format:
+#
+#     curl http://127.0.0.1:9100/metrics
+#
+# Each histogram keeps the all-time cumulative buckets Prometheus expects (_bucket, _sum,
+# _count) and, next to them, a sliding window of recent observations from which it reports
+# quantiles, so a slowdown shows up in the quantiles within a minute instead of being averaged
+# away by hours of history. The quantiles are exposed as a separate gauge family named after
+# the histogram plus _window_quantile, written after the histogram's own lines.
+
+# Bucket upper bounds in seconds: 1 us .. ~1 s in factor-of-two steps
+DEFAULT_BUCKETS = tuple(1e-6 * 2 ** i for i in range(21))
+WINDOW_SLICES = 6          # The rolling window is split into this many slices ...
+WINDOW_SLICE_SECONDS = 10  # ... of this many seconds each (one minute in total)
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+class RollingHistogram:
+    """Fixed-bucket histogram with all-time totals and a sliding window for quantiles."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, clock=time.monotonic):
+        self.buckets = buckets
+        self._clock = clock
+        self.counts = [0] * (len(buckets) + 1) # Last slot counts observations above every bucket
+        self.total = 0.0
+        self.count = 0
+        self._slices = deque([(self._slice_index(), [0] * (len(buckets) + 1))], maxlen=WINDOW_SLICES)
+
+    def _slice_index(self):
+        return int(self._clock() // WINDOW_SLICE_SECONDS)
+
+    def observe(self, value):
+        bucket = bisect.bisect_left(self.buckets, value)
+        self.counts[bucket] += 1
+        self.total += value
+        self.count += 1
+        index = self._slice_index()
+        if self._slices[-1][0] != index:
+            self._slices.append((index, [0] * (len(self.buckets) + 1))) # Oldest slice falls out
+        self._slices[-1][1][bucket] += 1
+
+    def window_quantile(self, fraction):
+        """
+        Returns:
+            float or None: Upper bound of the bucket holding the `fraction` quantile of the
+                observations in the rolling window, or None if the window is empty.
+        """
+        oldest = self._slice_index() - WINDOW_SLICES + 1
+        window = [0] * (len(self.buckets) + 1)
+        for index, counts in self._slices:
+            if index >= oldest:
+                for bucket, count in enumerate(counts):
+                    window[bucket] += count
+        observed = sum(window)
+        if not observed:
+            return None
+        rank = fraction * observed
+        seen = 0
+        for bucket, count in enumerate(window):
+            seen += count
+            if seen >= rank and count:
+                return self.buckets[bucket] if bucket < len(self.buckets) else float('inf')
+        return float('inf')
+
+    def render(self, name, labels=''):
+        """Returns the Prometheus text lines for this histogram (labels like 'phase="collision"')."""
+        separator = ',' if labels else ''
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels}{separator}le="{bound:.6g}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels}{separator}le="+Inf"}} {self.count}')
+        plain_labels = f'{{{labels}}}' if labels else ''
+        lines.append(f'{name}_sum{plain_labels} {self.total:.9f}')
+        lines.append(f'{name}_count{plain_labels} {self.count}')
+        return lines
+
+    def render_window_quantiles(self, name, labels=''):
+        """
+        Returns the Prometheus text lines of the rolling window's quantiles, as samples of the
+        gauge `name` with a quantile label. They belong to their own metric family, so they must
+        not be written inside the histogram's lines.
+        """
+        separator = ',' if labels else ''
+        lines = []
+        for fraction in QUANTILES:
+            value = self.window_quantile(fraction)
+            if value is not None:
+                text = '+Inf' if value == float('inf') else f'{value:.6g}'
+                lines.append(f'{name}{{{labels}{separator}quantile="{fraction}"}} {text}')
+        return lines
+
+
+class PhaseTimer:
+    """
+    Splits one tick into phases and records each phase's duration in its histogram.
+    Usage:
+        timer.start()
+        update_obstacles(); timer.lap('obstacles')
+        detect_collisions(); timer.lap('collision')
+    """
+
+    def __init__(self, histograms):
+        self._histograms = histograms
+        self._last = 0.0
+
+    def start(self):
+        self._last = time.perf_counter()
+
+    def lap(self, phase):
+        now = time.perf_counter()
+        self._histograms[phase].observe(now - self._last)
+        self._last = now
+
+
+class MetricsRegistry:
+    """The server's process-wide histograms and counters."""
+
+    TICK_PHASES = ('input', 'obstacles', 'respawn_scoring', 'collision', 'serialization', 'broadcast')
+
+    def __init__(self):
+        self.tick_phases = {phase: RollingHistogram() for phase in self.TICK_PHASES}
+        self.loop_lag = RollingHistogram()        # How late room tasks woke up after their sleep
+        self.rejected_connections = 0
+        self.accepted_connections = 0
+
+    def phase_timer(self):
+        return PhaseTimer(self.tick_phases)
+
+    def render(self):
+        """Returns the registry's metrics as Prometheus text lines."""
+        lines = [
+            '# HELP watchout_tick_phase_seconds Time spent in each phase of a room tick.',
+            '# TYPE watchout_tick_phase_seconds histogram',
+        ]
+        for phase, histogram in self.tick_phases.items():
+            lines.extend(histogram.render('watchout_tick_phase_seconds', f'phase="{phase}"'))
+        lines += [
+            '# HELP watchout_tick_phase_seconds_window_quantile Tick phase time quantiles over the last minute (bucket upper bounds).',
+            '# TYPE watchout_tick_phase_seconds_window_quantile gauge',
+        ]
+        for phase, histogram in self.tick_phases.items():
+            lines.extend(histogram.render_window_quantiles('watchout_tick_phase_seconds_window_quantile', f'phase="{phase}"'))
+        lines += [
+            '# HELP watchout_event_loop_lag_seconds How late room ticks woke up; all state is owned by the event loop, so this is the wait that replaces lock contention.',
+            '# TYPE watchout_event_loop_lag_seconds histogram',
+        ]
+        lines.extend(self.loop_lag.render('watchout_event_loop_lag_seconds'))
+        lines += [
+            '# HELP watchout_event_loop_lag_seconds_window_quantile Event loop lag quantiles over the last minute (bucket upper bounds).',
+            '# TYPE watchout_event_loop_lag_seconds_window_quantile gauge',
+        ]
+        lines.extend(self.loop_lag.render_window_quantiles('watchout_event_loop_lag_seconds_window_quantile'))
+        lines += [
+            '# TYPE watchout_connections_accepted_total counter',
+            f'watchout_connections_accepted_total {self.accepted_connections}',
+            '# TYPE watchout_connections_rejected_total counter',
+            f'watchout_connections_rejected_total {self.rejected_connections}',
+        ]
+        return lines
+
+
+registry = MetricsRegistry()
+
+
+async def serve_metrics(render, host=None, port=None, path=None):
+    """
+    Serves `render()` (a list of Prometheus text lines) to any HTTP GET, on a local TCP port
+    or a Unix socket.
+    Returns:
+        asyncio.Server: The listening server.
+    """
+    async def handle(reader, writer):
+        try:
+            await reader.readuntil(b'\r\n\r\n') # The request itself does not matter
+            body = ('\n'.join(render()) + '\n').encode('utf-8')
+            writer.write(b'HTTP/1.0 200 OK\r\n'
+                         b'Content-Type: text/plain; version=0.0.4\r\n'
+                         b'Content-Length: ' + str(len(body)).encode() + b'\r\n\r\n' + body)
+            await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    if path:
+        return await asyncio.start_unix_server(handle, path)
+    return await asyncio.start_server(handle, host, port)
@@ -0,0 +1,163 @@
+import argparse
+import os
+import sys
+import time
+from collections import deque
+
+# The client runs the simulation core shared with the server and the single-player game
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'shared'))
+
+import simulation
+from simulation import DISPLAY_H, MULTIPLAYER_RULES, MULTIPLAYER_TICK_RATE
+from snapshots import CHECKSUM_MASK
+
+# --- Obstacle Streams ---
+# Obstacles are not in snapshots. Every obstacle of a match follows from the room's seed and
+# the tick: its lane, speed and image are hashes of (seed, spawn number), it moves in a
+# straight line, and where it respawns depends only on the other obstacles. So the client
+# simulates the road and the obstacles itself, from the seed in the welcome, with the same
+# simulation core the server runs (a State without players), and draws them at any tick.
+#
+# Each snapshot carries a checksum of the server's obstacles at its tick. A mismatch means
+# the client's obstacles are not the server's (e.g. a client built from different rules);
+# it is counted and reported. Generating again from the seed would give the same obstacles,
+# so the stream keeps its history.
+#
+# Joining a running match means simulating every tick since it started. catch_up() does that
+# without touching the stream, so the client runs it outside the lock its renderer holds and
+# only swaps the result in with extend().
+
+HISTORY_TICKS = 256      # Recent ticks kept for interpolation (12.8 s at 20 ticks/s)
+CHECKPOINT_TICKS = 1200  # Every this many ticks a state is kept for good (1 min at 20 ticks/s)
+NO_INPUTS = {}
+
+
+class ObstacleStream:
+    """
+    The obstacles and road of one match, generated locally and kept for recent ticks.
+    Usage:
+        stream = ObstacleStream(seed, tick_rate)
+        stream.extend(stream.catch_up(snapshot.tick))             # outside the render lock
+        stream.verify(snapshot.tick, snapshot.obstacle_checksum)  # for every applied snapshot
+        obstacles, road_offset = stream.sample(render_tick)       # fractional ticks interpolate
+    """
+
+    def __init__(self, seed, tick_rate, rules=MULTIPLAYER_RULES, history_ticks=HISTORY_TICKS):
+        """
+        Args:
+            seed (int): The room seed from the welcome.
+            tick_rate (int): The room's ticks per second (speeds are scaled by it, as on the server).
+            rules (simulation.Rules): The server's rules before tick rate scaling.
+            history_ticks (int): Ticks kept; older ones are simulated again from the nearest checkpoint.
+        """
+        self.seed = seed
+        self.rules = simulation.rules_for_tick_rate(rules, tick_rate, MULTIPLAYER_TICK_RATE)
+        start = simulation.new_game(seed, self.rules)
+        self._states = deque([start], maxlen=history_ticks) # Consecutive ticks, oldest first
+        self._checkpoints = {0: start} # {tick: State} for every multiple of CHECKPOINT_TICKS reached
+
+        self.simulated_ticks = 0 # Ticks stepped locally, including catching up after joining
+        self.desyncs = 0         # Snapshots whose checksum did not match our obstacles
+
+    def state(self, tick):
+        """
+        Returns:
+            simulation.State: The obstacles and road at `tick` (no players).
+        """
+        states = self._states
+        first = states[0].tick
+        if tick < first:
+            # Older than the history (only after a long stall); simulated from the nearest
+            # checkpoint without keeping it
+            state = self._checkpoints[tick - tick % CHECKPOINT_TICKS]
+            while state.tick < tick:
+                state = simulation.step(state, NO_INPUTS)
+                self.simulated_ticks += 1
+            return state
+        if tick > states[-1].tick:
+            self.extend(self.catch_up(tick))
+        return states[tick - states[0].tick]
+
+    def catch_up(self, tick):
+        """
+        Simulates from the newest kept tick up to `tick` without changing the stream, so it is
+        safe to run while another thread samples the stream. Hand the result to extend().
+        Returns:
+            tuple: (the newest states, oldest first, at most the history length; {tick: checkpoint State})
+        """
+        state = self._states[-1]
+        recent = deque(maxlen=self._states.maxlen)
+        checkpoints = {}
+        while state.tick < tick:
+            state = simulation.step(state, NO_INPUTS)
+            recent.append(state)
+            if state.tick % CHECKPOINT_TICKS == 0:
+                checkpoints[state.tick] = state
+        self.simulated_ticks += len(recent) # Approximate after a long catch-up; only for reporting
+        return recent, checkpoints
+
+    def extend(self, caught_up):
+        """Adds the states of a catch_up(); ticks the stream already has are skipped."""
+        recent, checkpoints = caught_up
+        states = self._states
+        if recent and recent[0].tick > states[-1].tick + 1:
+            states.clear() # The catch-up skipped past the whole history
+        for state in recent:
+            if not states or state.tick == states[-1].tick + 1:
+                states.append(state)
+        self._checkpoints.update(checkpoints)
+
+    def verify(self, tick, checksum):
+        """
+        Compares our obstacles at `tick` with a snapshot's obstacle checksum.
+        Returns:
+            bool: True if they match. A mismatch is only counted: the seed gives the same obstacles again.
+        """
+        state = self.state(tick)
+        if simulation.obstacle_checksum(self.seed, tick, state.obstacles) & CHECKSUM_MASK == checksum:
+            return True
+        self.desyncs += 1
+        return False
+
+    def sample(self, tick):
+        """
+        Returns the obstacles and road at a fractional tick, blended between the two whole ticks.
+        Returns:
+            tuple: ([{'id', 'x', 'y', 'speed', 'img_index'}, ...], road_offset)
+        """
+        tick = max(0.0, tick)
+        whole = int(tick)
+        alpha = tick - whole
+        older, newer = self.state(whole), self.state(whole + 1)
+
+        old_positions = {obstacle.id: obstacle.y for obstacle in older.obstacles}
+        obstacles = []
+        for obstacle_id, x, y, speed, img_index in newer.obstacles:
+            old_y = old_positions.get(obstacle_id)
+            if old_y is not None:
+                y = old_y + (y - old_y) * alpha # Obstacles never change lanes
+            obstacles.append({'id': obstacle_id, 'x': x, 'y': y, 'speed': speed, 'img_index': img_index})
+        road_step = (newer.road_offset - older.road_offset) % DISPLAY_H # The offset wraps around
+        return obstacles, (older.road_offset + road_step * alpha) % DISPLAY_H
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure how fast a client generates a match's obstacles")
+    parser.add_argument('--ticks', type=int, default=72000, help="Ticks to catch up on, as for a late joiner")
+    parser.add_argument('--tick-rate', type=int, default=MULTIPLAYER_TICK_RATE, help="Room tick rate")
+    args = parser.parse_args()
+
+    stream = ObstacleStream(1, args.tick_rate)
+    started = time.perf_counter()
+    stream.state(args.ticks)
+    elapsed = time.perf_counter() - started
+    print(f"Caught up {args.ticks} ticks ({args.ticks / args.tick_rate / 60:.0f} min of play) in {elapsed * 1000:.0f} ms "
+          f"({elapsed / args.ticks * 1e6:.1f} us per tick)")
+    old_tick = args.ticks // 2 + CHECKPOINT_TICKS // 2 # Long out of the history, halfway between checkpoints
+    started = time.perf_counter()
+    stream.state(old_tick)
+    print(f"Tick {old_tick}: {(time.perf_counter() - started) * 1000:.1f} ms from the nearest checkpoint")
+    started = time.perf_counter()
+    for frame in range(1000):
+        stream.sample(args.ticks + frame * 0.3)
+    print(f"sample(): {(time.perf_counter() - started) * 1000:.3f} us per frame")
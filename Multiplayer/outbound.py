@@ -0,0 +1,150 @@
+import asyncio
+import time
+from collections import deque
+
+# --- Outbound Queues ---
+# Every connection gets its own bounded queue of frames and a sender task that drains it into
+# the socket. The room tick only ever appends to these queues, so a client on a slow link can
+# fall behind on its own without holding up the simulation or the other clients. Snapshots are
+# replaceable (the next one describes the whole state again), so when a queue fills up the stale
+# snapshots in it are thrown away in favour of the newest one. Other frames are never dropped;
+# they are answers to the client's own requests, so a client that keeps asking without reading
+# would make them pile up, and once more than OUTBOX_MAX_RELIABLE_BYTES of them wait the
+# connection is closed instead.
+
+OUTBOX_MAX_FRAMES = 8          # Frames a connection may have queued before snapshots are dropped
+OUTBOX_MAX_RELIABLE_BYTES = 65536 # Bytes of non-snapshot frames a connection may have queued
+TRANSPORT_HIGH_WATER = 16384   # Bytes the transport buffers before drain() starts waiting
+MAX_BEHIND_SECONDS = 5.0       # A client whose queue stays backed up this long is disconnected
+
+
+class ClientOutbox:
+    """
+    Bounded send queue for one client connection.
+    Usage:
+        outbox = ClientOutbox(writer)
+        task = asyncio.create_task(outbox.run())
+        outbox.send_snapshot(frame)   # from the room tick, never blocks
+    """
+
+    def __init__(self, writer, max_frames=OUTBOX_MAX_FRAMES, max_behind_seconds=MAX_BEHIND_SECONDS,
+                 max_reliable_bytes=OUTBOX_MAX_RELIABLE_BYTES, clock=time.monotonic):
+        """
+        Args:
+            writer (asyncio.StreamWriter): Outgoing side of the client connection.
+            max_frames (int): Queue length at which stale snapshots start being dropped.
+            max_reliable_bytes (int): Queued non-snapshot bytes above which send() closes the connection.
+            max_behind_seconds (float): How long the queue may stay backed up before is_stalled() is True.
+            clock (callable): Monotonic time source in seconds, replaceable for testing.
+        """
+        self.writer = writer
+        self.max_frames = max_frames
+        self.max_behind_seconds = max_behind_seconds
+        self.max_reliable_bytes = max_reliable_bytes
+        self._clock = clock
+        self._queue = deque()           # (frame, is_snapshot, enqueue time)
+        self._ready = asyncio.Event()   # Set while the queue has frames for the sender task
+        self._behind_since = None       # When the queue last overflowed without draining since
+        self.closed = False
+        self.overflowed = False         # Closed because too many non-snapshot frames were waiting
+        self.datagram_session = None    # udp.DatagramSession once the client bound a UDP channel
+
+        writer.transport.set_write_buffer_limits(high=TRANSPORT_HIGH_WATER)
+
+        # Counters, read by the server's reports
+        self.queued_bytes = 0           # Bytes currently waiting in the queue
+        self.reliable_bytes = 0         # Of those, bytes of non-snapshot frames
+        self.bytes_sent = 0             # Bytes handed to the transport so far
+        self.bytes_received = 0         # Bytes the client sent us (counted by the connection handler)
+        self.frames_sent = 0
+        self.dropped_snapshots = 0      # Snapshots discarded because a newer one replaced them
+        self.send_latency_total = 0.0   # Sum of enqueue-to-drained times, for the average
+        self.send_latency_max = 0.0
+        self.last_send_latency = 0.0
+
+    def __len__(self):
+        return len(self._queue)
+
+    def send(self, frame):
+        """
+        Queues a frame that must be delivered (welcome, reject, ...). If that puts more than
+        max_reliable_bytes of such frames in the queue, the connection is closed instead.
+        """
+        if self.closed:
+            return
+        if self.reliable_bytes + len(frame) > self.max_reliable_bytes:
+            self.overflowed = True
+            self.close()
+            return
+        self.reliable_bytes += len(frame)
+        self._enqueue(frame, False)
+
+    def send_snapshot(self, frame):
+        """
+        Queues a snapshot frame. If the queue is full, every snapshot still waiting in it is
+        dropped, since the new one supersedes them.
+        """
+        if len(self._queue) >= self.max_frames:
+            kept = deque(item for item in self._queue if not item[1])
+            dropped = len(self._queue) - len(kept)
+            if dropped:
+                self.dropped_snapshots += dropped
+                self.queued_bytes -= sum(len(item[0]) for item in self._queue if item[1])
+                self._queue = kept
+            if self._behind_since is None:
+                self._behind_since = self._clock()
+        self._enqueue(frame, True)
+
+    def _enqueue(self, frame, is_snapshot):
+        if self.closed:
+            return
+        self._queue.append((frame, is_snapshot, self._clock()))
+        self.queued_bytes += len(frame)
+        self._ready.set()
+
+    def is_stalled(self):
+        """Returns True if the client has been too far behind for too long and should be dropped."""
+        return self._behind_since is not None and self._clock() - self._behind_since > self.max_behind_seconds
+
+    def average_send_latency(self):
+        """Returns the mean time in seconds between queueing a frame and the transport accepting it."""
+        return self.send_latency_total / self.frames_sent if self.frames_sent else 0.0
+
+    def close(self):
+        """Stops accepting frames and aborts the connection; handle_client cleans up the player."""
+        self.closed = True
+        self._queue.clear()
+        self.queued_bytes = 0
+        self.reliable_bytes = 0
+        self._ready.set()
+        self.writer.transport.abort()
+
+    async def run(self):
+        """
+        Sender task: writes queued frames in order and waits for the transport to drain
+        whenever its buffer is above the high-water mark.
+        """
+        while not self.closed:
+            if not self._queue:
+                self._behind_since = None # Fully caught up
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+            frame, is_snapshot, queued_at = self._queue.popleft()
+            self.queued_bytes -= len(frame)
+            if not is_snapshot:
+                self.reliable_bytes -= len(frame)
+            try:
+                self.writer.write(frame)
+                await self.writer.drain()
+            except (ConnectionError, OSError):
+                self.closed = True # handle_client notices the dead connection on its next read
+                return
+
+            latency = self._clock() - queued_at
+            self.bytes_sent += len(frame)
+            self.frames_sent += 1
+            self.last_send_latency = latency
+            self.send_latency_total += latency
+            if latency > self.send_latency_max:
+                self.send_latency_max = latency
@@ -0,0 +1,67 @@
+from collections import deque
+
+from simulation import MULTIPLAYER_RULES, MULTIPLAYER_TICK_RATE, clamp_to_screen
+
+# --- Client-Side Prediction ---
+# Waiting for the server to move our own car costs a round trip plus up to one tick before a
+# keypress shows on screen. Instead the client moves its car right away from its own inputs
+# and treats the server position only as a correction: every snapshot says which input the
+# server applied last (input_seq), so the client takes the server position, drops the inputs
+# the server has confirmed, and replays the ones still in flight on top of it.
+#
+# Inputs are held states, so replaying one means moving for as long as it was held: from the
+# time it was sent until the next input replaced it (or until now for the newest one).
+
+# Same on-screen speed as the server
+PLAYER_SPEED_PER_SECOND = MULTIPLAYER_RULES.player_speed * MULTIPLAYER_TICK_RATE
+MAX_PENDING_INPUTS = 256 # Unconfirmed inputs kept for replay (several seconds at 30 Hz)
+
+
+class LocalPredictor:
+    """
+    Predicted position of this client's own car.
+    Usage:
+        predictor.record_input(seq, x_axis, y_axis, now)    # whenever an input is sent
+        predictor.reconcile(x, y, input_seq, crashed)       # whenever a snapshot arrives
+        x, y = predictor.position(now)                      # every frame
+    """
+
+    def __init__(self):
+        self._pending = deque(maxlen=MAX_PENDING_INPUTS) # (seq, x_axis, y_axis, sent time)
+        self._server_position = None # Last authoritative (x, y)
+        self._crashed = False
+
+    def record_input(self, seq, x_axis, y_axis, now):
+        """Remembers an input sent to the server so it can be replayed until confirmed."""
+        self._pending.append((seq, x_axis, y_axis, now))
+
+    def reconcile(self, x, y, input_seq, crashed):
+        """
+        Adopts the server's position of our car and forgets the inputs it already applied.
+        Args:
+            x, y (float): Position from the newest snapshot.
+            input_seq (int): Newest input sequence number the server applied.
+            crashed (bool): Crashed cars do not move, so nothing is predicted for them.
+        """
+        self._server_position = (x, y)
+        self._crashed = crashed
+        pending = self._pending
+        while pending and pending[0][0] <= input_seq:
+            pending.popleft()
+
+    def position(self, now):
+        """
+        Returns:
+            tuple or None: The predicted (x, y) at time `now`, or None before the first snapshot.
+        """
+        if self._server_position is None:
+            return None
+        x, y = self._server_position
+        if self._crashed:
+            return x, y
+        pending = self._pending
+        for index, (_, x_axis, y_axis, sent) in enumerate(pending):
+            held_until = pending[index + 1][3] if index + 1 < len(pending) else now
+            distance = PLAYER_SPEED_PER_SECOND * max(0.0, held_until - sent)
+            x, y = clamp_to_screen(x + x_axis * distance, y + y_axis * distance)
+        return x, y
@@ -0,0 +1,440 @@
+import struct
+
+from snapshots import EMPTY_SNAPSHOT, Snapshot, player_number, player_id_from_number
+
+# --- Wire Protocol ---
+# Every message exchanged between the server and a client is sent as a frame:
+#
+#     [uint32 payload length][uint8 message type][payload bytes ...]
+#
+# The length prefix lets both sides split the TCP byte stream back into whole
+# messages no matter how the kernel merges or splits the segments.
+# All integers are big-endian (network byte order).
+# Every decode_* function raises ProtocolError for a payload that does not fit its layout.
+
+PROTOCOL_VERSION = 9      # Bumped whenever the frame layout or a record layout changes
+PROTOCOL_MAGIC = b'WOUT'  # Sent in the client hello so stray connections are detected early
+MAX_FRAME_SIZE = 1 << 20  # Refuse frames larger than 1 MiB (protects against garbage input)
+MAX_NAME_BYTES = 64       # Longest UTF-8 player name accepted in a hello or sent in a leaderboard page
+
+# --- Message Types ---
+MSG_HELLO = 1     # client -> server: magic + protocol version + feature flags + session to resume + player name
+MSG_WELCOME = 2   # server -> client: protocol version + player number + tick rate + room seed + session token + flags
+MSG_REJECT = 3    # server -> client: UTF-8 reason, connection is closed afterwards
+MSG_SNAPSHOT = 4  # server -> client: game state, delta-encoded against an acknowledged baseline
+MSG_INPUT = 5     # client -> server: input sequence number + held x/y axes
+MSG_COMMAND = 6   # client -> server: command id (see CMD_* below)
+MSG_ACK = 7       # client -> server: sequence number of the newest snapshot the client applied
+MSG_UDP_OFFER = 8 # server -> client: session token + UDP port of the optional datagram channel
+MSG_EVENT = 9     # server -> client: something that must not be lost (see EVENT_* below)
+MSG_LEADERBOARD_REQUEST = 10 # client -> server: first rank wanted + number of entries
+MSG_LEADERBOARD = 11 # server -> client: one page of the leaderboard
+
+# --- Hello Flags ---
+HELLO_FLAG_UDP = 1    # The client can receive snapshots and send inputs over UDP
+
+# --- Welcome Flags ---
+WELCOME_FLAG_RESUMED = 1 # The hello's session was resumed: same player, car and score as before the drop
+
+# --- Commands ---
+CMD_RESET_PLAYER = 1  # Player wants to play again after a crash
+CMD_LEAVE = 2         # Player quits; the server ends the session instead of holding the seat for a reconnect
+
+# --- Events ---
+EVENT_PLAYER_JOINED = 1
+EVENT_PLAYER_LEFT = 2
+EVENT_PLAYER_CRASHED = 3
+
+# --- Fixed-layout records ---
+FRAME_HEADER = struct.Struct('!IB')        # payload length, message type
+HELLO_PREFIX = struct.Struct('!4sH')       # magic, protocol version (stable across versions)
+HELLO = struct.Struct('!4sHBQ')            # magic, protocol version, feature flags, session token to resume (0 = none)
+WELCOME = struct.Struct('!HHHQQB')         # protocol version, player number, ticks per second, room seed, session token, flags
+INPUT = struct.Struct('!Ibb')              # input sequence number, x axis, y axis (-1, 0 or 1)
+COMMAND = struct.Struct('!B')              # command id
+UDP_OFFER = struct.Struct('!IH')           # session token, UDP port
+EVENT = struct.Struct('!BH')               # event id, player number
+ACK = struct.Struct('!I')                  # snapshot sequence number
+LEADERBOARD_REQUEST = struct.Struct('!IB') # offset (0 = best), entries wanted
+LEADERBOARD_HEADER = struct.Struct('!IIB') # offset, ranked players in total, entries in this page
+LEADERBOARD_ENTRY = struct.Struct('!III')  # best score, games played, total score; then the name
+SNAPSHOT_HEADER = struct.Struct('!IIIIB')  # seq, baseline seq (0 = full), tick, obstacle checksum, game_active
+COUNT = struct.Struct('!H')                # number of records in the section that follows
+PLAYER_KEY = struct.Struct('!HB')          # player number, field mask
+PLAYER_NUMBER = struct.Struct('!H')
+
+# Field layout of player records, in tuple order (see snapshots.py).
+# A delta record only carries the fields whose bit is set in its mask.
+PLAYER_FIELDS = ('h', 'h', 'I', '?', 'B', 'I')  # x, y, score, crashed, car_img_index, input_seq
+
+
+class ProtocolError(Exception):
+    """Raised when the peer sends data that does not follow the wire protocol."""
+
+
+def _unpack_exact(record, payload, what):
+    """Unpacks a fixed-layout payload; any other length is a ProtocolError, never a struct.error."""
+    if len(payload) != record.size:
+        raise ProtocolError(f"Malformed {what}: {len(payload)} bytes, expected {record.size}")
+    return record.unpack(payload)
+
+
+def encode_frame(msg_type, payload=b''):
+    """
+    Wraps a payload in a length-prefixed frame.
+    Args:
+        msg_type (int): One of the MSG_* constants.
+        payload (bytes): The message body.
+    Returns:
+        bytes: The complete frame, ready for sendall().
+    """
+    return FRAME_HEADER.pack(len(payload), msg_type) + payload
+
+
+class FrameDecoder:
+    """
+    Streaming decoder that turns arbitrary chunks of bytes from recv() into whole frames.
+    Partial frames are buffered until the rest of their bytes arrive.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def feed(self, data):
+        """
+        Adds received bytes to the buffer and extracts every complete frame.
+        Args:
+            data (bytes): Bytes returned by recv().
+        Returns:
+            list: (msg_type, payload) tuples for each complete frame, in order.
+        """
+        self._buffer += data
+        frames = []
+        offset = 0
+        buffer_len = len(self._buffer)
+        while buffer_len - offset >= FRAME_HEADER.size:
+            length, msg_type = FRAME_HEADER.unpack_from(self._buffer, offset)
+            if length > MAX_FRAME_SIZE:
+                raise ProtocolError(f"Frame of {length} bytes exceeds the {MAX_FRAME_SIZE} byte limit")
+            start = offset + FRAME_HEADER.size
+            end = start + length
+            if end > buffer_len:
+                break # Wait for the rest of this frame
+            frames.append((msg_type, bytes(self._buffer[start:end])))
+            offset = end
+        if offset:
+            del self._buffer[:offset] # Drop consumed bytes in one go
+        return frames
+
+    def pending(self):
+        """Returns the number of buffered bytes that do not form a whole frame yet."""
+        return len(self._buffer)
+
+
+# --- Handshake ---
+def encode_hello(flags=0, name='', session_token=0):
+    """
+    Builds the first frame a client sends after connecting.
+    Args:
+        flags (int): HELLO_FLAG_* bits for the optional features the client supports.
+        name (str): The player's name on the leaderboard; empty lets the server pick one.
+        session_token (int): Token from an earlier welcome, to take the player's seat back after a drop.
+    """
+    header = HELLO.pack(PROTOCOL_MAGIC, PROTOCOL_VERSION, flags, session_token)
+    return encode_frame(MSG_HELLO, header + name.encode('utf-8')[:MAX_NAME_BYTES])
+
+
+def decode_hello(payload):
+    """
+    Validates a client hello.
+    Returns:
+        tuple: (protocol version announced by the client, HELLO_FLAG_* bits, player name or '',
+                session token to resume or 0)
+    Raises:
+        ProtocolError: If the payload is malformed or the magic does not match.
+    """
+    if len(payload) < HELLO_PREFIX.size:
+        raise ProtocolError("Malformed hello")
+    magic, version = HELLO_PREFIX.unpack_from(payload)
+    if magic != PROTOCOL_MAGIC:
+        raise ProtocolError("Bad protocol magic")
+    if version != PROTOCOL_VERSION:
+        return version, 0, '', 0 # Other versions may lay out the rest differently; the caller rejects them
+    if len(payload) < HELLO.size:
+        raise ProtocolError(f"Truncated hello: {len(payload)} bytes")
+    if len(payload) > HELLO.size + MAX_NAME_BYTES:
+        raise ProtocolError("Player name too long")
+    name = payload[HELLO.size:].decode('utf-8', errors='replace')
+    _, _, flags, session_token = HELLO.unpack_from(payload)
+    return version, flags, name, session_token
+
+
+def encode_welcome(player_id, tick_rate, seed, session_token, flags=0):
+    """
+    Builds the server's reply to an accepted hello, carrying the assigned player ID, the
+    room's tick rate (clients need it to turn snapshot ticks into time), the room's seed
+    (clients generate the obstacles from it) and the session token a client sends in its
+    hello to reconnect as the same player. WELCOME_FLAG_RESUMED is set when the hello's
+    session was resumed.
+    """
+    return encode_frame(MSG_WELCOME, WELCOME.pack(PROTOCOL_VERSION, player_number(player_id), tick_rate, seed,
+                                                  session_token, flags))
+
+
+def decode_welcome(payload):
+    """
+    Returns:
+        tuple: (protocol version, player ID string, ticks per second, room seed, session token, WELCOME_FLAG_* bits)
+    """
+    version, number, tick_rate, seed, session_token, flags = _unpack_exact(WELCOME, payload, 'welcome')
+    return version, player_id_from_number(number), tick_rate, seed, session_token, flags
+
+
+def encode_reject(message):
+    """Builds a rejection frame with a human readable reason."""
+    return encode_frame(MSG_REJECT, message.encode('utf-8'))
+
+
+def decode_reject(payload):
+    return payload.decode('utf-8', errors='replace')
+
+
+# --- Client input ---
+# Clients do not send movement steps but the state of their controls: which way the player is
+# steering on each axis. The client resends it at a fixed rate with an increasing sequence
+# number; the server keeps the newest one and applies it once per simulation tick.
+def encode_input(seq, x_axis, y_axis):
+    """Builds a held-input frame (axes are -1, 0 or 1)."""
+    return encode_frame(MSG_INPUT, INPUT.pack(seq, x_axis, y_axis))
+
+
+def decode_input(payload):
+    """
+    Returns:
+        tuple: (input sequence number, x axis, y axis), axes clamped to -1..1
+    """
+    seq, x_axis, y_axis = _unpack_exact(INPUT, payload, 'input')
+    return seq, max(-1, min(x_axis, 1)), max(-1, min(y_axis, 1))
+
+
+def encode_command(command):
+    """Builds a command frame (e.g. CMD_RESET_PLAYER)."""
+    return encode_frame(MSG_COMMAND, COMMAND.pack(command))
+
+
+def decode_command(payload):
+    return _unpack_exact(COMMAND, payload, 'command')[0]
+
+
+def encode_udp_offer(token, port):
+    """Builds the offer of a UDP data channel, sent right after the welcome."""
+    return encode_frame(MSG_UDP_OFFER, UDP_OFFER.pack(token, port))
+
+
+def decode_udp_offer(payload):
+    """
+    Returns:
+        tuple: (session token, UDP port)
+    """
+    return _unpack_exact(UDP_OFFER, payload, 'UDP offer')
+
+
+def encode_event(event, player_id):
+    """Builds an event frame (EVENT_*) about one player."""
+    return encode_frame(MSG_EVENT, EVENT.pack(event, player_number(player_id)))
+
+
+def decode_event(payload):
+    """
+    Returns:
+        tuple: (event id, player ID string)
+    """
+    event, number = _unpack_exact(EVENT, payload, 'event')
+    return event, player_id_from_number(number)
+
+
+def encode_leaderboard_request(offset=0, count=10):
+    """Asks for `count` leaderboard entries starting at rank offset + 1."""
+    return encode_frame(MSG_LEADERBOARD_REQUEST, LEADERBOARD_REQUEST.pack(offset, count))
+
+
+def decode_leaderboard_request(payload):
+    """
+    Returns:
+        tuple: (offset, entries wanted)
+    """
+    return _unpack_exact(LEADERBOARD_REQUEST, payload, 'leaderboard request')
+
+
+def encode_leaderboard(offset, total, entries):
+    """
+    Builds a leaderboard page.
+    Args:
+        offset (int): Rank of the first entry minus one.
+        total (int): Ranked players in total.
+        entries (list): (name, best score, games played, total score) tuples, best first.
+    """
+    parts = [LEADERBOARD_HEADER.pack(offset, total, len(entries))]
+    for name, best, games, total_score in entries:
+        encoded_name = name.encode('utf-8')[:MAX_NAME_BYTES]
+        parts.append(LEADERBOARD_ENTRY.pack(best, games, total_score))
+        parts.append(bytes([len(encoded_name)]) + encoded_name)
+    return encode_frame(MSG_LEADERBOARD, b''.join(parts))
+
+
+def decode_leaderboard(payload):
+    """
+    Returns:
+        tuple: (offset, ranked players in total, [(name, best score, games played, total score), ...])
+    Raises:
+        ProtocolError: If the payload is truncated.
+    """
+    try:
+        offset, total, count = LEADERBOARD_HEADER.unpack_from(payload, 0)
+        position = LEADERBOARD_HEADER.size
+        entries = []
+        for _ in range(count):
+            best, games, total_score = LEADERBOARD_ENTRY.unpack_from(payload, position)
+            position += LEADERBOARD_ENTRY.size
+            name_length = payload[position]
+            name = payload[position + 1:position + 1 + name_length].decode('utf-8', errors='replace')
+            position += 1 + name_length
+            entries.append((name, best, games, total_score))
+    except (struct.error, IndexError) as e:
+        raise ProtocolError(f"Truncated leaderboard page: {e}")
+    return offset, total, entries
+
+
+def encode_ack(seq):
+    """Builds the acknowledgement a client sends after applying snapshot `seq`."""
+    return encode_frame(MSG_ACK, ACK.pack(seq))
+
+
+def decode_ack(payload):
+    return _unpack_exact(ACK, payload, 'ack')[0]
+
+
+# --- Snapshots ---
+# A snapshot frame is a delta between the snapshot being sent and a baseline snapshot the
+# client has acknowledged. Baseline 0 means "no baseline": every player is sent in full.
+# Layout after the header:
+#   changed players:   count, then [number, mask, masked fields...]
+#   removed players:   count, then [number]
+# Obstacles and the road are never sent; clients generate them from the room seed and check
+# them against the header's obstacle checksum.
+
+_record_structs = {} # (field layout, mask) -> struct.Struct, built on first use
+
+
+def _record_struct(fields, mask):
+    """Returns the struct that packs the fields selected by `mask`."""
+    key = (fields, mask)
+    record = _record_structs.get(key)
+    if record is None:
+        record = struct.Struct('!' + ''.join(f for bit, f in enumerate(fields) if mask & (1 << bit)))
+        _record_structs[key] = record
+    return record
+
+
+def _encode_entities(parts, key_struct, id_struct, fields, current, baseline):
+    """Appends the changed and removed sections for one entity type to `parts`."""
+    full_mask = (1 << len(fields)) - 1
+    changed = []
+    for key, values in current.items():
+        old_values = baseline.get(key)
+        if old_values is None:
+            mask = full_mask # New entity, send every field
+        else:
+            if old_values == values:
+                continue # Unchanged since the baseline
+            mask = 0
+            for bit, (new, old) in enumerate(zip(values, old_values)):
+                if new != old:
+                    mask |= 1 << bit
+        changed.append(key_struct.pack(key, mask))
+        changed.append(_record_struct(fields, mask).pack(*[v for bit, v in enumerate(values) if mask & (1 << bit)]))
+    removed = [key for key in baseline if key not in current]
+
+    parts.append(COUNT.pack(len(changed) // 2))
+    parts.extend(changed)
+    parts.append(COUNT.pack(len(removed)))
+    parts.extend(id_struct.pack(key) for key in removed)
+
+
+def encode_snapshot(snapshot, baseline=None):
+    """
+    Packs a snapshot into a frame, sending only what changed since `baseline`.
+    Args:
+        snapshot (Snapshot): The snapshot to send.
+        baseline (Snapshot, optional): A snapshot the client has acknowledged. None sends everything.
+    Returns:
+        bytes: A MSG_SNAPSHOT frame.
+    """
+    if baseline is None:
+        baseline = EMPTY_SNAPSHOT
+    parts = [SNAPSHOT_HEADER.pack(snapshot.seq, baseline.seq, snapshot.tick, snapshot.obstacle_checksum, snapshot.game_active)]
+    _encode_entities(parts, PLAYER_KEY, PLAYER_NUMBER, PLAYER_FIELDS, snapshot.players, baseline.players)
+    return encode_frame(MSG_SNAPSHOT, b''.join(parts))
+
+
+def _decode_entities(payload, offset, key_struct, id_struct, fields, baseline):
+    """
+    Rebuilds one entity dictionary from its changed and removed sections.
+    Returns:
+        tuple: (entities dict, offset just past the sections)
+    """
+    entities = dict(baseline)
+    (count,) = COUNT.unpack_from(payload, offset)
+    offset += COUNT.size
+    for _ in range(count):
+        key, mask = key_struct.unpack_from(payload, offset)
+        offset += key_struct.size
+        record = _record_struct(fields, mask)
+        values = iter(record.unpack_from(payload, offset))
+        offset += record.size
+        old_values = entities.get(key)
+        if old_values is None and mask != (1 << len(fields)) - 1:
+            raise ProtocolError(f"Partial update for unknown entity {key}")
+        entities[key] = tuple(
+            next(values) if mask & (1 << bit) else old_values[bit] for bit in range(len(fields))
+        )
+    (count,) = COUNT.unpack_from(payload, offset)
+    offset += COUNT.size
+    for _ in range(count):
+        (key,) = id_struct.unpack_from(payload, offset)
+        offset += id_struct.size
+        entities.pop(key, None)
+    return entities, offset
+
+
+def snapshot_baseline_seq(payload):
+    """Returns the baseline sequence number a snapshot payload was encoded against (0 = full)."""
+    if len(payload) < SNAPSHOT_HEADER.size:
+        raise ProtocolError(f"Truncated snapshot header: {len(payload)} bytes")
+    return SNAPSHOT_HEADER.unpack_from(payload, 0)[1]
+
+
+def decode_snapshot(payload, baseline=None):
+    """
+    Applies a snapshot payload to its baseline.
+    Args:
+        payload (bytes): Body of a MSG_SNAPSHOT frame.
+        baseline (Snapshot, optional): The snapshot named by snapshot_baseline_seq(payload).
+    Returns:
+        Snapshot: The reconstructed snapshot.
+    Raises:
+        ProtocolError: If the payload is truncated or does not match the baseline.
+    """
+    try:
+        seq, baseline_seq, tick, obstacle_checksum, game_active = SNAPSHOT_HEADER.unpack_from(payload, 0)
+        if baseline_seq == 0:
+            baseline = EMPTY_SNAPSHOT
+        elif baseline is None or baseline.seq != baseline_seq:
+            raise ProtocolError(f"Snapshot {seq} needs baseline {baseline_seq}")
+        offset = SNAPSHOT_HEADER.size
+        players, offset = _decode_entities(payload, offset, PLAYER_KEY, PLAYER_NUMBER, PLAYER_FIELDS, baseline.players)
+    except struct.error as e:
+        raise ProtocolError(f"Truncated snapshot: {e}")
+    if offset != len(payload):
+        raise ProtocolError(f"Snapshot has {len(payload) - offset} trailing bytes")
+    return Snapshot(seq, tick, bool(game_active), obstacle_checksum, players)
@@ -0,0 +1,219 @@
+from functools import lru_cache
+
+import pygame
+
+# --- Dirty-Rectangle Renderer ---
+# Redrawing the whole 1320x680 screen every frame (road image twice, every car, every text
+# string re-rendered through a freshly created font) costs most of a frame on software SDL.
+# The renderer instead keeps every car, obstacle and the scoreboard as a DirtySprite in a
+# LayeredDirty group, which repaints and uploads only the rectangles that changed:
+#
+#   - the road is pre-stacked into one opaque strip twice the screen height, and the background
+#     is a view into that strip at the current scroll position, so scrolling copies nothing.
+#     When the offset moves, only the columns the road image varies in are repainted: a plain
+#     road (or the grey fallback) never repaints, lane markings repaint their own bands. The
+#     bundled road.jpg is textured across its whole width, so with it every scrolling frame is
+#     a full-screen repaint and upload (about 3 ms of drawing for 1320x680 on software SDL, plus
+#     the upload); only frames where the road holds still, e.g. before the match starts, touch
+#     just the moving sprites,
+#   - sprites are marked dirty only when their position or image changed,
+#   - fonts are created once and text surfaces are rendered once per (text, font, color), and
+#     the scoreboard surface is rebuilt only when a score or crash flag changes.
+#
+# Screens drawn outside the renderer (pause, crash, intro) must call invalidate() afterwards.
+
+TEXT_CACHE_SIZE = 256 # Rendered text surfaces kept around (scores change slowly)
+FALLBACK_COLOR = (0, 0, 255) # Drawn for image indices the client has no image for
+FALLBACK_SIZE = (65, 130)
+SCORE_FONT = (None, 25) # (font name or .ttf file, size) of the scoreboard
+SCORE_LINE_HEIGHT = 30
+
+# Draw order, bottom to top (same as the order the loop used to blit in)
+LAYER_OWN_CAR = 1
+LAYER_OTHER_CARS = 2
+LAYER_OBSTACLES = 3
+LAYER_HUD = 4
+
+
+def scrolling_columns(road_strip, height):
+    """
+    Returns the full-height screen rectangles covering every column of the road that changes
+    when it scrolls. A column that is one color all the way down looks the same at any offset.
+    Args:
+        road_strip (pygame.Surface): The road stacked twice, `height` rows each.
+        height (int): Screen height.
+    """
+    width = road_strip.get_width()
+    # Each row against the row below it: a column is constant iff no pixel differs
+    below = road_strip.subsurface((0, 1, width, height))
+    above = road_strip.subsurface((0, 0, width, height))
+    diff = above.copy()
+    diff.blit(below, (0, 0), special_flags=pygame.BLEND_RGB_SUB)
+    reverse = below.copy()
+    reverse.blit(above, (0, 0), special_flags=pygame.BLEND_RGB_SUB)
+    diff.blit(reverse, (0, 0), special_flags=pygame.BLEND_RGB_ADD)
+    changing = pygame.mask.from_threshold(diff, (0, 0, 0), (1, 1, 1, 255))
+    changing.invert()
+    columns = []
+    for rect in sorted(changing.get_bounding_rects(), key=lambda rect: rect.x):
+        if columns and rect.x <= columns[-1].right:
+            columns[-1].width = max(columns[-1].right, rect.right) - columns[-1].x
+        else:
+            columns.append(pygame.Rect(rect.x, 0, rect.width, height))
+    return columns
+
+
+@lru_cache(maxsize=None)
+def get_font(name, size):
+    """
+    Returns a cached font; creating fonts (especially SysFont lookups) is slow.
+    Args:
+        name (str or None): A system font name, a .ttf file, or None for pygame's default font.
+        size (int): Point size.
+    """
+    if name is None or name.endswith('.ttf'):
+        return pygame.font.Font(name, size)
+    return pygame.font.SysFont(name, size)
+
+
+@lru_cache(maxsize=TEXT_CACHE_SIZE)
+def render_text(text, font_name, size, color):
+    """Returns a cached antialiased text surface."""
+    return get_font(font_name, size).render(text, True, color)
+
+
+class ImageSprite(pygame.sprite.DirtySprite):
+    """A sprite that is only marked dirty when its image or position changes."""
+
+    def __init__(self, image, layer):
+        super().__init__()
+        self._layer = layer
+        self.image = image
+        self.rect = image.get_rect()
+
+    def place(self, image, x, y):
+        x, y = int(x), int(y)
+        if image is not self.image or (x, y) != self.rect.topleft:
+            self.image = image
+            self.rect = image.get_rect(topleft=(x, y))
+            self.dirty = 1
+
+
+class GameRenderer:
+    """
+    Draws the game screen with dirty-rectangle updates.
+    Usage:
+        renderer = GameRenderer(screen, road_img, own_car_img, other_car_imgs)
+        rects = renderer.draw(render_state, players, own_id, own_position)
+        pygame.display.update(rects)
+    """
+
+    def __init__(self, screen, road_img, own_car_img, other_car_imgs):
+        """
+        Args:
+            screen (pygame.Surface): The display surface.
+            road_img (pygame.Surface): Road background, tiled vertically while scrolling.
+            own_car_img (pygame.Surface): Image of this client's car.
+            other_car_imgs (list): Images indexed by car_img_index / img_index.
+        """
+        self.screen = screen
+        self.width, self.height = screen.get_size()
+        self.own_car_img = own_car_img
+        self.other_car_imgs = other_car_imgs
+        self.fallback_img = pygame.Surface(FALLBACK_SIZE).convert()
+        self.fallback_img.fill(FALLBACK_COLOR)
+
+        # Road stacked twice: the view at offset r is the strip from row height - r down
+        road = pygame.transform.scale(road_img, (self.width, self.height)).convert()
+        self.road_strip = pygame.Surface((self.width, self.height * 2)).convert()
+        self.road_strip.blit(road, (0, 0))
+        self.road_strip.blit(road, (0, self.height))
+        self.scroll_columns = scrolling_columns(self.road_strip, self.height)
+        self.background = self.road_strip.subsurface((0, self.height, self.width, self.height))
+        self._road_offset = None # Offset the background was last drawn at; None forces a repaint
+
+        self.sprites = pygame.sprite.LayeredDirty()
+        self.sprites.clear(screen, self.background)
+        self.own_car = ImageSprite(own_car_img, LAYER_OWN_CAR)
+        self.hud = ImageSprite(pygame.Surface((1, 1), pygame.SRCALPHA), LAYER_HUD)
+        self.sprites.add(self.hud)
+        self._cars = {}       # {player_id: ImageSprite} of other players
+        self._obstacles = {}  # {obstacle id: ImageSprite}
+        self._scoreboard = None # Scoreboard contents the HUD image was built from
+
+    def invalidate(self):
+        """Forces a full repaint on the next draw (after something else drew over the screen)."""
+        self._road_offset = None
+
+    def _image(self, index):
+        if 0 <= index < len(self.other_car_imgs):
+            return self.other_car_imgs[index]
+        return self.fallback_img # Should not happen if the server sends valid indices
+
+    def _sync(self, sprites, entries, layer):
+        """Creates, moves and removes sprites so `sprites` matches {key: (image, x, y)}."""
+        for key in [key for key in sprites if key not in entries]:
+            sprites.pop(key).kill()
+        for key, (image, x, y) in entries.items():
+            sprite = sprites.get(key)
+            if sprite is None:
+                sprite = sprites[key] = ImageSprite(image, layer)
+                self.sprites.add(sprite)
+            sprite.place(image, x, y)
+
+    def _update_scoreboard(self, players, own_id):
+        scoreboard = tuple((player_id, data['score'], data['crashed']) for player_id, data in players.items())
+        if scoreboard == self._scoreboard:
+            return
+        self._scoreboard = scoreboard
+        lines = []
+        for player_id, score, crashed in scoreboard:
+            color = (0, 200, 0) if player_id == own_id else (0, 0, 0) # Highlight this client's score
+            score_text = render_text(f"{player_id}: SCORE {score}", *SCORE_FONT, color)
+            crashed_text = render_text("CRASHED!", *SCORE_FONT, (200, 0, 0)) if crashed else None
+            lines.append((score_text, crashed_text))
+        width = max([score.get_width() + (crashed.get_width() + 10 if crashed else 0) for score, crashed in lines] or [1])
+        image = pygame.Surface((width, max(1, len(lines) * SCORE_LINE_HEIGHT)), pygame.SRCALPHA)
+        for row, (score_text, crashed_text) in enumerate(lines):
+            image.blit(score_text, (0, row * SCORE_LINE_HEIGHT))
+            if crashed_text:
+                image.blit(crashed_text, (score_text.get_width() + 10, row * SCORE_LINE_HEIGHT))
+        self.hud.place(image, 0, 0)
+
+    def draw(self, render_state, players, own_id, own_position):
+        """
+        Brings the screen up to date.
+        Args:
+            render_state (dict): Interpolated game state (road_offset, obstacles, other players).
+            players (dict): Newest player states, for the scoreboard.
+            own_id (str): This client's player ID.
+            own_position (tuple or None): Where to draw this client's car; None hides it.
+        Returns:
+            list: The screen rectangles that changed, for pygame.display.update().
+        """
+        road_offset = int(round(render_state.get('road_offset', 0))) % self.height
+        if road_offset != self._road_offset:
+            self.background = self.road_strip.subsurface((0, self.height - road_offset, self.width, self.height))
+            self.sprites.clear(self.screen, self.background)
+            for rect in [self.screen.get_rect()] if self._road_offset is None else self.scroll_columns:
+                self.sprites.repaint_rect(rect)
+            self._road_offset = road_offset
+
+        if own_position is None:
+            self.own_car.kill()
+        else:
+            if not self.own_car.alive():
+                self.sprites.add(self.own_car)
+            self.own_car.place(self.own_car_img, *own_position)
+
+        self._sync(self._cars, {
+            player_id: (self._image(data.get('car_img_index', 0)), data['x'], data['y'])
+            for player_id, data in render_state.get('players', {}).items() if player_id != own_id
+        }, LAYER_OTHER_CARS)
+        self._sync(self._obstacles, {
+            obstacle['id']: (self._image(obstacle['img_index']), obstacle['x'], obstacle['y'])
+            for obstacle in render_state.get('obstacles', [])
+        }, LAYER_OBSTACLES)
+        self._update_scoreboard(players, own_id)
+
+        return self.sprites.draw(self.screen)
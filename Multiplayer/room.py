@@ -0,0 +1,399 @@
+import asyncio
+import os
+import random
+import sys
+import time
+
+# The game rules live in the simulation core shared with the single-player game
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'shared'))
+
+import metrics
+import replay
+import simulation
+import protocol
+from broadphase import SpatialHash
+from scheduler import FixedTimestep
+from simulation import THING_WIDTH, THING_HEIGHT, MULTIPLAYER_RULES, MULTIPLAYER_TICK_RATE
+from snapshots import SnapshotHistory, capture_snapshot
+
+# --- Room Configuration ---
+ROOM_CAPACITY = 4    # Maximum number of players in one room (one match)
+TICK_RATE = 20       # Default simulation ticks per second (20, 30 and 60 are all supported)
+BASE_TICK_RATE = MULTIPLAYER_TICK_RATE # Tick rate the per-tick speeds below were tuned for
+MAX_CATCH_UP_TICKS = 5 # Ticks a room may run back to back after a stall before dropping time
+
+# --- Game Constants (Server-side) ---
+# Sizes and speeds come from the simulation core's multiplayer rules (pixels per tick at BASE_TICK_RATE)
+INITIAL_THING_SPEED = MULTIPLAYER_RULES.obstacle_speed # Base speed of obstacles
+ROAD_SPEED = MULTIPLAYER_RULES.road_speed     # Road scroll speed
+PLAYER_SPEED = MULTIPLAYER_RULES.player_speed # Player car speed while a direction is held
+
+
+class Room:
+    """
+    One match: up to ROOM_CAPACITY players sharing a road and its obstacles.
+    A room owns its world (a simulation.State), snapshot history and simulation tick, so any
+    number of rooms can run side by side on the server's event loop.
+    """
+
+    def __init__(self, room_id, tick_rate=TICK_RATE, seed=None):
+        self.room_id = room_id
+        # Room-level fields; the match itself (players, obstacles, road) is self.world.
+        # Both are only touched from the event loop thread, so they need no lock.
+        self.game_state = {
+            'game_active': False, # True when at least one player is connected
+            'player_count': 0,  # Current number of connected players
+            'player_ids': []    # List of active player IDs for easy iteration
+        }
+        self.player_inputs = {} # Newest held input of each player: {player_id: (input_seq, x_axis, y_axis)}
+        self.obstacle_index = SpatialHash() # Collision broadphase over the obstacle slots, kept in sync with the world
+        self.tick = 0                # Number of simulation ticks this room has run
+        self.scheduler = FixedTimestep(tick_rate, MAX_CATCH_UP_TICKS)
+        # Speeds are given per tick at BASE_TICK_RATE; scaling them keeps obstacles and the road
+        # moving at the same on-screen speed whatever tick rate the room runs at.
+        self.rules = simulation.rules_for_tick_rate(MULTIPLAYER_RULES, tick_rate, BASE_TICK_RATE)
+        self.seed = random.getrandbits(64) if seed is None else seed # Seed of every obstacle in the match
+        self.world = None
+
+        self.connections = {}      # {player_id: ClientOutbox}, None while the seat is held for a reconnect
+        self.client_acked_seq = {} # Newest snapshot sequence number each client acknowledged
+        self.snapshot_history = SnapshotHistory() # Recent snapshots, used as baselines for delta encoding
+        self.snapshot_seq = 0      # Sequence number of the last snapshot taken
+        self.published_snapshot = None # Newest immutable snapshot, swapped in whole after each tick
+        self.capture_seconds = 0.0 # Time the last publish spent capturing, for the serialization phase
+
+        self.tick_seconds = 0.0    # Total wall time spent in update + broadcast, for the budget report
+        self.slow_disconnects = 0  # Clients dropped because their outbound queue stayed backed up
+        self.phase_timer = metrics.registry.phase_timer() # Per-phase tick timings for the metrics endpoint
+        self.task = None           # asyncio task running this room's tick loop
+        self.recorder = None       # replay.ReplayRecorder while the match is being recorded
+        self.leaderboard = None    # leaderboard.Leaderboard that finished runs are recorded to, if any
+        self.player_names = {}     # {player_id: name on the leaderboard}
+
+        self.spawn_initial_obstacles()
+
+    # --- Obstacle Management ---
+    def spawn_initial_obstacles(self):
+        """Starts the match world with its initial obstacles when the room opens."""
+        self.world = simulation.new_game(self.seed, self.rules)
+        for slot, obstacle in enumerate(self.world.obstacles):
+            self.obstacle_index.insert(slot, slot, obstacle.x, obstacle.y, THING_WIDTH, THING_HEIGHT)
+
+    def sync_obstacle_index(self):
+        """
+        Moves the broadphase entries to where the obstacles are now. Entries are keyed by obstacle
+        slot, and a respawned obstacle takes over its predecessor's slot, so nothing is ever
+        inserted or removed after the start.
+        """
+        obstacle_index = self.obstacle_index
+        for slot, obstacle in enumerate(self.world.obstacles):
+            obstacle_index.move(slot, obstacle.x, obstacle.y)
+
+    def nearby_obstacles(self, x, y, w, h):
+        """Broadphase candidates for simulation.detect_collisions()."""
+        obstacles = self.world.obstacles
+        return [obstacles[slot] for slot in self.obstacle_index.query(x, y, w, h)]
+
+    # --- Replay Recording ---
+    def start_recording(self, directory):
+        """Records the match from now on to a new replay file in `directory` (see shared/replay.py)."""
+        path = replay.replay_path(directory, f"room{self.room_id}")
+        self.recorder = replay.ReplayRecorder(path, self.seed, self.rules, self.scheduler.tick_rate)
+        print(f"Room {self.room_id}: recording to {path}")
+
+    def stop_recording(self):
+        if self.recorder:
+            self.recorder.close(self.world.tick)
+            self.recorder = None
+
+    # --- Leaderboard ---
+    def record_score(self, player_id, score):
+        """Puts a finished run on the leaderboard; it is written in the background (see shared/leaderboard.py)."""
+        if self.leaderboard is not None:
+            self.leaderboard.record(self.player_names.get(player_id, player_id), score, 'multi')
+
+    def running_score(self, player_id):
+        """Returns the score of the player's run in progress, or None if they crashed (already recorded)."""
+        player = self.world.players.get(player_id)
+        return None if player is None or player.crashed else player.score
+
+    # --- Seats ---
+    def free_seats(self):
+        """Returns how many more players this room can take (seats held for a reconnect count as taken)."""
+        return ROOM_CAPACITY - len(self.connections)
+
+    def is_empty(self):
+        return not self.connections
+
+    def add_player(self, player_id, outbox, name=None):
+        """
+        Puts a player who completed the handshake into the match and starts sending them snapshots.
+        Args:
+            player_id (str): The unique ID assigned to this player.
+            outbox (ClientOutbox): Send queue of the player's connection.
+            name (str, optional): The player's name on the leaderboard; defaults to the player ID.
+        """
+        self.player_names[player_id] = name or player_id
+        # Assign a random car image index to the player for their representation on other clients
+        player_car_img_index = random.randint(0, 4) # Assuming 5 car images (index 0-4)
+
+        self.create_player(player_id, player_car_img_index)
+        self.game_state['player_count'] += 1
+        self.game_state['player_ids'].append(player_id)
+        if self.game_state['player_count'] >= 1:
+            self.game_state['game_active'] = True # Activate the tick when the first player joins
+        self.connections[player_id] = outbox
+        self.send_event(protocol.EVENT_PLAYER_JOINED, player_id)
+
+    def park_player(self, player_id):
+        """
+        Keeps the seat, car and score of a player whose connection dropped, for a reconnect
+        (see sessions.py). The car holds still until the player is back.
+        """
+        if player_id not in self.game_state['player_ids']:
+            return
+        self.connections[player_id] = None # Seat stays taken; nothing is sent to it
+        self.client_acked_seq.pop(player_id, None)
+        self.hold_still(player_id)
+
+    def resume_player(self, player_id, outbox):
+        """
+        Attaches a reconnected player's new connection and resyncs it right away with the newest
+        published snapshot in full, so the client need not wait for the next tick. Later
+        snapshots are full too until the client acknowledges one, then deltas resume.
+        Returns:
+            bool: False if the player is no longer in the room.
+        """
+        if player_id not in self.game_state['player_ids']:
+            return False
+        self.connections[player_id] = outbox
+        self.client_acked_seq.pop(player_id, None) # Baselines the old connection acked may never have arrived
+        if self.published_snapshot is not None:
+            outbox.send_snapshot(protocol.encode_snapshot(self.published_snapshot))
+        return True
+
+    def remove_player(self, player_id):
+        """Removes a player (or a reserved seat) from the room."""
+        self.connections.pop(player_id, None)
+        self.client_acked_seq.pop(player_id, None)
+        if player_id in self.game_state['player_ids']:
+            score = self.running_score(player_id)
+            if score: # Leaving mid-run still counts
+                self.record_score(player_id, score)
+            self.delete_player(player_id)
+            self.game_state['player_ids'].remove(player_id)
+            self.game_state['player_count'] -= 1
+            if self.game_state['player_count'] == 0:
+                self.game_state['game_active'] = False # Pause the match if no players left
+            self.send_event(protocol.EVENT_PLAYER_LEFT, player_id)
+        self.player_names.pop(player_id, None)
+
+    # --- Player State ---
+    def create_player(self, player_id, car_img_index):
+        """Creates the state of a newly joined player."""
+        self.world = simulation.add_player(self.world, player_id, car_img_index)
+        self.player_inputs[player_id] = (0, 0, 0) # No input received yet: hold still
+        if self.recorder:
+            self.recorder.join(self.world.tick, player_id, car_img_index)
+
+    def delete_player(self, player_id):
+        """Drops the state of a player who left."""
+        self.world = simulation.remove_player(self.world, player_id)
+        del self.player_inputs[player_id]
+        if self.recorder:
+            self.recorder.leave(self.world.tick, player_id)
+
+    def store_input(self, player_id, seq, x_axis, y_axis):
+        """Keeps a player's newest held-input state; stale (reordered or repeated) inputs are ignored."""
+        held = self.player_inputs.get(player_id) # Player may already be gone
+        if held and seq > held[0]:
+            self.player_inputs[player_id] = (seq, x_axis, y_axis)
+
+    def hold_still(self, player_id):
+        """Releases a player's held direction; the sequence number is kept, so stale inputs stay ignored."""
+        held = self.player_inputs.get(player_id)
+        if held:
+            self.player_inputs[player_id] = (held[0], 0, 0)
+
+    def reset_player(self, player_id):
+        """Puts a crashed player back at the start with a zero score."""
+        if player_id in self.world.players:
+            print(f"Player {player_id} requested reset.")
+            self.world = simulation.reset_player(self.world, player_id)
+            if self.recorder:
+                self.recorder.reset(self.world.tick, player_id)
+
+    # --- Client Messages ---
+    def handle_client_message(self, player_id, msg_type, payload):
+        """
+        Applies a single decoded frame from a client to the room's game state.
+        Args:
+            player_id (str): The player who sent the frame.
+            msg_type (int): One of the protocol.MSG_* constants.
+            payload (bytes): The frame body.
+        """
+        if msg_type == protocol.MSG_INPUT:
+            seq, x_axis, y_axis = protocol.decode_input(payload)
+            self.store_input(player_id, seq, x_axis, y_axis)
+        elif msg_type == protocol.MSG_COMMAND:
+            command = protocol.decode_command(payload)
+            if command == protocol.CMD_RESET_PLAYER:
+                # Client requested to reset after a crash
+                self.reset_player(player_id)
+            else:
+                print(f"Unknown command {command} from {player_id}")
+        elif msg_type == protocol.MSG_ACK:
+            seq = protocol.decode_ack(payload)
+            if seq > self.client_acked_seq.get(player_id, 0): # Never move the baseline backwards
+                self.client_acked_seq[player_id] = seq
+        else:
+            print(f"Unexpected message type {msg_type} from {player_id}")
+
+    # --- Simulation ---
+    def update_game_state(self):
+        """
+        Advances the match by one tick: the phases of simulation.step(), run one at a time so
+        each can be timed, with the room's broadphase answering the collision queries.
+        """
+        before = world = self.world
+        timer = self.phase_timer
+        timer.start()
+
+        # Move every player by their held input, once per tick whatever the packet rate
+        inputs = {player_id: (x_axis, y_axis) for player_id, (_, x_axis, y_axis) in self.player_inputs.items()}
+        if self.recorder:
+            self.recorder.record_tick(world, inputs)
+        world = simulation.move_players(world, inputs)
+        timer.lap('input')
+
+        world = simulation.move_obstacles(world)
+        timer.lap('obstacles')
+
+        # Obstacles past the screen bottom score a point for every player still racing and respawn above it
+        world = simulation.respawn_and_score(world)
+        timer.lap('respawn_scoring')
+
+        # Collision detection (server-authoritative). The broadphase narrows each player down to
+        # the obstacles in the cells its car covers, so the exact test only runs for nearby pairs.
+        self.world = world
+        self.sync_obstacle_index()
+        world = simulation.detect_collisions(world, self.nearby_obstacles)
+        for player_id in simulation.new_crashes(before, world):
+            print(f"Room {self.room_id}: player {player_id} crashed!")
+            self.send_event(protocol.EVENT_PLAYER_CRASHED, player_id)
+            self.record_score(player_id, world.players[player_id].score)
+        timer.lap('collision')
+
+        self.world = simulation.advance_road(world)
+        self.tick = self.world.tick
+
+    def capture_snapshot(self, seq):
+        """Returns an immutable copy of the state clients draw (see snapshots.capture_snapshot)."""
+        world = self.world
+        return capture_snapshot(seq, world, self.player_inputs, self.game_state['game_active'],
+                                simulation.obstacle_checksum(world.seed, world.tick, world.obstacles))
+
+    def publish_snapshot(self):
+        """
+        Captures the state left by the due ticks as an immutable snapshot and makes it the
+        room's published snapshot by swapping a single reference.
+        Returns:
+            Snapshot: The published snapshot.
+        """
+        started = time.perf_counter()
+        self.snapshot_seq += 1
+        snapshot = self.capture_snapshot(self.snapshot_seq)
+        self.snapshot_history.add(snapshot) # Remember it as a future delta baseline
+        self.published_snapshot = snapshot
+        self.capture_seconds = time.perf_counter() - started
+        return snapshot
+
+    def broadcast_snapshot(self, snapshot):
+        """
+        Sends a published snapshot to every player in the room, delta-encoded against the newest
+        snapshot each client acknowledged. Only reads the snapshot, never the live game state.
+        """
+        started = time.perf_counter()
+        encode_seconds = 0.0
+
+        encoded_by_baseline = {} # Clients that acked the same baseline share one encoded frame
+        for player_id, outbox in self.connections.items():
+            if outbox is None:
+                continue # Seat held for a player who is reconnecting
+            if outbox.closed:
+                continue # handle_client will clean up this connection
+            if outbox.is_stalled():
+                # The client has not kept up for too long; dropping it frees its queue and lets
+                # handle_client remove the player.
+                print(f"Room {self.room_id}: player {player_id} disconnected, too far behind "
+                      f"({outbox.dropped_snapshots} snapshots dropped).")
+                self.slow_disconnects += 1
+                outbox.close()
+                continue
+            # If the acked snapshot is too old to still be in the history (or nothing was acked yet)
+            # the client gets a full snapshot.
+            baseline = self.snapshot_history.get(self.client_acked_seq.get(player_id, 0))
+            baseline_seq = baseline.seq if baseline else 0
+            frame = encoded_by_baseline.get(baseline_seq)
+            if frame is None:
+                encode_started = time.perf_counter()
+                frame = protocol.encode_snapshot(snapshot, baseline)
+                encode_seconds += time.perf_counter() - encode_started
+                encoded_by_baseline[baseline_seq] = frame
+            session = outbox.datagram_session
+            if session is not None and session.bound and session.send_frames(frame):
+                continue # Sent as an unreliable datagram; a lost one is superseded by the next
+            outbox.send_snapshot(frame) # Queued for the connection's sender task; never blocks the tick
+
+        # Capturing and encoding count as serialization, everything else here as broadcast
+        phases = metrics.registry.tick_phases
+        phases['serialization'].observe(self.capture_seconds + encode_seconds)
+        phases['broadcast'].observe(time.perf_counter() - started - encode_seconds)
+
+    def send_event(self, event, player_id):
+        """
+        Tells every player in the room about an event (protocol.EVENT_*) concerning `player_id`.
+        Events must arrive, so they go over the reliable part of the UDP channel or over TCP.
+        """
+        frame = protocol.encode_event(event, player_id)
+        for outbox in self.connections.values():
+            if outbox is None or outbox.closed:
+                continue
+            session = outbox.datagram_session
+            if session is not None and session.bound:
+                session.send_reliable(frame)
+            else:
+                outbox.send(frame)
+
+    async def run(self):
+        """
+        The room's game logic loop, scheduled as its own task on the server's event loop.
+        The fixed-timestep scheduler decides how many ticks are due, so the simulation keeps
+        its rate even when a tick or the event loop runs late; one snapshot is published after
+        the due ticks have run. The loop then yields once, so input that arrived during the
+        ticks is applied before the snapshot is encoded and sent rather than after.
+        """
+        scheduler = self.scheduler
+        while True:
+            if not self.game_state['game_active']:
+                scheduler.reset() # Paused time must not be caught up later
+                await asyncio.sleep(0.1) # Sleep until the first player finishes the handshake
+                continue
+
+            started = time.perf_counter()
+            due = scheduler.due_ticks()
+            for _ in range(due):
+                self.update_game_state()
+            snapshot = self.publish_snapshot() if due else None
+            self.tick_seconds += time.perf_counter() - started
+
+            if snapshot is not None:
+                await asyncio.sleep(0) # Let waiting input handlers run; the snapshot cannot change
+                started = time.perf_counter()
+                self.broadcast_snapshot(snapshot)
+                self.tick_seconds += time.perf_counter() - started
+
+            delay = scheduler.time_until_next_tick()
+            wake_at = time.perf_counter() + delay
+            await asyncio.sleep(delay)
+            metrics.registry.loop_lag.observe(max(0.0, time.perf_counter() - wake_at))
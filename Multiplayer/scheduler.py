@@ -0,0 +1,82 @@
+import time
+
+# --- Fixed-Timestep Scheduling ---
+# The simulation must advance by exactly one tick per tick interval of real time, no matter
+# how long each tick takes to compute or how late the event loop wakes us up. Sleeping a fixed
+# amount after doing the work lets the tick rate drift down under load; instead the scheduler
+# measures elapsed time on a monotonic clock, accumulates it, and tells the caller how many
+# whole ticks are due.
+
+DEFAULT_MAX_CATCH_UP_TICKS = 5 # Never run more than this many ticks back to back to catch up
+
+
+class FixedTimestep:
+    """
+    Deadline-based fixed-timestep scheduler with an accumulator.
+    Usage:
+        scheduler = FixedTimestep(tick_rate=20)
+        while running:
+            for _ in range(scheduler.due_ticks()):
+                step()
+            await asyncio.sleep(scheduler.time_until_next_tick())
+    """
+
+    def __init__(self, tick_rate, max_catch_up_ticks=DEFAULT_MAX_CATCH_UP_TICKS, clock=time.monotonic):
+        """
+        Args:
+            tick_rate (float): Simulation ticks per second (e.g. 20, 30 or 60).
+            max_catch_up_ticks (int): Upper bound on ticks returned by one due_ticks() call.
+                Time beyond that is dropped so a long stall cannot cause a burst of catch-up work.
+            clock (callable): Monotonic time source in seconds, replaceable for testing.
+        """
+        self.tick_rate = tick_rate
+        self.tick_interval = 1.0 / tick_rate
+        self.max_catch_up_ticks = max_catch_up_ticks
+        self._clock = clock
+        self._last_time = None
+        self._accumulator = 0.0
+
+        self.ticks = 0          # Ticks handed out so far
+        self.overruns = 0       # Wake-ups that found more than one tick due (the loop fell behind)
+        self.dropped_ticks = 0  # Ticks discarded because they exceeded max_catch_up_ticks
+
+    def reset(self):
+        """Forgets accumulated time, e.g. after the simulation was paused."""
+        self._last_time = None
+        self._accumulator = 0.0
+
+    def due_ticks(self):
+        """
+        Adds the time elapsed since the previous call to the accumulator.
+        Returns:
+            int: Number of ticks the caller must run now (0 .. max_catch_up_ticks).
+        """
+        now = self._clock()
+        if self._last_time is None:
+            # First call after start or reset: run one tick immediately
+            self._last_time = now
+            self._accumulator = 0.0
+            self.ticks += 1
+            return 1
+
+        self._accumulator += now - self._last_time
+        self._last_time = now
+
+        due = int(self._accumulator / self.tick_interval)
+        if due > 1:
+            self.overruns += 1
+        if due > self.max_catch_up_ticks:
+            self.dropped_ticks += due - self.max_catch_up_ticks
+            self._accumulator -= (due - self.max_catch_up_ticks) * self.tick_interval
+            due = self.max_catch_up_ticks
+
+        self._accumulator -= due * self.tick_interval
+        self.ticks += due
+        return due
+
+    def time_until_next_tick(self):
+        """Returns the seconds to sleep until the next tick is due (never negative)."""
+        if self._last_time is None:
+            return 0.0
+        elapsed = self._clock() - self._last_time
+        return max(0.0, self.tick_interval - self._accumulator - elapsed)
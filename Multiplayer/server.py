@@ -1,286 +1,424 @@
-import socket
-import threading
-import time
-import random
-import json
+import argparse
+import asyncio
+
+import arrayworld
+import metrics
+import protocol
+import udp
+from outbound import ClientOutbox
+from sessions import SessionTable
+from room import Room, TICK_RATE
+from leaderboard import Leaderboard # In shared/, which importing room put on the import path
 
 # --- Server Configuration ---
 HOST = '127.0.0.1'  # Standard loopback interface address (localhost)
 PORT = 65432        # Port to listen on (non-privileged ports are > 1023)
-MAX_PLAYERS = 4     # Maximum number of players allowed to connect
-
-# --- Game Constants (Server-side) ---
-DISPLAY_W = 1320    # Width of the game display
-DISPLAY_H = 680     # Height of the game display
-CAR_WIDTH = 77      # Width of the player car
-THING_WIDTH = 65    # Width of obstacle cars
-THING_HEIGHT = 130  # Height of obstacle cars
-INITIAL_THING_SPEED = 7 # Base speed of obstacles
-
-# --- Game State ---
-# This dictionary holds the authoritative state of the game.
-# It is shared across threads and protected by a lock.
-game_state = {
-    'players': {},      # Dictionary of active players: {player_id: {x, y, score, crashed, car_img_index}}
-    'obstacles': [],    # List of active obstacles: [{id, x, y, speed, img_index}]
-    'road_offset': 0,   # For continuous road scrolling visual effect (client side)
-    'game_active': False, # True when at least one player is connected
-    'player_count': 0,  # Current number of connected players
-    'player_ids': []    # List of active player IDs for easy iteration
-}
-
-# Lock for thread-safe access to game_state to prevent race conditions
-game_state_lock = threading.Lock()
-# Lock for thread-safe access to active_connections
-active_connections_lock = threading.Lock()
-
-# --- Obstacle Management ---
-obstacle_id_counter = 0 # Unique ID counter for obstacles
-
-def create_new_obstacle(y_offset=0):
+MAX_ROOMS = 500     # Maximum number of concurrent matches (rooms of up to 4 players each)
+LISTEN_BACKLOG = 128 # Pending connections the OS queues before accept
+BUDGET_REPORT_INTERVAL = 10.0 # Seconds between tick budget reports
+tick_rate = TICK_RATE # Simulation ticks per second for new rooms (set with --tick-rate)
+array_world = False   # Run rooms on the NumPy array-backed world (set with --array-world)
+udp_enabled = False   # Offer clients a UDP data channel on PORT (set with --udp)
+udp_link = None       # udp.LinkSimulator for outgoing datagrams (set with --sim-loss/--sim-latency)
+udp_endpoint = None   # The server's udp.ServerDatagramEndpoint while UDP is enabled
+metrics_port = None   # Serve Prometheus metrics on 127.0.0.1:metrics_port (set with --metrics-port)
+metrics_socket = None # ... or on this Unix socket path (set with --metrics-socket)
+METRICS_HOST = '127.0.0.1' # The metrics endpoint is only ever exposed locally
+record_dir = None     # Record every room as a replay file in this directory (set with --record)
+leaderboard_path = None # Keep a persistent leaderboard in this SQLite file (set with --leaderboard)
+leaderboard = None    # The server's leaderboard.Leaderboard while one is kept
+LEADERBOARD_PAGE_MAX = 50 # Entries sent per leaderboard request at most
+
+# --- Rooms ---
+# Every connection and every room tick run as coroutines on a single asyncio event loop,
+# so rooms and their state are only ever touched from one thread and need no locks.
+rooms = {}              # Open rooms: {room_id: Room}
+next_room_id = 1        # Counter for assigning unique room IDs
+next_player_id = 1      # Counter for assigning unique player IDs (unique across all rooms)
+sessions = SessionTable() # Players' seats by session token, held for a while after a drop (see sessions.py)
+
+def find_room_for_player():
     """
-    Creates a new obstacle with a random position and speed.
-    Args:
-        y_offset (int): Vertical offset to start the obstacle further up the screen.
+    Picks the room a joining player is placed in: the fullest room that still has a free seat,
+    so matches fill up before new ones are opened. Creates a room when none has space.
     Returns:
-        dict: A dictionary representing the new obstacle.
+        Room or None: A room with at least one free seat, or None if the server is full.
     """
-    global obstacle_id_counter
-    obstacle_id_counter += 1
-    return {
-        'id': obstacle_id_counter,
-        'x': random.randrange(0, DISPLAY_W - THING_WIDTH),  # Random X position within screen bounds
-        'y': -THING_HEIGHT - y_offset,                      # Start above the screen
-        'speed': INITIAL_THING_SPEED + random.randint(0, 5), # Vary speed slightly
-        'img_index': random.randint(0, 4)                   # Index for client-side image array (0-4 for 5 images)
-    }
-
-# Initialize some obstacles when the server starts
-game_state['obstacles'].append(create_new_obstacle(y_offset=0))
-game_state['obstacles'].append(create_new_obstacle(y_offset=200))
-game_state['obstacles'].append(create_new_obstacle(y_offset=400))
-
+    global next_room_id
+    candidates = [room for room in rooms.values() if room.free_seats() > 0]
+    if candidates:
+        return min(candidates, key=lambda room: room.free_seats())
+
+    if len(rooms) >= MAX_ROOMS:
+        return None
+
+    room_class = arrayworld.ArrayRoom if array_world else Room
+    room = room_class(next_room_id, tick_rate)
+    next_room_id += 1
+    if record_dir:
+        room.start_recording(record_dir)
+    room.leaderboard = leaderboard
+    rooms[room.room_id] = room
+    room.task = asyncio.create_task(room.run())
+    print(f"Room {room.room_id} opened ({len(rooms)} rooms running).")
+    return room
+
+def close_room_if_empty(room):
+    """Tears a room down once its last player (or reserved seat) is gone."""
+    if room.is_empty() and rooms.get(room.room_id) is room:
+        del rooms[room.room_id]
+        if room.task:
+            room.task.cancel()
+        room.stop_recording()
+        print(f"Room {room.room_id} closed ({len(rooms)} rooms running).")
 
 # --- Client Handling ---
-def handle_client(conn, addr, player_id):
+async def handle_client(reader, writer):
     """
-    Handles communication with a single client in a separate thread.
-    Receives player input and commands, updates game state accordingly.
+    Coroutine that serves a single client connection for its whole lifetime.
+    Performs the handshake, places the client into a room (or back into its seat when the
+    hello resumes a session), then forwards the client's input and commands to that room.
     Args:
-        conn (socket.socket): The socket object for the client connection.
-        addr (tuple): The address (IP, port) of the client.
-        player_id (str): The unique ID assigned to this player.
+        reader (asyncio.StreamReader): Incoming side of the client connection.
+        writer (asyncio.StreamWriter): Outgoing side of the client connection.
     """
-    print(f"Connected by {addr}, assigned ID: {player_id}")
-
-    # Assign a random car image index to the player for their representation on other clients
-    player_car_img_index = random.randint(0, 4) # Assuming 5 car images (index 0-4)
+    global next_player_id
+    addr = writer.get_extra_info('peername')
 
-    # Add player to game state
-    with game_state_lock:
-        game_state['players'][player_id] = {
-            'x': DISPLAY_W * 0.45,  # Initial X position
-            'y': DISPLAY_H * 0.7,   # Initial Y position
-            'score': 0,             # Initial score
-            'crashed': False,       # Crash status
-            'car_img_index': player_car_img_index # Image index for this player's car
-        }
-        game_state['player_count'] += 1
-        game_state['player_ids'].append(player_id)
-        if game_state['player_count'] >= 1:
-            game_state['game_active'] = True # Activate game loop when first player connects
+    # Splits the incoming byte stream into whole protocol frames
+    decoder = protocol.FrameDecoder()
+    session = None
+    outbox = None
+    outbox_task = None
+    datagram_session = None
+    leaving = False # The client said goodbye (or broke the protocol): no seat is held for it
 
     try:
-        # Send the assigned player ID to the client immediately
-        # This is crucial for the client to know its identity in the game state.
-        conn.sendall(json.dumps({'your_id': player_id}).encode('utf-8'))
-
+        # Handshake: wait for the client hello before the player joins the game
+        hello_frames = []
+        handshake_bytes = 0
+        while not hello_frames:
+            data = await reader.read(4096)
+            if not data:
+                return # Client disconnected before saying hello
+            handshake_bytes += len(data)
+            hello_frames = decoder.feed(data)
+
+        msg_type, payload = hello_frames[0]
+        if msg_type != protocol.MSG_HELLO:
+            raise protocol.ProtocolError(f"Expected hello, got message type {msg_type}")
+        client_version, hello_flags, player_name, resume_token = protocol.decode_hello(payload)
+        if client_version != protocol.PROTOCOL_VERSION:
+            print(f"Client {addr} uses protocol version {client_version}, server uses {protocol.PROTOCOL_VERSION}")
+            metrics.registry.rejected_connections += 1
+            writer.write(protocol.encode_reject(
+                f"Protocol version mismatch (server {protocol.PROTOCOL_VERSION}, client {client_version})."))
+            return
+
+        # A hello with the token of a live session takes the player's seat back
+        session = sessions.resume(resume_token) if resume_token else None
+        if session is not None and rooms.get(session.room.room_id) is not session.room:
+            sessions.close(session) # Its room was torn down in the meantime
+            session = None
+        if session is not None:
+            room, player_id = session.room, session.player_id
+            if session.outbox is not None:
+                session.outbox.close() # The old connection is dead but not noticed yet; this one replaces it
+            print(f"Reconnected by {addr}, resumed {player_id} in room {room.room_id}")
+        else:
+            room = find_room_for_player()
+            if room is None:
+                # Reject connection if every room is full and no more rooms may be opened
+                print(f"Connection from {addr} rejected: Server full.")
+                metrics.registry.rejected_connections += 1
+                writer.write(protocol.encode_reject('Server full. Please try again later.'))
+                return
+            # Assign a unique player ID; the session keeps it across reconnects
+            player_id = f"player_{next_player_id}"
+            next_player_id += 1
+            session = sessions.open(player_id, room, player_name)
+            print(f"Connected by {addr}, assigned ID: {player_id}, room {room.room_id}")
+
+        # From here on every frame goes through the connection's outbound queue. The welcome is
+        # queued first, then the connection is made visible to the room's broadcast.
+        outbox = ClientOutbox(writer)
+        outbox.bytes_received = handshake_bytes
+        outbox_task = asyncio.create_task(outbox.run())
+        resumed = session.resumes > 0 and player_id in room.game_state['player_ids']
+        outbox.send(protocol.encode_welcome(player_id, room.scheduler.tick_rate, room.seed, session.token,
+                                            protocol.WELCOME_FLAG_RESUMED if resumed else 0))
+        if udp_endpoint and hello_flags & protocol.HELLO_FLAG_UDP:
+            # Offer the datagram channel; snapshots switch to it once the client has bound it
+            datagram_session = udp_endpoint.open_session(player_id, room)
+            outbox.datagram_session = datagram_session
+            outbox.send(protocol.encode_udp_offer(datagram_session.token, PORT))
+        session.outbox = outbox
+        if resumed:
+            room.resume_player(player_id, outbox) # Sends the full snapshot right behind the welcome
+        else:
+            room.add_player(player_id, outbox, player_name)
+        metrics.registry.accepted_connections += 1
+
+        # Any frames that arrived together with the hello are handled first
+        pending_frames = hello_frames[1:]
         while True:
+            for msg_type, payload in pending_frames:
+                if msg_type == protocol.MSG_LEADERBOARD_REQUEST:
+                    outbox.send(leaderboard_page(payload)) # Closes the connection if replies pile up unread
+                elif msg_type == protocol.MSG_COMMAND and protocol.decode_command(payload) == protocol.CMD_LEAVE:
+                    leaving = True
+                else:
+                    room.handle_client_message(player_id, msg_type, payload)
+            if leaving:
+                break
+
             # Receive data from client (player input or commands)
-            data = conn.recv(1024).decode('utf-8')
+            data = await reader.read(4096)
             if not data:
                 break # Client disconnected
+            outbox.bytes_received += len(data)
+            pending_frames = decoder.feed(data)
 
-            try:
-                client_message = json.loads(data)
-                with game_state_lock:
-                    if player_id in game_state['players']: # Check if player still exists in state
-                        player_data = game_state['players'][player_id]
-
-                        if client_message.get('command') == 'reset_player':
-                            # Client requested to reset after a crash
-                            print(f"Player {player_id} requested reset.")
-                            player_data['x'] = DISPLAY_W * 0.45
-                            player_data['y'] = DISPLAY_H * 0.7
-                            player_data['score'] = 0
-                            player_data['crashed'] = False
-                        elif 'x_change' in client_message and 'y_change' in client_message:
-                            # Player movement input
-                            if not player_data['crashed']: # Only allow movement if not crashed
-                                player_data['x'] += client_message['x_change']
-                                player_data['y'] += client_message['y_change']
-
-                                # Keep player within screen bounds (server-side validation)
-                                player_data['x'] = max(0, min(player_data['x'], DISPLAY_W - CAR_WIDTH))
-                                player_data['y'] = max(0, min(player_data['y'], DISPLAY_H - 155)) # Assuming car height ~155
-            except json.JSONDecodeError:
-                print(f"Invalid JSON received from {addr}: {data}")
-
-    except Exception as e:
+    except protocol.ProtocolError as e:
+        print(f"Protocol error from {addr}: {e}")
+        leaving = True
+    except (ConnectionError, OSError) as e:
         print(f"Error handling client {addr}: {e}")
     finally:
-        # Remove player from game state and active connections on disconnect
-        with game_state_lock:
-            if player_id in game_state['players']:
-                del game_state['players'][player_id]
-                game_state['player_ids'].remove(player_id)
-                game_state['player_count'] -= 1
-                if game_state['player_count'] == 0:
-                    game_state['game_active'] = False # Pause game if no players left
-                    print("No players left, game paused.")
-        
-        with active_connections_lock:
-            if player_id in active_connections:
-                del active_connections[player_id]
-        
-        print(f"Client {addr} (ID: {player_id}) disconnected.")
-        conn.close()
+        if outbox_task:
+            outbox_task.cancel()
+        if datagram_session:
+            udp_endpoint.close_session(datagram_session)
+        if session is not None and session.outbox is outbox:
+            # Unless another connection has taken the session over, the seat is held for a
+            # reconnect, or freed at once if the client left
+            if outbox is not None and outbox.overflowed:
+                # It asked for more than it read; such a client is not coming back for its seat
+                print(f"Client {addr} (ID: {session.player_id}) disconnected: "
+                      f"more than {outbox.max_reliable_bytes} bytes of replies unread.")
+                end_session(session)
+            elif leaving or outbox is None:
+                end_session(session)
+            else:
+                session.room.park_player(session.player_id)
+                sessions.park(session, end_session)
+                print(f"Client {addr} (ID: {session.player_id}) disconnected; seat held for {sessions.grace:.0f} s.")
+        elif session is not None:
+            print(f"Client {addr} (ID: {session.player_id}) replaced by a newer connection.")
+        else:
+            print(f"Client {addr} disconnected during the handshake.")
+        await close_writer(writer)
+
+def end_session(session):
+    """Removes a session's player from its room for good, and the room itself if it is now empty."""
+    sessions.close(session)
+    print(f"Player {session.player_id} left room {session.room.room_id}.")
+    session.room.remove_player(session.player_id)
+    close_room_if_empty(session.room)
+
+def handle_datagram_frames(session, frames):
+    """Applies frames that arrived over a client's UDP channel, exactly like frames from TCP."""
+    for msg_type, payload in frames:
+        if msg_type == protocol.MSG_LEADERBOARD_REQUEST:
+            # Answered over TCP: pages can be larger than a datagram, and the connection's
+            # outbox bounds how many replies a client may leave unread
+            outbox = session.room.connections.get(session.player_id)
+            if outbox is not None:
+                outbox.send(leaderboard_page(payload))
+        else:
+            session.room.handle_client_message(session.player_id, msg_type, payload)
+
+def leaderboard_page(payload):
+    """
+    Answers a leaderboard request from the leaderboard's in-memory index. Rooms and their
+    simulation are not involved, and nothing waits for the database.
+    Returns:
+        bytes: A MSG_LEADERBOARD frame (empty when the server keeps no leaderboard).
+    """
+    offset, count = protocol.decode_leaderboard_request(payload)
+    if leaderboard is None:
+        return protocol.encode_leaderboard(offset, 0, [])
+    entries = [(stats.name, stats.best, stats.games, stats.total_score)
+               for _, stats in leaderboard.top(offset, min(count, LEADERBOARD_PAGE_MAX))]
+    return protocol.encode_leaderboard(offset, len(leaderboard), entries)
+
+async def close_writer(writer):
+    """Closes a client stream, ignoring errors from connections that are already gone."""
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except (ConnectionError, OSError):
+        pass
 
-# --- Game Logic Loop (Server-side) ---
-def game_loop_server():
+# --- Tick Budget ---
+async def report_tick_budget():
     """
-    The main game logic loop running on the server.
-    Updates obstacle positions, checks for collisions, and manages scores.
+    Periodically prints how much of one core the rooms' ticks use.
+    Every room must finish its tick well inside the tick interval, so the average cost of one
+    room tick tells how many rooms a single core (one event loop) can sustain. Overruns count
+    wake-ups where a room found more than one tick due because the loop fell behind.
     """
+    last_seconds = {}
+    last_ticks = {}
     while True:
-        if not game_state['game_active']:
-            time.sleep(0.1) # Sleep if no players are active
+        await asyncio.sleep(BUDGET_REPORT_INTERVAL)
+        spent = 0.0
+        ticks = 0
+        overruns = sum(room.scheduler.overruns for room in rooms.values())
+        dropped = sum(room.scheduler.dropped_ticks for room in rooms.values())
+        for room in list(rooms.values()):
+            spent += room.tick_seconds - last_seconds.get(room.room_id, 0.0)
+            ticks += room.tick - last_ticks.get(room.room_id, 0)
+        last_seconds = {room.room_id: room.tick_seconds for room in rooms.values()}
+        last_ticks = {room.room_id: room.tick for room in rooms.values()}
+        if not ticks:
             continue
 
-        with game_state_lock:
-            # Update obstacle positions
-            for obstacle in game_state['obstacles']:
-                obstacle['y'] += obstacle['speed']
-
-            # Remove off-screen obstacles and add new ones
-            new_obstacles = []
-            for obstacle in game_state['obstacles']:
-                if obstacle['y'] > DISPLAY_H:
-                    # Obstacle passed the screen bottom
-                    # Increment score for all currently active (non-crashed) players
-                    for player_id in game_state['player_ids']:
-                        if not game_state['players'][player_id]['crashed']:
-                            game_state['players'][player_id]['score'] += 1
-                    # Add a new obstacle to replace the one that went off-screen
-                    new_obstacles.append(create_new_obstacle())
-                else:
-                    new_obstacles.append(obstacle)
-            game_state['obstacles'] = new_obstacles
-
-            # Collision detection (server-authoritative)
-            # Iterate over a copy of players to avoid issues if player_data is modified
-            for player_id, player_data in list(game_state['players'].items()):
-                if player_data['crashed']:
-                    continue # Skip collision check for already crashed players
-
-                player_x = player_data['x']
-                player_y = player_data['y']
-
-                for obstacle in game_state['obstacles']:
-                    obstacle_x = obstacle['x']
-                    obstacle_y = obstacle['y']
-
-                    # Simple Axis-Aligned Bounding Box (AABB) collision detection
-                    # Check if the bounding boxes of the car and obstacle overlap
-                    if (player_x < obstacle_x + THING_WIDTH and
-                        player_x + CAR_WIDTH > obstacle_x and
-                        player_y < obstacle_y + THING_HEIGHT and
-                        player_y + 155 > obstacle_y): # Assuming player car height ~155
-                        print(f"Player {player_id} crashed!")
-                        player_data['crashed'] = True # Mark player as crashed
-                        break # No need to check other obstacles for this player
-
-            # Update road offset for client-side continuous scrolling visual effect
-            game_state['road_offset'] = (game_state['road_offset'] + 8) % DISPLAY_H # Road scrolls at speed 8
-
-        # Send the current game state to all connected clients
-        current_game_state_copy = None
-        with game_state_lock: # Lock game_state while preparing the JSON
-            current_game_state_copy = json.dumps(game_state).encode('utf-8')
-
-        # Iterate over a COPY of active_connections to avoid issues if it's modified during iteration
-        # Use active_connections_lock for thread-safe access
-        connections_to_remove = []
-        with active_connections_lock:
-            for player_id, client_conn in list(active_connections.items()):
-                try:
-                    client_conn.sendall(current_game_state_copy)
-                except Exception as e:
-                    # If sending fails, the client has likely disconnected.
-                    print(f"Failed to send state to client {player_id}: {e}")
-                    connections_to_remove.append(player_id)
-        
-        # Remove disconnected clients outside the iteration loop to avoid modifying during iteration
-        with active_connections_lock:
-            for player_id in connections_to_remove:
-                if player_id in active_connections:
-                    # The handle_client thread should also remove it, but this acts as a safeguard
-                    # and ensures the game_loop_server doesn't keep trying to send to a dead socket.
-                    # The handle_client thread will perform the full cleanup of game_state.
-                    del active_connections[player_id]
-
-
-        time.sleep(0.05) # Server game tick rate (e.g., 20 FPS)
+        busy_fraction = spent / BUDGET_REPORT_INTERVAL
+        cost_per_room_tick = spent / ticks
+        rooms_per_core = int(1.0 / (tick_rate * cost_per_room_tick)) if cost_per_room_tick else 0
+        print(f"Tick budget: {len(rooms)} rooms at {tick_rate} Hz, {cost_per_room_tick * 1e6:.0f} us per room tick, "
+              f"{busy_fraction:.1%} of one core busy, ~{rooms_per_core} rooms fit per core, "
+              f"{overruns} overruns, {dropped} dropped ticks.")
+        report_outbound_queues()
+
+def report_outbound_queues():
+    """Prints a summary of the per-client send queues: backlog, drops and send latency."""
+    outboxes = [outbox for room in rooms.values() for outbox in room.connections.values() if outbox is not None]
+    if not outboxes:
+        return
+    queued_bytes = sum(outbox.queued_bytes for outbox in outboxes)
+    dropped = sum(outbox.dropped_snapshots for outbox in outboxes)
+    slow_disconnects = sum(room.slow_disconnects for room in rooms.values())
+    worst = max(outboxes, key=lambda outbox: outbox.send_latency_max)
+    average_latency = sum(outbox.average_send_latency() for outbox in outboxes) / len(outboxes)
+    print(f"Outbound: {len(outboxes)} clients, {queued_bytes} bytes queued, {dropped} snapshots dropped, "
+          f"{slow_disconnects} slow clients disconnected, send latency avg {average_latency * 1e3:.1f} ms, "
+          f"max {worst.send_latency_max * 1e3:.1f} ms.")
+
+# --- Metrics ---
+def render_metrics():
+    """
+    Returns the Prometheus text lines for the metrics endpoint: the tick phase and event loop
+    histograms from the metrics registry plus gauges read from the live rooms and connections.
+    """
+    lines = metrics.registry.render()
+    outboxes = {player_id: outbox for room in rooms.values()
+                for player_id, outbox in room.connections.items() if outbox is not None}
+    lines += [
+        '# TYPE watchout_rooms gauge',
+        f'watchout_rooms {len(rooms)}',
+        '# TYPE watchout_connections gauge',
+        f'watchout_connections {len(outboxes)}',
+        '# TYPE watchout_tick_overruns_total counter',
+        f'watchout_tick_overruns_total {sum(room.scheduler.overruns for room in rooms.values())}',
+        '# TYPE watchout_slow_disconnects_total counter',
+        f'watchout_slow_disconnects_total {sum(room.slow_disconnects for room in rooms.values())}',
+        '# TYPE watchout_parked_sessions gauge',
+        f'watchout_parked_sessions {sessions.parked()}',
+        '# TYPE watchout_sessions_resumed_total counter',
+        f'watchout_sessions_resumed_total {sessions.resumed}',
+        '# TYPE watchout_sessions_expired_total counter',
+        f'watchout_sessions_expired_total {sessions.expired}',
+    ]
+    if udp_endpoint:
+        lines += [
+            '# TYPE watchout_bad_datagrams_total counter',
+            f'watchout_bad_datagrams_total {udp_endpoint.bad_datagrams}',
+        ]
+    per_client = (
+        ('watchout_client_bytes_sent_total', 'bytes_sent'),
+        ('watchout_client_bytes_received_total', 'bytes_received'),
+        ('watchout_client_dropped_snapshots_total', 'dropped_snapshots'),
+        ('watchout_client_queued_bytes', 'queued_bytes'),
+    )
+    for name, attribute in per_client:
+        lines.append(f'# TYPE {name} {"gauge" if attribute == "queued_bytes" else "counter"}')
+        for player_id, outbox in outboxes.items():
+            lines.append(f'{name}{{player="{player_id}"}} {getattr(outbox, attribute)}')
+    return lines
 
 # --- Main Server Setup ---
-active_connections = {} # Dictionary to store active client connections: {player_id: socket_object}
-next_player_id = 1      # Counter for assigning unique player IDs
+async def serve():
+    """
+    Listens for client connections and hands each one to a handle_client coroutine.
+    Room ticks are started and stopped as rooms open and close.
+    """
+    global udp_endpoint, leaderboard
+    if leaderboard_path:
+        leaderboard = Leaderboard(leaderboard_path) # Loads the ranking once; writes happen on its own thread
+        print(f"Leaderboard: {leaderboard_path} ({len(leaderboard)} players ranked)")
+    server = await asyncio.start_server(handle_client, HOST, PORT, reuse_address=True, backlog=LISTEN_BACKLOG)
+    print(f"Server listening on {HOST}:{PORT} ({tick_rate} ticks per second)")
+
+    background_tasks = [asyncio.create_task(report_tick_budget())]
+    if udp_enabled:
+        udp_endpoint = udp.ServerDatagramEndpoint(handle_datagram_frames, udp_link)
+        await asyncio.get_running_loop().create_datagram_endpoint(lambda: udp_endpoint, local_addr=(HOST, PORT))
+        background_tasks.append(asyncio.create_task(udp_endpoint.resend_loop()))
+        print(f"UDP data channel on {HOST}:{PORT}")
+    if metrics_socket or metrics_port:
+        metrics_server = await metrics.serve_metrics(render_metrics, METRICS_HOST, metrics_port, metrics_socket)
+        background_tasks.append(asyncio.create_task(metrics_server.serve_forever()))
+        print(f"Metrics on {metrics_socket or f'http://{METRICS_HOST}:{metrics_port}/metrics'}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        for task in background_tasks:
+            task.cancel()
+        if udp_endpoint and udp_endpoint.transport:
+            udp_endpoint.transport.close()
+        for room in rooms.values():
+            if room.task:
+                room.task.cancel()
+            room.stop_recording()
+        if leaderboard is not None:
+            leaderboard.close() # Writes the scores still queued
 
 def start_server():
     """
     Initializes and starts the server, listening for incoming client connections.
     """
-    global next_player_id
-    server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1) # Allows immediate reuse of the address
-    server_socket.bind((HOST, PORT))
-    server_socket.listen(MAX_PLAYERS) # Listen for up to MAX_PLAYERS connections
-    print(f"Server listening on {HOST}:{PORT}")
-
-    # Start the server-side game logic loop in a separate daemon thread
-    # A daemon thread will exit automatically when the main program exits.
-    game_logic_thread = threading.Thread(target=game_loop_server)
-    game_logic_thread.daemon = True
-    game_logic_thread.start()
-
-    while True:
-        try:
-            conn, addr = server_socket.accept() # Accept a new client connection
-            with active_connections_lock: # Lock when checking/modifying active_connections
-                if len(active_connections) >= MAX_PLAYERS:
-                    # Reject connection if max players reached
-                    print(f"Connection from {addr} rejected: Max players reached.")
-                    conn.sendall(json.dumps({'status': 'rejected', 'message': 'Max players reached. Please try again later.'}).encode('utf-8'))
-                    conn.close()
-                    continue
-
-                # Assign a unique player ID
-                player_id = f"player_{next_player_id}"
-                next_player_id += 1
-                active_connections[player_id] = conn # Store the connection
-
-            # Start a new thread to handle this specific client
-            client_thread = threading.Thread(target=handle_client, args=(conn, addr, player_id))
-            client_thread.daemon = True
-            client_thread.start()
-        except KeyboardInterrupt:
-            print("Server shutting down.")
-            break # Exit the loop on Ctrl+C
-        except Exception as e:
-            print(f"Error accepting connection: {e}")
-
-    server_socket.close() # Close the server socket when done
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        print("Server shutting down.")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Watch Out multiplayer server")
+    parser.add_argument('--host', default=HOST, help="Address to listen on")
+    parser.add_argument('--port', type=int, default=PORT, help="TCP port to listen on")
+    parser.add_argument('--tick-rate', type=int, default=TICK_RATE, help="Simulation ticks per second (e.g. 20, 30, 60)")
+    parser.add_argument('--array-world', action='store_true',
+                        help="Keep each room's world in NumPy arrays and update it with vectorized steps")
+    parser.add_argument('--report-interval', type=float, default=BUDGET_REPORT_INTERVAL,
+                        help="Seconds between tick budget reports")
+    parser.add_argument('--udp', action='store_true',
+                        help="Offer clients a UDP channel for snapshots and inputs (TCP stays the fallback)")
+    parser.add_argument('--sim-loss', type=float, default=0.0, help="Drop this fraction of outgoing datagrams (testing)")
+    parser.add_argument('--sim-latency', type=float, default=0.0, help="Delay outgoing datagrams by this many seconds (testing)")
+    parser.add_argument('--metrics-port', type=int, help="Serve Prometheus metrics on 127.0.0.1 at this port")
+    parser.add_argument('--metrics-socket', help="Serve Prometheus metrics on this Unix socket path instead")
+    parser.add_argument('--record', metavar='DIR',
+                        help="Record every room as a replay file in DIR (view with shared/replay.py)")
+    parser.add_argument('--leaderboard', metavar='PATH',
+                        help="Keep a persistent leaderboard in this SQLite file (view with shared/leaderboard.py)")
+    parser.add_argument('--reconnect-grace', type=float, default=sessions.grace,
+                        help="Seconds a dropped player's seat is held for a reconnect (default %(default)s)")
+    args = parser.parse_args()
+    metrics_port, metrics_socket = args.metrics_port, args.metrics_socket
+    HOST, PORT, tick_rate, array_world = args.host, args.port, args.tick_rate, args.array_world
+    udp_enabled = args.udp
+    record_dir = args.record
+    leaderboard_path = args.leaderboard
+    sessions.grace = args.reconnect_grace
+    BUDGET_REPORT_INTERVAL = args.report_interval
+    if args.sim_loss or args.sim_latency:
+        udp_link = udp.LinkSimulator(loss=args.sim_loss, latency=args.sim_latency,
+                                     schedule=lambda delay, callback, *a: asyncio.get_running_loop().call_later(delay, callback, *a))
+    if array_world and arrayworld.np is None:
+        parser.error("--array-world needs NumPy (pip install numpy)")
+    if array_world and record_dir:
+        parser.error("--record works with the default world only, not --array-world")
     start_server()
-
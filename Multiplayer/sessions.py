@@ -0,0 +1,111 @@
+import asyncio
+import secrets
+
+# --- Resumable Sessions ---
+# A player's seat outlives their connection. The welcome hands every player a session token;
+# when the connection drops (a Wi-Fi or mobile blip), the player is not removed but parked:
+#
+#   - their car stays in the match, holding still, with its score, and their seat stays taken,
+#   - a client that reconnects within RECONNECT_GRACE sends the token in its hello and gets the
+#     same player back. The welcome is followed at once by a full snapshot (baseline 0), so
+#     the client has the whole state one round trip after its hello; deltas resume once it
+#     acknowledges that snapshot,
+#   - after the grace period the player is removed as if they had left, and a token that
+#     comes in later simply starts a new player.
+#
+# A hello for a session whose old connection still looks alive (the server has not noticed
+# the drop yet) takes the session over and closes the old connection. A client that quits
+# sends CMD_LEAVE first, so its seat is freed at once instead of after the grace period.
+
+RECONNECT_GRACE = 15.0 # Seconds a disconnected player's seat, car and score are kept for a reconnect
+
+
+class PlayerSession:
+    """One player's claim on their seat, across any number of connections."""
+
+    def __init__(self, token, player_id, room, name):
+        self.token = token
+        self.player_id = player_id
+        self.room = room
+        self.name = name
+        self.outbox = None  # ClientOutbox of the connection serving the session; None while parked
+        self.expiry = None  # asyncio.TimerHandle that ends the session while it is parked
+        self.resumes = 0    # Times a reconnect took the session back
+
+
+class SessionTable:
+    """
+    The server's sessions by token.
+    Usage:
+        session = sessions.open(player_id, room, name)        # new player, token goes in the welcome
+        session = sessions.resume(token)                      # hello with a token; None if unknown or expired
+        sessions.park(session, on_expire)                     # connection lost; on_expire(session) after the grace period
+        sessions.close(session)                               # player left for good
+    """
+
+    def __init__(self, grace=RECONNECT_GRACE):
+        """
+        Args:
+            grace (float): Seconds a parked session waits for a reconnect.
+        """
+        self.grace = grace
+        self.sessions = {} # {token: PlayerSession}
+        self.resumed = 0   # Sessions taken back by a reconnect
+        self.expired = 0   # Parked sessions whose player never came back
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def parked(self):
+        """Returns how many sessions are waiting for their player to reconnect."""
+        return sum(1 for session in self.sessions.values() if session.expiry is not None)
+
+    def open(self, player_id, room, name):
+        """Starts the session of a newly joined player under a fresh, unguessable token."""
+        token = secrets.randbits(64)
+        while token == 0 or token in self.sessions: # 0 means "no session" in a hello
+            token = secrets.randbits(64)
+        session = PlayerSession(token, player_id, room, name)
+        self.sessions[token] = session
+        return session
+
+    def resume(self, token):
+        """
+        Takes a session back for a reconnecting client and stops its grace period.
+        Returns:
+            PlayerSession or None: The session, or None if the token is unknown or has expired.
+        """
+        session = self.sessions.get(token)
+        if session is None:
+            return None
+        if session.expiry is not None:
+            session.expiry.cancel()
+            session.expiry = None
+        session.resumes += 1
+        self.resumed += 1
+        return session
+
+    def park(self, session, on_expire):
+        """
+        Holds a session whose connection was lost for the grace period.
+        Args:
+            session (PlayerSession): The session, still in the table.
+            on_expire (callable): Called with the session if nobody resumes it in time.
+        """
+        session.outbox = None
+
+        def expire():
+            if self.sessions.get(session.token) is session and session.expiry is not None:
+                self.expired += 1
+                self.close(session)
+                on_expire(session)
+
+        session.expiry = asyncio.get_running_loop().call_later(self.grace, expire)
+
+    def close(self, session):
+        """Ends a session; its token is no longer accepted."""
+        if session.expiry is not None:
+            session.expiry.cancel()
+            session.expiry = None
+        session.outbox = None
+        self.sessions.pop(session.token, None)
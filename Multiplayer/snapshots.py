@@ -0,0 +1,122 @@
+from collections import OrderedDict, namedtuple
+from types import MappingProxyType
+
+# --- Snapshots ---
+# A snapshot is a frozen copy of the game state at one broadcast, reduced to what the client
+# cannot work out itself. Players are stored as plain tuples keyed by their number so two
+# snapshots can be diffed field by field to build delta updates.
+#
+#   players:   {player number: (x, y, score, crashed, car_img_index, input_seq)}
+#
+# input_seq is the newest client input the server has applied for that player, so the client
+# knows which of its inputs the snapshot already reflects.
+#
+# Obstacles and the road are not in snapshots: they follow from the room's seed (sent in the
+# welcome) and the tick, so clients simulate them locally (see obstaclestream.py). Instead a
+# snapshot carries the low 32 bits of simulation.obstacle_checksum() at its tick, which lets
+# a client check that its obstacles still match the server's.
+#
+# Snapshots taken on the server wrap the players in a read-only view, so once a room has
+# published one, encoding and broadcasting it can never observe a half-updated state.
+
+Snapshot = namedtuple('Snapshot', ['seq', 'tick', 'game_active', 'obstacle_checksum', 'players'])
+
+EMPTY_SNAPSHOT = Snapshot(0, 0, False, 0, {}) # Baseline used for full (non-delta) snapshots
+SNAPSHOT_HISTORY_SIZE = 32 # Number of recent snapshots kept as possible delta baselines
+CHECKSUM_MASK = 0xFFFFFFFF # Bits of the obstacle checksum carried in a snapshot
+
+
+def player_number(player_id):
+    """
+    Converts a player ID string (e.g. 'player_3') into its number for the wire.
+    Args:
+        player_id (str): The player ID used in the game state.
+    Returns:
+        int: The numeric part of the player ID.
+    """
+    return int(player_id.rsplit('_', 1)[1])
+
+
+def player_id_from_number(number):
+    """Converts a player number received on the wire back into a player ID string."""
+    return f"player_{number}"
+
+
+def capture_snapshot(seq, world, player_inputs, game_active, obstacle_checksum):
+    """
+    Copies the parts of the server game state that are sent to clients.
+    Args:
+        seq (int): Sequence number of this snapshot (strictly increasing, starts at 1).
+        world (simulation.State): The authoritative match state.
+        player_inputs (dict): {player_id: (input_seq, x_axis, y_axis)} newest input of each player.
+        game_active (bool): Whether the room is running.
+        obstacle_checksum (int): simulation.obstacle_checksum() of the world's obstacles.
+    Returns:
+        Snapshot: An immutable copy of the state.
+    """
+    players = {
+        player_number(player_id): (
+            int(round(player.x)),
+            int(round(player.y)),
+            player.score,
+            player.crashed,
+            player.car_img_index,
+            player_inputs[player_id][0]
+        )
+        for player_id, player in world.players.items()
+    }
+    return Snapshot(seq, world.tick, bool(game_active), obstacle_checksum & CHECKSUM_MASK, MappingProxyType(players))
+
+
+def snapshot_to_game_state(snapshot):
+    """
+    Expands a snapshot into the dictionary layout the rendering code reads.
+    Args:
+        snapshot (Snapshot): A decoded snapshot.
+    Returns:
+        dict: {'players', 'game_active', 'tick'}; obstacles and the road come from the client's
+            obstacle stream.
+    """
+    players = {
+        player_id_from_number(number): {
+            'x': x, 'y': y, 'score': score, 'crashed': crashed, 'car_img_index': car_img_index,
+            'input_seq': input_seq
+        }
+        for number, (x, y, score, crashed, car_img_index, input_seq) in snapshot.players.items()
+    }
+    return {
+        'players': players,
+        'game_active': snapshot.game_active,
+        'tick': snapshot.tick
+    }
+
+
+class SnapshotHistory:
+    """
+    Keeps the most recent snapshots by sequence number.
+    The server uses it to find the baseline a client last acknowledged, the client uses it
+    to find the baseline a delta was encoded against.
+    """
+
+    def __init__(self, size=SNAPSHOT_HISTORY_SIZE):
+        self._size = size
+        self._snapshots = OrderedDict()
+
+    def add(self, snapshot):
+        """Stores a snapshot, evicting the oldest one when the history is full."""
+        self._snapshots[snapshot.seq] = snapshot
+        while len(self._snapshots) > self._size:
+            self._snapshots.popitem(last=False)
+
+    def get(self, seq):
+        """
+        Returns:
+            Snapshot or None: The snapshot with this sequence number, if still kept.
+        """
+        return self._snapshots.get(seq)
+
+    def latest(self):
+        """Returns the newest snapshot, or None if the history is empty."""
+        if not self._snapshots:
+            return None
+        return next(reversed(self._snapshots.values()))
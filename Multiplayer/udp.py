@@ -0,0 +1,295 @@
+import asyncio
+import random
+import secrets
+import struct
+import threading
+import time
+
+import protocol
+
+# --- UDP Data Channel ---
+# TCP delivers every byte in order, so one lost segment holds back every snapshot behind it
+# until it is retransmitted, even though the next snapshot replaces the lost one anyway. When
+# both sides support it, snapshots and inputs therefore travel over UDP instead:
+#
+#   - the TCP handshake stays as it is; the server follows the welcome with MSG_UDP_OFFER
+#     (session token + port) if the client's hello set HELLO_FLAG_UDP,
+#   - the client binds its UDP socket to the session by sending DGRAM_BIND with the token
+#     until DGRAM_BIND_ACK comes back; until then, and if binding fails, TCP carries everything,
+#   - snapshots (already sequenced and delta-encoded against acknowledged baselines) and inputs
+#     (sequenced held state, sent redundantly) go out as unreliable DGRAM_DATA,
+#   - the few messages that must arrive (events, commands) go out as DGRAM_RELIABLE and are
+#     resent until the peer returns DGRAM_RELIABLE_ACK.
+#
+# Every datagram is [uint8 kind][uint32 session token][body]. The body of data and reliable
+# datagrams is a run of ordinary protocol frames, so both channels share one frame decoder.
+
+DGRAM_BIND = 1          # client -> server: empty body, binds the sender address to the token
+DGRAM_BIND_ACK = 2      # server -> client: empty body
+DGRAM_DATA = 3          # either way: protocol frames, may be lost, duplicated or reordered
+DGRAM_RELIABLE = 4      # either way: reliable sequence number + protocol frames
+DGRAM_RELIABLE_ACK = 5  # either way: reliable sequence number being acknowledged
+
+DGRAM_HEADER = struct.Struct('!BI')   # kind, session token
+RELIABLE_SEQ = struct.Struct('!I')
+
+MAX_DATAGRAM_SIZE = 1200   # Larger payloads go over TCP instead (stays below common path MTUs)
+INPUT_REDUNDANCY = 3       # Each input datagram repeats this many of the newest inputs
+RESEND_INTERVAL = 0.1      # Seconds before an unacknowledged reliable message is sent again
+BIND_INTERVAL = 0.2        # Seconds between bind attempts
+BIND_ATTEMPTS = 10         # Bind attempts before the client gives up and stays on TCP
+RELIABLE_WINDOW = 1024     # How far an incoming reliable seq may run ahead of the last in-order one
+BAD_DATAGRAM_LOG_INTERVAL = 10.0 # Seconds between log lines about bad datagrams; the rest are only counted
+
+
+def encode_datagram(kind, token, body=b''):
+    return DGRAM_HEADER.pack(kind, token) + body
+
+
+def decode_datagram(data):
+    """
+    Returns:
+        tuple: (kind, session token, body)
+    Raises:
+        protocol.ProtocolError: If the datagram is too short to have a header.
+    """
+    if len(data) < DGRAM_HEADER.size:
+        raise protocol.ProtocolError("Runt datagram")
+    kind, token = DGRAM_HEADER.unpack_from(data)
+    return kind, token, data[DGRAM_HEADER.size:]
+
+
+def decode_frames(body):
+    """
+    Splits a datagram body into protocol frames. A datagram always holds whole frames.
+    Raises:
+        protocol.ProtocolError: If the body ends in the middle of a frame.
+    """
+    decoder = protocol.FrameDecoder()
+    frames = decoder.feed(body)
+    if decoder.pending():
+        raise protocol.ProtocolError("Datagram ends inside a frame")
+    return frames
+
+
+class ReliableChannel:
+    """
+    Minimal reliability on top of datagrams: outgoing messages are numbered and resent until
+    acknowledged, incoming ones are acknowledged and delivered once. Delivery order is not
+    guaranteed, which is fine for independent events.
+    """
+
+    def __init__(self, resend_interval=RESEND_INTERVAL, clock=time.monotonic):
+        self.resend_interval = resend_interval
+        self._clock = clock
+        self._next_seq = 1
+        self._unacked = {}        # {seq: [body, last sent time]}
+        self._delivered_up_to = 0 # Every incoming seq up to this one was delivered
+        self._delivered_above = set()
+
+        self.resends = 0
+
+    def wrap(self, frames):
+        """
+        Numbers an outgoing message and remembers it until acknowledged.
+        Args:
+            frames (bytes): One or more encoded protocol frames.
+        Returns:
+            bytes: The DGRAM_RELIABLE body to send.
+        """
+        seq = self._next_seq
+        self._next_seq += 1
+        body = RELIABLE_SEQ.pack(seq) + frames
+        self._unacked[seq] = [body, self._clock()]
+        return body
+
+    def acknowledge(self, body):
+        """Handles a DGRAM_RELIABLE_ACK body."""
+        if len(body) == RELIABLE_SEQ.size:
+            self._unacked.pop(RELIABLE_SEQ.unpack(body)[0], None)
+
+    def due_resends(self):
+        """Returns the bodies whose acknowledgement is overdue, marking them as sent again."""
+        now = self._clock()
+        due = []
+        for entry in self._unacked.values():
+            if now - entry[1] >= self.resend_interval:
+                entry[1] = now
+                due.append(entry[0])
+        self.resends += len(due)
+        return due
+
+    def accept(self, body):
+        """
+        Handles an incoming DGRAM_RELIABLE body.
+        Returns:
+            tuple: (ack body to send back, frames bytes or None if this is a duplicate)
+        """
+        if len(body) < RELIABLE_SEQ.size:
+            raise protocol.ProtocolError("Reliable datagram without sequence number")
+        (seq,) = RELIABLE_SEQ.unpack_from(body)
+        if seq > self._delivered_up_to + RELIABLE_WINDOW:
+            # Not acknowledged, so an honest peer resends it once the gap has filled; this keeps
+            # the set of out-of-order sequence numbers below RELIABLE_WINDOW entries
+            raise protocol.ProtocolError(f"Reliable sequence number {seq} is more than {RELIABLE_WINDOW} "
+                                         f"ahead of {self._delivered_up_to}")
+        ack = RELIABLE_SEQ.pack(seq)
+        if seq <= self._delivered_up_to or seq in self._delivered_above:
+            return ack, None # Our ack was lost; acknowledge again but do not deliver twice
+        self._delivered_above.add(seq)
+        while self._delivered_up_to + 1 in self._delivered_above:
+            self._delivered_up_to += 1
+            self._delivered_above.discard(self._delivered_up_to)
+        return ack, body[RELIABLE_SEQ.size:]
+
+
+class LinkSimulator:
+    """
+    Injects loss, latency and jitter into outgoing datagrams, for testing on loopback.
+    Usage:
+        link = LinkSimulator(loss=0.1, latency=0.05, schedule=loop.call_later)
+        link.send(sock_sendto, data, addr)
+    """
+
+    def __init__(self, loss=0.0, latency=0.0, jitter=0.0, seed=None, schedule=None):
+        """
+        Args:
+            loss (float): Probability of dropping a datagram.
+            latency (float): One-way delay in seconds added to every datagram.
+            jitter (float): Extra random delay in seconds (uniform 0..jitter), can reorder datagrams.
+            seed (int, optional): Seed for reproducible loss patterns.
+            schedule (callable, optional): schedule(delay, callback, *args); defaults to a timer thread.
+        """
+        self.loss = loss
+        self.latency = latency
+        self.jitter = jitter
+        self._rng = random.Random(seed)
+        self._schedule = schedule or _schedule_on_timer
+        self.sent = 0
+        self.dropped = 0
+
+    def send(self, deliver, *args):
+        """Calls deliver(*args) after the simulated delay, unless the datagram is lost."""
+        self.sent += 1
+        if self._rng.random() < self.loss:
+            self.dropped += 1
+            return
+        delay = self.latency + self._rng.uniform(0.0, self.jitter)
+        if delay <= 0:
+            deliver(*args)
+        else:
+            self._schedule(delay, deliver, *args)
+
+
+def _schedule_on_timer(delay, callback, *args):
+    timer = threading.Timer(delay, callback, args)
+    timer.daemon = True
+    timer.start()
+
+
+class DatagramSession:
+    """Server side of one client's UDP channel."""
+
+    def __init__(self, endpoint, token, player_id, room):
+        self.endpoint = endpoint
+        self.token = token
+        self.player_id = player_id
+        self.room = room
+        self.addr = None # Client address, known once bound
+        self.reliable = ReliableChannel()
+
+    @property
+    def bound(self):
+        return self.addr is not None
+
+    def send_frames(self, frames):
+        """Sends frames unreliably; returns False if they do not fit into one datagram."""
+        if len(frames) + DGRAM_HEADER.size > MAX_DATAGRAM_SIZE:
+            return False
+        self.endpoint.send(encode_datagram(DGRAM_DATA, self.token, frames), self.addr)
+        return True
+
+    def send_reliable(self, frames):
+        self.endpoint.send(encode_datagram(DGRAM_RELIABLE, self.token, self.reliable.wrap(frames)), self.addr)
+
+
+class ServerDatagramEndpoint(asyncio.DatagramProtocol):
+    """
+    The server's UDP socket. Maps session tokens and client addresses to DatagramSessions and
+    hands the frames that arrive on a session to `on_frames(session, frames)`.
+    """
+
+    def __init__(self, on_frames, link=None):
+        self.on_frames = on_frames
+        self.link = link
+        self.transport = None
+        self.sessions = {} # {token: DatagramSession}
+        self.bad_datagrams = 0     # Datagrams dropped as malformed, for the metrics endpoint
+        self._bad_logged_at = None # When a bad datagram was last logged
+        self._bad_unlogged = 0     # Bad datagrams since then that were only counted
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def open_session(self, player_id, room):
+        """Creates the session offered to a client in MSG_UDP_OFFER."""
+        token = secrets.randbits(32)
+        while token in self.sessions:
+            token = secrets.randbits(32)
+        session = DatagramSession(self, token, player_id, room)
+        self.sessions[token] = session
+        return session
+
+    def close_session(self, session):
+        self.sessions.pop(session.token, None)
+
+    def send(self, data, addr):
+        if self.transport is None or self.transport.is_closing():
+            return
+        if self.link:
+            self.link.send(self.transport.sendto, data, addr)
+        else:
+            self.transport.sendto(data, addr)
+
+    def datagram_received(self, data, addr):
+        try:
+            kind, token, body = decode_datagram(data)
+            session = self.sessions.get(token)
+            if session is None:
+                return # Unknown or closed session
+            if kind == DGRAM_BIND:
+                session.addr = addr # A client may rebind, e.g. after its NAT mapping changed
+                self.send(encode_datagram(DGRAM_BIND_ACK, token), addr)
+                return
+            if addr != session.addr:
+                return # Only the bound address may speak for the session
+            if kind == DGRAM_DATA:
+                self.on_frames(session, decode_frames(body))
+            elif kind == DGRAM_RELIABLE:
+                ack, frames = session.reliable.accept(body)
+                self.send(encode_datagram(DGRAM_RELIABLE_ACK, token, ack), addr)
+                if frames is not None:
+                    self.on_frames(session, decode_frames(frames))
+            elif kind == DGRAM_RELIABLE_ACK:
+                session.reliable.acknowledge(body)
+        except (protocol.ProtocolError, struct.error, ValueError) as e:
+            # Anyone who knows the port can send anything; a bad datagram is counted and dropped,
+            # and logged at most once per BAD_DATAGRAM_LOG_INTERVAL so a flood cannot fill the log
+            self.bad_datagrams += 1
+            now = time.monotonic()
+            if self._bad_logged_at is not None and now - self._bad_logged_at < BAD_DATAGRAM_LOG_INTERVAL:
+                self._bad_unlogged += 1
+                return
+            since = f" ({self._bad_unlogged} more since the last one)" if self._bad_unlogged else ""
+            print(f"Bad datagram from {addr}: {e}{since}")
+            self._bad_logged_at = now
+            self._bad_unlogged = 0
+
+    async def resend_loop(self):
+        """Resends overdue reliable messages of every bound session."""
+        while True:
+            await asyncio.sleep(RESEND_INTERVAL / 2)
+            for session in list(self.sessions.values()):
+                if session.bound:
+                    for body in session.reliable.due_resends():
+                        self.send(encode_datagram(DGRAM_RELIABLE, session.token, body), session.addr)
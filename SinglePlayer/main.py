@@ -1,7 +1,36 @@
+import argparse
+import getpass
 import pygame
-import time 
+import time
 import random
-import math
+import os
+import sqlite3
+import sys
+
+# Images, sounds and the asset loader are shared with the multiplayer client
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'shared'))
+from assets import Assets
+from leaderboard import DEFAULT_PATH as DEFAULT_LEADERBOARD, Leaderboard
+import replay
+import simulation
+
+parser = argparse.ArgumentParser(description="Watch Out")
+parser.add_argument('--record', metavar='DIR', help="Record every game as a replay file in DIR (view with shared/replay.py)")
+parser.add_argument('--soak', type=int, metavar='RESTARTS',
+                    help="Play RESTARTS games with a scripted player and no window, then report memory and stack depth")
+parser.add_argument('--obstacles', type=int, metavar='N', help="Obstacles on the road at once (default: 3); more is harder")
+parser.add_argument('--name', default=getpass.getuser(), help="Name your scores are recorded under (default: %(default)s)")
+parser.add_argument('--leaderboard', metavar='PATH',
+                    help=f"Leaderboard database (default: {DEFAULT_LEADERBOARD}; none while soak testing)")
+args = parser.parse_args()
+record_dir = args.record
+rules = simulation.SINGLE_PLAYER_RULES
+if args.obstacles:
+    rules = simulation.rules_with_obstacles(rules, args.obstacles)
+leaderboard_path = args.leaderboard or (None if args.soak else DEFAULT_LEADERBOARD)
+if args.soak:
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
 
 pygame.init()
 display_h = 680
@@ -16,132 +45,223 @@ yellow = (200,200,0)
 bright_red = (255,0,0)
 white = (255,255,255)
 
-car_width = 77
-csound = pygame.mixer.Sound("sound/crash.wav")
-pygame.mixer.music.load("sound/jazz.wav")
+car_width = simulation.CAR_WIDTH
+PLAYER = 'player_1' # The single player's id in the simulation state
+FRAME_RATE = 60
 
 gameD = pygame.display.set_mode((display_w, display_h))
 pygame.display.set_caption('Watch Out')
 clock = pygame.time.Clock()
 
-imgroad = pygame.image.load('image/road.jpg').convert_alpha()
-carimg = pygame.image.load('image/1.png').convert_alpha()
-carimg1 = pygame.image.load('image/2.png').convert_alpha()
-carimg2 = pygame.image.load('image/3.png').convert_alpha()
-carimg3 = pygame.image.load('image/4.png').convert_alpha()
-carimg4 = pygame.image.load('image/5.png').convert_alpha()
-carimg5 = pygame.image.load('image/6.png').convert_alpha()
+assets = Assets() # Converted once, cached on disk; sounds load when first played
+imgroad = assets.image('road.jpg')
+carimg, carimg1, carimg2, carimg3, carimg4, carimg5 = assets.cars()
 
 foo = [carimg1, carimg2, carimg3, carimg4, carimg5]
 
-def button(msg, x, y, w, h, ic, ac, action = None):
-    mouse = pygame.mouse.get_pos()
-    click = pygame.mouse.get_pressed()
-    
-    if x+w > mouse[0] > x and y+h > mouse[1] > y:
-        pygame.draw.rect(gameD, ac, (x,y,w,h))
+# Fonts are created once; looking them up again every frame is slow
+largeText = pygame.font.SysFont("comicsansms",115)
+smallText = pygame.font.SysFont("comicsansms", 20)
+scoreText = pygame.font.SysFont(None, 25)
+
+leaderboard = None # Scores are written in the background, so recording one never stalls a frame
+if leaderboard_path:
+    try:
+        leaderboard = Leaderboard(leaderboard_path)
+    except (sqlite3.Error, OSError) as e: # The game is playable without one
+        print(f"Warning: leaderboard disabled, could not open {leaderboard_path}: {e}")
+
+# --- Scenes ---
+# The game is a state machine over four scenes, driven by the one loop in run(). A scene
+# function handles one frame's input, draws the frame and returns the scene to show next.
+# Starting over is a transition, not a call, so the thousandth game runs on the same stack
+# and with the same images, fonts and sounds as the first.
+#
+#     INTRO --GO!--> PLAYING --p--> PAUSED --Continue--> PLAYING
+#                    PLAYING --crash--> CRASHED --Play Again--> PLAYING
+#     any scene --Quit button or window closed--> QUIT
+INTRO = 'intro'
+PLAYING = 'playing'
+PAUSED = 'paused'
+CRASHED = 'crashed'
+QUIT = 'quit'
+
+game = None # The game being played (or the one that just crashed)
+result_text = None # 'Score ... / best ... / rank ...' shown after a crash
+games_started = 0
+
+class Game:
+    """One run from the start line to a crash."""
+
+    def __init__(self):
+        state = simulation.new_game(rules=rules)
+        self.recorder = None
+        if record_dir:
+            self.recorder = replay.ReplayRecorder(replay.replay_path(record_dir, 'single'),
+                                                  state.seed, state.rules, FRAME_RATE)
+        state = simulation.add_player(state, PLAYER)
+        if self.recorder:
+            self.recorder.join(state.tick, PLAYER, 0)
+        self.world = simulation.PooledGame(state, PLAYER) # Stepped in place, frame after frame
+        self.x_axis, self.y_axis = 0, 0
+
+    def step(self):
+        """Simulates one frame with the held keys."""
+        if self.recorder:
+            self.recorder.record_tick(self.world, {PLAYER: (self.x_axis, self.y_axis)})
+        self.world.step(self.x_axis, self.y_axis)
+
+    def end(self):
+        if self.recorder:
+            self.recorder.close(self.world.tick)
+
+def start_game():
+    """Replaces the current game with a new one; returns the PLAYING scene."""
+    global game, games_started
+    if game:
+        game.end()
+    game = Game()
+    games_started += 1
+    assets.play_music('jazz.wav')
+    return PLAYING
+
+def button(msg, x, y, w, h, ic, ac, mouse, click):
+    """Draws a button; returns True while it is being clicked."""
+    hover = x+w > mouse[0] > x and y+h > mouse[1] > y
+    pygame.draw.rect(gameD, ac if hover else ic, (x,y,w,h))
 
-        if click[0] == 1 and action != None:
-            action()         
-    else:
-        pygame.draw.rect(gameD, ic, (x,y,w,h))
-
-    smallText = pygame.font.SysFont("comicsansms", 20)
     textSurf, textRect = text_objects(msg, smallText)
     textRect.center = ((x+(w/2)), (y+(h/2)))
     gameD.blit(textSurf, textRect)
-
-def quitgame():
-    pygame.quit()
-
-pause = False
-
-def unpause():
-    global pause
-    pygame.mixer.music.unpause()
-    pause=False
-
-def crashed():
-   pygame.mixer.music.stop()
-   pygame.mixer.Sound.play(csound)
-   gameD.fill(yellow)
-   
-   largeText = pygame.font.SysFont("comicsansms",115)
-   TextSurf, TextRect = text_objects("You Crashed", largeText)
-   TextRect.center = ((display_w/2),(display_h/2))
-   gameD.blit(TextSurf, TextRect)
-
-   while True:
-        for event in pygame.event.get():            
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                quit()
-                
-
-        button("Play Again",350,450,100,50,green,bright_green,gameloop)
-        button("Quit",900,450,100,50,red,bright_red,quitgame)
-
+    return hover and click
+
+def title_screen(text):
+    gameD.fill(yellow)
+    TextSurf, TextRect = text_objects(text, largeText)
+    TextRect.center = ((display_w/2),(display_h/2))
+    gameD.blit(TextSurf, TextRect)
+
+def intro_scene(events, mouse, click):
+    title_screen("Watch Out!")
+    if button("GO!",350,450,100,50,green,bright_green,mouse,click):
+        return start_game()
+    if button("Quit",900,450,100,50,red,bright_red,mouse,click):
+        return QUIT
+    return INTRO
+
+def playing_scene(events, mouse, click):
+    # Movement, obstacles, scoring and crashes are simulated by the shared core; this scene
+    # only turns key presses into held inputs and draws the state
+    for event in events:
+        if event.type == pygame.KEYDOWN:
+            if event.key == pygame.K_LEFT:
+                game.x_axis = -1
+            elif event.key == pygame.K_RIGHT:
+                game.x_axis = 1
+            elif event.key == pygame.K_UP:
+                game.y_axis = -1
+            elif event.key == pygame.K_DOWN:
+                game.y_axis = 1
+            elif event.key==pygame.K_p:
+                assets.pause_music()
+                return PAUSED
+
+        if event.type == pygame.KEYUP:
+            if event.key == pygame.K_LEFT or event.key == pygame.K_RIGHT or event.key == pygame.K_UP or event.key == pygame.K_DOWN:
+                game.x_axis=0
+                game.y_axis=0
+    game.step()
+    world = game.world
+
+    roady = int(world.road_offset)
+    road(roady)
+    road(roady - display_h)
+
+    things(world.obstacles)
+    car(world.x, world.y)
+    things_dodged(world.score)
+
+    if world.crashed:
+        game.end()
+        record_score(world.score)
+        assets.stop_music()
+        assets.play_sound('crash.wav')
+        return CRASHED
+    return PLAYING
+
+def paused_scene(events, mouse, click):
+    title_screen("Paused")
+    if button("Continue",350,450,100,50,green,bright_green,mouse,click):
+        assets.unpause_music()
+        return PLAYING
+    if button("Quit",900,450,100,50,red,bright_red,mouse,click):
+        return QUIT
+    return PAUSED
+
+def record_score(score):
+    """Adds a finished run to the leaderboard and prepares the line the crashed scene shows."""
+    global result_text
+    result_text = None
+    if leaderboard is None:
+        return
+    leaderboard.record(args.name, score, 'single')
+    best = leaderboard.stats(args.name).best
+    text = f"Score {score}   Best {best}   Rank {leaderboard.rank(args.name)} of {len(leaderboard)}"
+    result_text = text_objects(text, smallText)
+
+def crashed_scene(events, mouse, click):
+    title_screen("You Crashed")
+    if result_text:
+        textSurf, textRect = result_text
+        textRect.center = ((display_w/2), (display_h/2 + 90))
+        gameD.blit(textSurf, textRect)
+    if button("Play Again",350,450,100,50,green,bright_green,mouse,click):
+        return start_game()
+    if button("Quit",900,450,100,50,red,bright_red,mouse,click):
+        return QUIT
+    return CRASHED
+
+SCENES = {
+    INTRO: intro_scene,
+    PLAYING: playing_scene,
+    PAUSED: paused_scene,
+    CRASHED: crashed_scene,
+}
+
+def read_input(scene):
+    """Returns this frame's (events, mouse position, left button held) from pygame."""
+    return pygame.event.get(), pygame.mouse.get_pos(), pygame.mouse.get_pressed()[0] == 1
+
+def run(read_input=read_input, frame_rate=FRAME_RATE):
+    """
+    The game's only loop: shows one scene per frame until the player quits.
+    Args:
+        read_input (callable): read_input(scene) returns the frame's (events, mouse, click).
+        frame_rate (int or None): Frames per second to cap at; None runs uncapped.
+    """
+    scene = INTRO
+    while scene != QUIT:
+        events, mouse, click = read_input(scene)
+        if any(event.type == pygame.QUIT for event in events):
+            break
+        scene = SCENES[scene](events, mouse, click)
         pygame.display.update()
-        clock.tick(60)
-
-def paused():
-    pygame.mixer.music.pause()
-    while pause:
-        for event in pygame.event.get():            
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                quit()
-                
-        gameD.fill(yellow)
-        largeText = pygame.font.SysFont("comicsansms",115)
-        TextSurf, TextRect = text_objects("Paused", largeText)
-        TextRect.center = ((display_w/2),(display_h/2))
-        gameD.blit(TextSurf, TextRect)
-
-        button("Continue",350,450,100,50,green,bright_green,unpause)
-        button("Quit",900,450,100,50,red,bright_red,quitgame)
-
-        pygame.display.update()
-        clock.tick(60)
-
-def game_intro():
-    intro = True
-
-    while intro:
-        for event in pygame.event.get():
-            
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                quit()
-                
-        gameD.fill(yellow)
-        largeText = pygame.font.SysFont("comicsansms",115)
-        TextSurf, TextRect = text_objects("Watch Out!", largeText)
-        TextRect.center = ((display_w/2),(display_h/2))
-        gameD.blit(TextSurf, TextRect)
-
-        button("GO!",350,450,100,50,green,bright_green,gameloop)
-        button("Quit",900,450,100,50,red,bright_red,quitgame)
-
-        pygame.display.update()
-        clock.tick(60)
+        if frame_rate:
+            clock.tick(frame_rate)
+    if game:
+        game.end()
 
 def things_dodged(count):
-    font=pygame.font.SysFont(None, 25)
-    text=font.render("SCORE: "+ str(count), True, black)
+    text=scoreText.render("SCORE: "+ str(count), True, black)
     gameD.blit(text, (0,0))
 
-def things(img, img1, img2, thingx, thingx1, thingx2, thingy, thingy1, thingy2):
-    if thingx!=thingx1 and thingx!=thingx2 and thingx!=thingx1-2 and thingx!=thingx2+2 and thingx!=thingx1+3 and thingx!=thingx2-1:
-        gameD.blit(img, (thingx, thingy))
-    if thingx1!=thingx and thingx1!=thingx2 and thingx1!=thingx-2 and thingx1!=thingx2-1 and thingx1!=thingx+2 and thingx1!=thingx2+1:
-        gameD.blit(img1, (thingx1, thingy1))
-    if thingx2!=thingx and thingx2!=thingx1 and thingx2!=thingx-3 and thingx2!=thingx1-3 and thingx2!=thingx+1 and thingx2!=thingx1+1:
-        gameD.blit(img2, (thingx2, thingy2))
+def things(obstacles):
+    for thing in obstacles:
+        gameD.blit(foo[thing.img_index], (thing.x, thing.y))
 
 def road(roady):
     gameD.blit(imgroad, (0, roady))
-        
+
 def car(x,y):
     gameD.blit(carimg,(x,y))
 
@@ -149,134 +269,129 @@ def text_objects(text, font):
     textsurface = font.render(text, True, black)
     return textsurface, textsurface.get_rect()
 
-def message_display(text):
-    largetext = pygame.font.Font('freesansbold.ttf', 115)
-    textsurf, textrect = text_objects(text, largetext)
-    textrect.center  = ((display_w/2), (display_h/2))
-    
-    gameD.blit(textsurf, textrect)
-    pygame.display.update()
-    
-    time.sleep(2)
-    gameloop()
-
-def randimg():
-    image=random.choice(foo)
-    return image
-
-def gameloop():
-    global pause
-    x = (display_w * 0.45)
-    y = (display_h * 0.7)
-    
-    pygame.mixer.music.play(-1)
-    gameexit = False
-    
-    x_change, y_change = 0, 0
-    
-    thing_startx = random.randrange(0, display_w)
-    thing_starty = -600   
-    thing_startx1 = random.randrange(0, display_w)
-    thing_starty1 = -800 
-    thing_startx2 = random.randrange(0, display_w)
-    thing_starty2 = -900
-    
-    roady = 0
-    roadyo = -680
-    thing_speed = 7
-    thing_width = 65
-    thing_height = 130
-    dodged=0
-    
-    while not gameexit:
-        for event in pygame.event.get():
-            
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                quit()
-                
-            if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_LEFT:
-                    x_change = -5
-                elif event.key == pygame.K_RIGHT:
-                    x_change = 5
-                elif event.key == pygame.K_UP:
-                    y_change = -5
-                elif event.key == pygame.K_DOWN:
-                    y_change = 5
-                elif event.key==pygame.K_p:
-                    pause=True
-                    paused()
-                    
-            if event.type == pygame.KEYUP:
-                if event.key == pygame.K_LEFT or event.key == pygame.K_RIGHT or event.key == pygame.K_UP or event.key == pygame.K_DOWN:
-                    x_change=0
-                    y_change=0    
-        x += x_change    
-        y += y_change
-        
-        roady += 8
-        if roady > display_h:
-            roady = 0
-            roadyo = -680
-        if roady > 0:
-            gameD.blit(imgroad, (0,roady))
-            roadyo += 8
-            road(roadyo)
-        
-        if thing_starty < -500:
-            img = randimg() 
-
-        if thing_starty1 < -600:
-            img1 = randimg()
-
-        if thing_starty2 < -700:
-            img2 = randimg()
-
-        things(img, img1, img2, thing_startx, thing_startx1, thing_startx2, thing_starty, thing_starty1, thing_starty2)
-     
-        thing_starty += thing_speed
-        thing_starty1 += 10
-        thing_starty2 += 13
-
-        if thing_starty > display_h:
-            thing_starty = 0 - thing_height
-            thing_startx = random.randrange(0, display_w)
-            img=random.choice(foo)    
-            dodged += 1
-
-        if thing_starty1 > display_h:
-            thing_starty1 = 0 - thing_height
-            thing_startx1 = random.randrange(0, display_w)
-            img1=random.choice(foo)    
-            dodged += 1
-
-        if thing_starty2 > display_h:
-            thing_starty2 = 0 - thing_height
-            thing_startx2 = random.randrange(0, display_w)
-            img2=random.choice(foo)    
-            dodged += 1
-
-        car(x,y)
-        things_dodged(dodged)
-        
-        if x > display_w - car_width or x < 0 or y < 0 or y > display_h:
-            crashed()
-        
-        if y < thing_starty + thing_height and y+155 > thing_starty:    
-            if x >= thing_startx and x <= thing_startx + thing_width or x+car_width>=thing_startx and x+car_width<=thing_startx+thing_width:
-                crashed()
-        if y < thing_starty1 + thing_height and y+155 > thing_starty1:    
-            if x >= thing_startx1 and x <= thing_startx1 + thing_width or x+car_width>=thing_startx1 and x+car_width<=thing_startx1+thing_width:
-                crashed()
-        if y < thing_starty2 + thing_height and y+155 > thing_starty2:    
-            if x >= thing_startx2 and x <= thing_startx2 + thing_width or x+car_width>=thing_startx2 and x+car_width<=thing_startx2+thing_width:
-                crashed()
-                
-        pygame.display.update()
-        clock.tick(60)
-
-game_intro()
-gameloop()
+# --- Soak Test ---
+# python SinglePlayer/main.py --soak 1000 plays a thousand games through the real scenes,
+# with no window and no frame cap, and reports the memory still allocated and the deepest
+# stack seen. Both must stay flat however many games are played. It then steps a game with
+# ALLOCATION_CHECK_OBSTACLES obstacles the way Game.step() does, and fails if any frame
+# allocates more than STEP_ALLOCATION_BUDGET bytes, plus RESPAWN_ALLOCATION_BUDGET per obstacle
+# respawned in it, or leaves any object behind. The obstacles are a preallocated pool
+# (simulation.PooledGame), so a frame costs the same with 3 obstacles or 100; stepping immutable
+# States instead allocates a new Obstacle for every obstacle, about 12 KiB a frame with 100.
+BUTTON_SPOT = (400, 475) # Inside GO!, Continue and Play Again
+ALLOCATION_CHECK_OBSTACLES = 100 # Obstacles on the road in the allocation check
+ALLOCATION_WARM_UP_FRAMES = 200  # Frames stepped before measuring (fills the interpreter's free lists)
+ALLOCATION_CHECK_FRAMES = 5000   # Frames measured by the allocation check
+STEP_ALLOCATION_BUDGET = 1024    # Bytes one step may allocate at its peak: temporary numbers
+RESPAWN_ALLOCATION_BUDGET = 96   # Extra bytes per obstacle respawned in the step (its new field values)
+
+class SoakPlayer:
+    """
+    Scripted input for --soak: starts a game, steers at random, pauses now and then, and plays
+    again after every crash, until `restarts` games have been started.
+    """
+
+    def __init__(self, restarts, seed=1):
+        self.restarts = restarts
+        self.rng = random.Random(seed)
+        self.frames = 0
+        self.max_stack_depth = 0
+
+    def __call__(self, scene):
+        self.frames += 1
+        self.max_stack_depth = max(self.max_stack_depth, stack_depth())
+        if games_started > self.restarts:
+            return [pygame.event.Event(pygame.QUIT)], (0, 0), False
+        if scene != PLAYING:
+            return [], BUTTON_SPOT, True
+        events = []
+        if self.rng.random() < 0.05:
+            key = self.rng.choice((pygame.K_LEFT, pygame.K_RIGHT, pygame.K_UP, pygame.K_DOWN))
+            events.append(pygame.event.Event(pygame.KEYDOWN, key=key))
+        elif self.rng.random() < 0.002:
+            events.append(pygame.event.Event(pygame.KEYDOWN, key=pygame.K_p))
+        return events, (0, 0), False
+
+def stack_depth():
+    frame, depth = sys._getframe(), 0
+    while frame:
+        frame, depth = frame.f_back, depth + 1
+    return depth
+
+def step_allocations(frames, seed=2):
+    """
+    Steps a game with ALLOCATION_CHECK_OBSTACLES obstacles and random steering, while
+    tracemalloc is tracing.
+    Returns:
+        tuple: (most bytes one step allocated at its peak beyond its respawn allowance,
+                objects created and never freed).
+    """
+    import gc
+    import tracemalloc
+
+    rng = random.Random(seed)
+    checked_rules = simulation.rules_with_obstacles(rules, ALLOCATION_CHECK_OBSTACLES)
+    world = simulation.PooledGame(simulation.add_player(simulation.new_game(seed, checked_rules), PLAYER), PLAYER)
+    x_axis = y_axis = 0
+    most = 0
+    gc.disable() # Collections reset the count
+    objects = gc.get_count()[0] # Container objects allocated minus freed
+    for frame in range(ALLOCATION_WARM_UP_FRAMES + frames):
+        if not frame % 10:
+            x_axis, y_axis = rng.choice((-1, 0, 1)), rng.choice((-1, 0, 1))
+        before, spawned = tracemalloc.get_traced_memory()[0], world.spawned
+        tracemalloc.reset_peak()
+        world.step(x_axis, y_axis)
+        if frame >= ALLOCATION_WARM_UP_FRAMES:
+            allowance = RESPAWN_ALLOCATION_BUDGET * (world.spawned - spawned)
+            most = max(most, tracemalloc.get_traced_memory()[1] - before - allowance)
+    objects = gc.get_count()[0] - objects
+    gc.enable()
+    return most, objects
+
+def soak(restarts):
+    """
+    Plays `restarts` games after a warm-up, reports the memory they left allocated, and checks
+    that stepping a game allocates a flat amount per frame.
+    Returns:
+        bool: True if the allocation check passed.
+    """
+    import gc
+    import tracemalloc
+
+    warm_up = 10 # Games played before measuring, so caches are already filled
+    player = SoakPlayer(warm_up)
+    run(player, frame_rate=None)
+    started = time.perf_counter()
+    frames = player.frames
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.take_snapshot()
+    player.restarts = warm_up + restarts
+    run(player, frame_rate=None)
+    gc.collect() # Only count what is really still referenced
+    current, peak = tracemalloc.get_traced_memory()
+    growth = tracemalloc.take_snapshot().compare_to(baseline, 'lineno')[:3]
+    step_bytes, step_objects = step_allocations(ALLOCATION_CHECK_FRAMES)
+    tracemalloc.stop()
+
+    print(f"{games_started - warm_up - 1} restarts, {player.frames - frames} frames in {time.perf_counter() - started:.1f} s")
+    print(f"Still allocated since warm-up: {current / 1024:.1f} KiB (peak {peak / 1024:.1f} KiB)")
+    print(f"Deepest stack: {player.max_stack_depth} frames")
+    for stat in growth:
+        print(f"  {stat}")
+    flat = step_bytes <= STEP_ALLOCATION_BUDGET and step_objects <= 0
+    print(f"{'ok  ' if flat else 'FAIL'} {ALLOCATION_CHECK_FRAMES} steps with {ALLOCATION_CHECK_OBSTACLES} obstacles: "
+          f"at most {step_bytes} B per step besides respawns (budget {STEP_ALLOCATION_BUDGET} B), "
+          f"{step_objects} objects left over")
+    return flat
+
+status = 0
+if args.soak:
+    status = 0 if soak(args.soak) else 1
+else:
+    run()
+if leaderboard is not None:
+    leaderboard.close()
 pygame.quit()
-quit()
+sys.exit(status)
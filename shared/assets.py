@@ -0,0 +1,301 @@
+import argparse
+import hashlib
+import json
+import os
+import struct
+import sys
+import time
+
+import pygame
+
+# --- Shared Assets ---
+# One copy of the images and sounds for the single-player game and the multiplayer client,
+# and one place that loads them:
+#
+#   - every image is converted to the display's pixel format once, with convert() when it has
+#     no transparent pixels (road.jpg) and convert_alpha() only when it does, so opaque blits
+#     skip per-pixel blending,
+#   - the car sprites are packed into one atlas surface and handed out as subsurfaces,
+#   - decoded pixels are cached on disk keyed by a hash of the source files, so later starts
+#     read raw pixels instead of decoding PNG/JPEG again (a changed source file gets a new key),
+#   - sounds are loaded on first use and music is streamed by pygame.mixer.music, so a large
+#     music file costs nothing at startup; missing sound files or no audio device just mean
+#     silence.
+#
+# Run this file to compare cold and warm startup against loading every file directly:
+#
+#     python shared/assets.py
+
+ASSET_DIR = os.path.dirname(os.path.abspath(__file__))
+IMAGE_DIR = os.path.join(ASSET_DIR, 'image')
+SOUND_DIR = os.path.join(ASSET_DIR, 'sound')
+CACHE_DIR = os.environ.get('WATCHOUT_ASSET_CACHE', os.path.join(os.path.expanduser('~'), '.cache', 'watch-out'))
+CACHE_VERSION = 1  # Bump when the cache file layout changes
+
+CAR_IMAGES = ('1.png', '2.png', '3.png', '4.png', '5.png', '6.png') # 1.png is the player's car
+ATLAS_PADDING = 1  # Transparent pixels between atlas cells, so sprites never bleed into each other
+
+CACHE_HEADER = struct.Struct('!I') # Length of the JSON metadata that precedes the raw pixels
+CACHE_PIXEL_FORMAT = 'BGRA' # Same byte order as the usual display format, so converting is a plain copy
+
+
+class Assets:
+    """
+    Loads and caches the game's images and sounds.
+    Usage:
+        assets = Assets()                 # after pygame.display.set_mode()
+        road = assets.image('road.jpg')
+        cars = assets.cars()              # [1.png, 2.png, ...] as atlas subsurfaces
+        assets.play_music('jazz.wav')
+        assets.play_sound('crash.wav')
+    """
+
+    def __init__(self, image_dir=IMAGE_DIR, sound_dir=SOUND_DIR, cache_dir=CACHE_DIR):
+        """
+        Args:
+            image_dir (str): Directory holding the image files.
+            sound_dir (str): Directory holding the sound files.
+            cache_dir (str or None): Where decoded pixels are cached; None disables the disk cache.
+        """
+        self.image_dir = image_dir
+        self.sound_dir = sound_dir
+        self.cache_dir = cache_dir
+        self._images = {}
+        self._sounds = {}
+        self._cars = None
+        self._music = None # Music file currently loaded into pygame.mixer.music
+        self._broken_music = set() # Music files that failed to load; not retried on every play
+
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    # --- Images ---
+    def image(self, name):
+        """
+        Returns:
+            pygame.Surface: The image converted to the display format.
+        Raises:
+            FileNotFoundError, pygame.error: If the file is missing or cannot be decoded.
+        """
+        surface = self._images.get(name)
+        if surface is None:
+            path = os.path.join(self.image_dir, name)
+            surface, _ = self._load_cached(_hash_files([path]), lambda: (_decode(path), None))
+            self._images[name] = surface
+        return surface
+
+    def cars(self):
+        """
+        Returns:
+            list: The car sprites in CAR_IMAGES order, as subsurfaces of one atlas.
+        """
+        if self._cars is None:
+            paths = [os.path.join(self.image_dir, name) for name in CAR_IMAGES]
+            atlas, rects = self._load_cached(_hash_files(paths), lambda: _pack_atlas([_decode(path) for path in paths]))
+            self._cars = [atlas.subsurface(rect) for rect in rects]
+        return self._cars
+
+    def _load_cached(self, key, build):
+        """
+        Returns the (surface, rects) for `key` from the disk cache, or builds them with `build()`
+        and stores the result. The surface is converted to the display format either way.
+        """
+        cached = self._read_cache(key)
+        if cached is not None:
+            self.cache_hits += 1
+            surface, rects, transparent = cached
+        else:
+            self.cache_misses += 1
+            surface, rects = build()
+            transparent = _has_transparency(surface)
+            self._write_cache(key, surface, rects, transparent)
+        # Keep per-pixel alpha only where it is used; opaque blits skip blending
+        return (surface.convert_alpha() if transparent else surface.convert()), rects
+
+    def _cache_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pixels")
+
+    def _read_cache(self, key):
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._cache_path(key), 'rb') as cache_file:
+                data = cache_file.read()
+            (header_size,) = CACHE_HEADER.unpack_from(data)
+            meta = json.loads(data[CACHE_HEADER.size:CACHE_HEADER.size + header_size])
+            pixels = data[CACHE_HEADER.size + header_size:]
+            surface = pygame.image.frombuffer(pixels, tuple(meta['size']), CACHE_PIXEL_FORMAT)
+            rects = [pygame.Rect(rect) for rect in meta['rects']] if meta['rects'] else None
+            transparent = meta['transparent']
+        except (OSError, ValueError, KeyError, struct.error, pygame.error):
+            return None # Missing, unreadable or outdated entries are simply rebuilt
+        return surface, rects, transparent
+
+    def _write_cache(self, key, surface, rects, transparent):
+        if not self.cache_dir:
+            return
+        header = json.dumps({
+            'size': surface.get_size(),
+            'transparent': transparent,
+            'rects': [tuple(rect) for rect in rects] if rects else None,
+        }).encode('utf-8')
+        path = self._cache_path(key)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(path + '.tmp', 'wb') as cache_file:
+                cache_file.write(CACHE_HEADER.pack(len(header)) + header)
+                cache_file.write(pygame.image.tobytes(surface, CACHE_PIXEL_FORMAT))
+            os.replace(path + '.tmp', path) # Readers never see a half-written entry
+        except OSError as e:
+            print(f"Warning: could not write asset cache {path}: {e}")
+
+    # --- Sounds ---
+    def sound(self, name):
+        """
+        Loads a sound effect on first use.
+        Returns:
+            pygame.mixer.Sound or None: None if there is no audio device or the file is missing.
+        """
+        if name not in self._sounds:
+            sound = None
+            if pygame.mixer.get_init():
+                try:
+                    sound = pygame.mixer.Sound(os.path.join(self.sound_dir, name))
+                except (pygame.error, FileNotFoundError) as e:
+                    print(f"Warning: could not load sound {name}: {e}")
+            self._sounds[name] = sound
+        return self._sounds[name]
+
+    def play_sound(self, name):
+        sound = self.sound(name)
+        if sound is not None:
+            sound.play()
+
+    def play_music(self, name, loops=-1):
+        """Streams a music file from disk (loaded on first play); silent if it cannot be played."""
+        if not pygame.mixer.get_init() or name in self._broken_music:
+            return
+        try:
+            if self._music != name:
+                pygame.mixer.music.load(os.path.join(self.sound_dir, name))
+                self._music = name
+            pygame.mixer.music.play(loops)
+        except pygame.error as e:
+            self._broken_music.add(name)
+            print(f"Warning: could not play music {name}: {e}")
+
+    def pause_music(self):
+        if pygame.mixer.get_init():
+            pygame.mixer.music.pause()
+
+    def unpause_music(self):
+        if pygame.mixer.get_init():
+            pygame.mixer.music.unpause()
+
+    def stop_music(self):
+        if pygame.mixer.get_init():
+            pygame.mixer.music.stop()
+
+
+def _hash_files(paths):
+    """Returns a cache key for the exact contents of `paths` (in order)."""
+    digest = hashlib.sha1(f"v{CACHE_VERSION}".encode())
+    for path in paths:
+        with open(path, 'rb') as source:
+            digest.update(source.read())
+    return digest.hexdigest()
+
+
+def _decode(path):
+    return pygame.image.load(path)
+
+
+def _has_transparency(surface):
+    """True if any pixel is not fully opaque."""
+    if not surface.get_flags() & pygame.SRCALPHA:
+        return surface.get_colorkey() is not None
+    width, height = surface.get_size()
+    return pygame.mask.from_surface(surface, 254).count() != width * height
+
+
+def _pack_atlas(surfaces):
+    """
+    Packs sprites side by side into one transparent surface.
+    Returns:
+        tuple: (atlas surface, [pygame.Rect of each sprite in the atlas])
+    """
+    width = sum(surface.get_width() + ATLAS_PADDING for surface in surfaces)
+    height = max(surface.get_height() for surface in surfaces)
+    atlas = pygame.Surface((width, height), pygame.SRCALPHA)
+    atlas.fill((0, 0, 0, 0))
+    rects = []
+    x = 0
+    for surface in surfaces:
+        rects.append(atlas.blit(surface, (x, 0)))
+        x += surface.get_width() + ATLAS_PADDING
+    return atlas, rects
+
+
+# --- Startup Measurement ---
+def _resident_kb():
+    """
+    Peak resident set size of this process in kilobytes (Linux reports kB, macOS bytes).
+    Returns None where the resource module is missing (Windows).
+    """
+    try:
+        import resource # Unix only; the games themselves never need it
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def _surface_bytes(surfaces):
+    return sum(surface.get_pitch() * surface.get_height() for surface in surfaces)
+
+
+def measure(mode, cache_dir):
+    """
+    Loads the game's images the way `mode` says and reports time and memory.
+    Modes: 'direct' (one pygame.image.load().convert_alpha() per file, as the games used to),
+    'cold' (Assets with an empty cache) and 'warm' (Assets with a filled cache).
+    """
+    pygame.display.init()
+    pygame.display.set_mode((1, 1), pygame.HIDDEN)
+    rss_before = _resident_kb()
+    started = time.perf_counter()
+    if mode == 'direct':
+        surfaces = [pygame.image.load(os.path.join(IMAGE_DIR, name)).convert_alpha()
+                    for name in ('road.jpg',) + CAR_IMAGES]
+    else:
+        assets = Assets(cache_dir=cache_dir)
+        surfaces = [assets.image('road.jpg')] + [assets.cars()[0].get_parent()]
+    elapsed = time.perf_counter() - started
+    rss_after = _resident_kb()
+    return {
+        'mode': mode,
+        'load_ms': round(elapsed * 1000, 2),
+        'pixel_bytes': _surface_bytes(surfaces),
+        'peak_rss_growth_kb': None if rss_before is None else rss_after - rss_before,
+    }
+
+
+if __name__ == "__main__":
+    import subprocess
+    import tempfile
+
+    parser = argparse.ArgumentParser(description="Measure asset startup time and memory")
+    parser.add_argument('--mode', choices=('direct', 'cold', 'warm'), help="Measure one mode in this process")
+    parser.add_argument('--cache-dir', help="Cache directory for --mode")
+    args = parser.parse_args()
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+    if args.mode:
+        print(json.dumps(measure(args.mode, args.cache_dir)))
+    else:
+        # Every mode runs in a fresh process so earlier loads do not warm the measurement
+        with tempfile.TemporaryDirectory() as cache_dir:
+            for mode in ('direct', 'cold', 'warm'):
+                output = subprocess.run([sys.executable, __file__, '--mode', mode, '--cache-dir', cache_dir],
+                                        capture_output=True, text=True, check=True).stdout
+                print(output.strip().splitlines()[-1])
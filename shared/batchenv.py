@@ -0,0 +1,416 @@
+import argparse
+import multiprocessing
+import time
+
+try:
+    import numpy as np
+except ImportError: # NumPy is optional; only the batch environment needs it
+    np = None
+
+import simulation
+from simulation import (DISPLAY_W, DISPLAY_H, CAR_WIDTH, CAR_HEIGHT, THING_WIDTH, THING_HEIGHT,
+                        START_X, START_Y, SPAWN_GAP, SPAWN_LANE_ATTEMPTS, SINGLE_PLAYER_RULES)
+
+# --- Batch Environment ---
+# Thousands of independent single-player games held as arrays and stepped in lockstep, for
+# training and evaluating driving bots without pygame. One step() moves every game by one tick
+# from an array of actions and returns the observations, rewards and done flags of all of them.
+#
+# The rules are the simulation core's, applied to whole arrays at once: a game in a BatchEnv
+# plays exactly like simulation.step() with the same seed and inputs. That includes the
+# counter-based random values (SplitMix64 on uint64 arrays) and the overlap-free spawner, which
+# runs vectorized per obstacle slot; the rare spawn that still has no free lane after every
+# lane attempt is placed by simulation.spawn_obstacle() itself.
+#
+# A game that crashes is reset at once with a new seed (auto-reset), so every step returns a
+# live game in every row. BatchEnvPool spreads the games over worker processes.
+#
+# Run this file to benchmark it, and --check to compare it with simulation.step():
+#
+#     python shared/batchenv.py --games 16384 --steps 200
+#     python shared/batchenv.py --games 256 --steps 3000 --check
+
+PLAYER_OBSERVATIONS = 2   # x, y of the player's car
+OBSTACLE_OBSERVATIONS = 3 # x, y, speed of each obstacle
+
+if np is not None:
+    U64 = np.uint64
+    MIX_1 = U64(0xBF58476D1CE4E5B9)
+    MIX_2 = U64(0x94D049BB133111EB)
+    GOLDEN_GAMMA = U64(simulation.GOLDEN_GAMMA)
+
+
+def mix64(values):
+    """simulation.mix64() on a uint64 array (multiplication wraps, as the & MASK64 does there)."""
+    values = (values ^ (values >> U64(30))) * MIX_1
+    values = (values ^ (values >> U64(27))) * MIX_2
+    return values ^ (values >> U64(31))
+
+
+def random_draw(seeds, spawns, draw):
+    """simulation.random_draw() for arrays of seeds and spawn numbers."""
+    counters = spawns.astype(np.uint64) * U64(simulation.DRAWS_PER_SPAWN) + U64(draw + 1)
+    return mix64(seeds + counters * GOLDEN_GAMMA)
+
+
+def observation_size(rules):
+    """Returns the length of one game's observation row."""
+    return PLAYER_OBSERVATIONS + OBSTACLE_OBSERVATIONS * len(rules.obstacle_offsets)
+
+
+class BatchEnv:
+    """
+    N single-player games stepped together.
+    Usage:
+        env = BatchEnv(4096)
+        observations = env.reset()
+        observations, rewards, dones = env.step(actions)   # actions: int array (N, 2) of axes
+
+    Observation rows are [car x, car y, then x, y, speed of every obstacle] as float32. The
+    reward is the score gained in the step (obstacles dodged); done is True for a game that
+    crashed in the step, or reached max_ticks, and whose row already shows its next game.
+    """
+
+    def __init__(self, count, rules=SINGLE_PLAYER_RULES, seed=0, max_ticks=None, first_game=0):
+        """
+        Args:
+            count (int): Number of games.
+            rules (simulation.Rules): The rules to play by.
+            seed (int): Base seed; every game and episode derives its own seed from it.
+            max_ticks (int, optional): Ticks after which a game ends even without a crash.
+            first_game (int): Number of the first game, so games split over several environments
+                get the same seeds as in one.
+        """
+        if np is None:
+            raise RuntimeError("The batch environment needs NumPy (pip install numpy)")
+        self.count = count
+        self.rules = rules
+        self.base_seed = seed
+        self.max_ticks = max_ticks
+        self.game_numbers = np.arange(first_game, first_game + count, dtype=np.uint64)
+        slots = len(rules.obstacle_offsets)
+
+        self.seed = np.zeros(count, dtype=np.uint64)
+        self.episode = np.zeros(count, dtype=np.int64)  # Games finished in each row
+        self.tick = np.zeros(count, dtype=np.int64)
+        self.road_offset = np.zeros(count, dtype=np.float64)
+        self.spawned = np.zeros(count, dtype=np.int64)
+        self.player_x = np.zeros(count, dtype=np.float64)
+        self.player_y = np.zeros(count, dtype=np.float64)
+        self.score = np.zeros(count, dtype=np.int64)
+        self.crashed = np.zeros(count, dtype=bool)
+        self.obstacle_id = np.zeros((count, slots), dtype=np.int64)
+        self.obstacle_x = np.zeros((count, slots), dtype=np.int64)
+        self.obstacle_y = np.zeros((count, slots), dtype=np.float64)
+        self.obstacle_speed = np.zeros((count, slots), dtype=np.int64)
+        self.obstacle_img = np.zeros((count, slots), dtype=np.int64)
+
+        self.final_score = np.zeros(count, dtype=np.int64) # Score of each row's last finished game
+        self.fallback_spawns = 0 # Spawns placed by simulation.spawn_obstacle (no free lane)
+        self._observations = np.zeros((count, observation_size(rules)), dtype=np.float32)
+        self.reset()
+
+    # --- Games ---
+    def game_seeds(self, games):
+        """Returns the seeds of the current episodes of `games` (row indices)."""
+        game_seeds = mix64(U64(self.base_seed) + (self.game_numbers[games] + U64(1)) * GOLDEN_GAMMA)
+        return mix64(game_seeds + self.episode[games].astype(np.uint64))
+
+    def reset(self, games=None):
+        """
+        Starts new games in the rows `games` (every row when omitted), as simulation.new_game()
+        plus one player.
+        Returns:
+            ndarray: The observations (the same array step() returns).
+        """
+        if games is None:
+            games = np.arange(self.count)
+        self.seed[games] = self.game_seeds(games)
+        self.tick[games] = 0
+        self.road_offset[games] = 0.0
+        self.spawned[games] = 0
+        self.player_x[games] = START_X
+        self.player_y[games] = START_Y
+        self.score[games] = 0
+        self.crashed[games] = False
+        for slot, offset in enumerate(self.rules.obstacle_offsets):
+            # Like new_game(): each obstacle avoids only the ones placed before it
+            self._spawn(games, slot, -THING_HEIGHT - offset, slot)
+        return self._observe()
+
+    def state(self, game):
+        """Returns row `game` as a simulation.State with the player 'player_1', for checks and debugging."""
+        obstacles = tuple(simulation.Obstacle(*fields) for fields in zip(
+            self.obstacle_id[game].tolist(), self.obstacle_x[game].tolist(), self.obstacle_y[game].tolist(),
+            self.obstacle_speed[game].tolist(), self.obstacle_img[game].tolist()))
+        player = simulation.Player(float(self.player_x[game]), float(self.player_y[game]),
+                                   int(self.score[game]), bool(self.crashed[game]), 0)
+        return simulation.State(self.rules, int(self.seed[game]), int(self.tick[game]), float(self.road_offset[game]),
+                                int(self.spawned[game]), {'player_1': player}, obstacles)
+
+    # --- Stepping ---
+    def step(self, actions):
+        """
+        Advances every game by one tick; finished games are reset.
+        Args:
+            actions (ndarray): (N, 2) held x and y axes, each -1, 0 or 1.
+        Returns:
+            tuple: (observations float32 (N, obs), rewards float32 (N,), dones bool (N,)). The
+                observations array is reused by the next step.
+        """
+        rules = self.rules
+        scale = rules.speed_scale
+        x_axis = actions[:, 0]
+        y_axis = actions[:, 1]
+
+        # move_players: cars that have not crashed move by their held input
+        player_step = rules.player_speed * scale
+        moving = ~self.crashed & ((x_axis != 0) | (y_axis != 0))
+        x = np.where(moving, self.player_x + x_axis * player_step, self.player_x)
+        y = np.where(moving, self.player_y + y_axis * player_step, self.player_y)
+        if rules.crash_at_edges:
+            self.crashed |= moving & ((x < 0) | (x > DISPLAY_W - CAR_WIDTH) | (y < 0) | (y > DISPLAY_H))
+        else:
+            x = np.clip(x, 0, DISPLAY_W - CAR_WIDTH)
+            y = np.clip(y, 0, DISPLAY_H - CAR_HEIGHT)
+        self.player_x, self.player_y = x, y
+
+        # move_obstacles
+        self.obstacle_y += self.obstacle_speed * scale
+
+        # respawn_and_score: one point per passed obstacle for every car still racing
+        passed = self.obstacle_y > DISPLAY_H
+        rewards = np.where(self.crashed, 0, passed.sum(axis=1))
+        self.score += rewards
+        if passed.any():
+            for slot in range(passed.shape[1]): # In slot order, like the in-place respawn
+                games = np.flatnonzero(passed[:, slot])
+                if len(games):
+                    self._spawn(games, slot, -THING_HEIGHT, passed.shape[1])
+
+        # detect_collisions: car x obstacle bounding boxes, for the cars still racing
+        px = self.player_x[:, None]
+        py = self.player_y[:, None]
+        ox = self.obstacle_x
+        oy = self.obstacle_y
+        hits = (px < ox + THING_WIDTH) & (px + CAR_WIDTH > ox) & (py < oy + THING_HEIGHT) & (py + CAR_HEIGHT > oy)
+        self.crashed |= hits.any(axis=1)
+
+        # advance_road
+        self.road_offset = (self.road_offset + rules.road_speed * scale) % DISPLAY_H
+        self.tick += 1
+
+        dones = self.crashed.copy()
+        if self.max_ticks:
+            dones |= self.tick >= self.max_ticks
+        finished = np.flatnonzero(dones)
+        if len(finished):
+            self.final_score[finished] = self.score[finished]
+            self.episode[finished] += 1
+            self.reset(finished)
+        else:
+            self._observe()
+        return self._observations, rewards.astype(np.float32), dones
+
+    def _observe(self):
+        observations = self._observations
+        observations[:, 0] = self.player_x
+        observations[:, 1] = self.player_y
+        observations[:, PLAYER_OBSERVATIONS::OBSTACLE_OBSERVATIONS] = self.obstacle_x
+        observations[:, PLAYER_OBSERVATIONS + 1::OBSTACLE_OBSERVATIONS] = self.obstacle_y
+        observations[:, PLAYER_OBSERVATIONS + 2::OBSTACLE_OBSERVATIONS] = self.obstacle_speed
+        return observations
+
+    # --- Spawning ---
+    def _spawn(self, games, slot, y, avoid_slots):
+        """
+        simulation.spawn_obstacle() for obstacle `slot` of every row in `games`, avoiding the
+        row's obstacles in slots below `avoid_slots` (the slot itself still holds the one it
+        replaces, as in the in-place respawn).
+        """
+        rules = self.rules
+        lanes = DISPLAY_W - THING_WIDTH
+        seeds = self.seed[games]
+        spawns = self.spawned[games] + 1
+        self.spawned[games] = spawns
+        x = (random_draw(seeds, spawns, 0) % U64(lanes)).astype(np.int64)
+        speed = rules.obstacle_speed + (random_draw(seeds, spawns, 1) % U64(rules.obstacle_speed_spread + 1)).astype(np.int64)
+        image = (random_draw(seeds, spawns, 2) % U64(rules.image_count)).astype(np.int64)
+        spare = random_draw(seeds, spawns, 3)
+
+        pending = np.arange(len(games)) # Spawns still in the way of another obstacle
+        for attempt in range(1, SPAWN_LANE_ATTEMPTS + 1):
+            blocked = self._in_the_way(games[pending], x[pending], y, speed[pending], avoid_slots)
+            pending = pending[blocked]
+            if not len(pending):
+                break
+            if attempt < SPAWN_LANE_ATTEMPTS:
+                x[pending] = (mix64(spare[pending] + U64(attempt)) % U64(lanes)).astype(np.int64)
+
+        ys = np.full(len(games), float(y))
+        for index in pending.tolist():
+            # No free lane: the scalar spawner queues it up above the others
+            self.fallback_spawns += 1
+            obstacles = self.state(games[index]).obstacles[:avoid_slots]
+            obstacle = simulation.spawn_obstacle(rules, int(seeds[index]), int(spawns[index]), y, obstacles)
+            x[index], ys[index], speed[index] = obstacle.x, obstacle.y, obstacle.speed
+
+        self.obstacle_id[games, slot] = spawns
+        self.obstacle_x[games, slot] = x
+        self.obstacle_y[games, slot] = ys
+        self.obstacle_speed[games, slot] = speed
+        self.obstacle_img[games, slot] = image
+
+    def _in_the_way(self, games, x, y, speed, avoid_slots):
+        """simulation._in_the_way() of one new obstacle per row against the row's obstacles."""
+        other_x = self.obstacle_x[games, :avoid_slots]
+        other_y = self.obstacle_y[games, :avoid_slots]
+        other_speed = self.obstacle_speed[games, :avoid_slots]
+        y = np.full(len(games), float(y))[:, None]
+        speed = speed[:, None]
+        same_lane = np.abs(x[:, None] - other_x) < THING_WIDTH + SPAWN_GAP
+        above = y <= other_y
+        upper_y = np.where(above, y, other_y)
+        upper_speed = np.where(above, speed, other_speed)
+        lower_y = np.where(above, other_y, y)
+        lower_speed = np.where(above, other_speed, speed)
+        gap = lower_y - upper_y - THING_HEIGHT
+        closing = upper_speed - lower_speed
+        with np.errstate(divide='ignore', invalid='ignore'): # Only rows with closing > 0 count
+            catches_up = (closing > 0) & (gap / closing < (DISPLAY_H - lower_y) / lower_speed)
+        return (same_lane & ((gap < SPAWN_GAP) | catches_up)).any(axis=1)
+
+
+# --- Process Pool ---
+def _worker(connection, count, rules, seed, max_ticks, first_game):
+    env = BatchEnv(count, rules, seed, max_ticks, first_game)
+    connection.send(env.reset().copy())
+    while True:
+        actions = connection.recv()
+        if actions is None:
+            break
+        observations, rewards, dones = env.step(actions)
+        connection.send((observations, rewards, dones, env.final_score))
+    connection.close()
+
+
+class BatchEnvPool:
+    """
+    A BatchEnv whose games are split over worker processes, each stepping its share in lockstep.
+    Games get the same seeds as in a single BatchEnv of the same size, so results are identical.
+    Usage:
+        with BatchEnvPool(65536, workers=4) as env:
+            observations, rewards, dones = env.step(actions)
+    """
+
+    def __init__(self, count, workers, rules=SINGLE_PLAYER_RULES, seed=0, max_ticks=None):
+        self.count = count
+        bounds = [count * worker // workers for worker in range(workers + 1)]
+        self._slices = [slice(start, end) for start, end in zip(bounds, bounds[1:])]
+        self._connections = []
+        self._processes = []
+        for part in self._slices:
+            parent, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_worker, daemon=True,
+                                              args=(child, part.stop - part.start, rules, seed, max_ticks, part.start))
+            process.start()
+            self._connections.append(parent)
+            self._processes.append(process)
+        self.observations = np.concatenate([connection.recv() for connection in self._connections])
+        self.final_score = np.zeros(count, dtype=np.int64)
+
+    def reset(self):
+        """Returns the observations of the games being played (games start when the pool does)."""
+        return self.observations
+
+    def step(self, actions):
+        """Same as BatchEnv.step(); the observations array is a new one every step."""
+        for connection, part in zip(self._connections, self._slices):
+            connection.send(actions[part])
+        results = [connection.recv() for connection in self._connections]
+        self.observations = np.concatenate([result[0] for result in results])
+        self.final_score = np.concatenate([result[3] for result in results])
+        return (self.observations, np.concatenate([result[1] for result in results]),
+                np.concatenate([result[2] for result in results]))
+
+    def close(self):
+        for connection in self._connections:
+            connection.send(None)
+        for process in self._processes:
+            process.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# --- Benchmark and Check ---
+def random_actions(rng, count):
+    return rng.integers(-1, 2, size=(count, 2), dtype=np.int64)
+
+
+def check(count, steps, rules, seed):
+    """
+    Plays `count` games for `steps` ticks both in a BatchEnv and one by one with simulation.step(),
+    with the same random actions, and compares every game after every step.
+    Returns:
+        int: Number of mismatching (game, step) pairs.
+    """
+    env = BatchEnv(count, rules, seed)
+    states = [env.state(game) for game in range(count)]
+    rng = np.random.default_rng(seed)
+    mismatches = 0
+    resets = 0
+    for _ in range(steps):
+        actions = random_actions(rng, count)
+        _, rewards, dones = env.step(actions)
+        for game in range(count):
+            before = states[game].players['player_1'].score
+            state = simulation.step(states[game], {'player_1': tuple(actions[game].tolist())})
+            if dones[game]:
+                ok = state.players['player_1'].crashed and env.final_score[game] == state.players['player_1'].score
+                resets += 1
+                state = simulation.add_player(simulation.new_game(int(env.seed[game]), rules), 'player_1')
+            else:
+                ok = rewards[game] == state.players['player_1'].score - before
+            if not ok or simulation.checksum(state) != simulation.checksum(env.state(game)) or state != env.state(game):
+                mismatches += 1
+                state = env.state(game) # Report each divergence once
+            states[game] = state
+    print(f"Checked {count} games x {steps} steps ({resets} crashes and resets, "
+          f"{env.fallback_spawns} queued spawns): {mismatches} mismatches")
+    return mismatches
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the batch environment")
+    parser.add_argument('--games', type=int, default=16384, help="Games stepped in lockstep")
+    parser.add_argument('--steps', type=int, default=200, help="Steps to run")
+    parser.add_argument('--workers', type=int, default=0, help="Worker processes (0: step in this process)")
+    parser.add_argument('--rules', choices=('single', 'multi'), default='single', help="Rule set")
+    parser.add_argument('--obstacles', type=int, help="Obstacles per game (default: as in the rule set)")
+    parser.add_argument('--seed', type=int, default=0, help="Base seed")
+    parser.add_argument('--check', action='store_true', help="Compare every game with simulation.step() instead")
+    args = parser.parse_args()
+    rules = SINGLE_PLAYER_RULES if args.rules == 'single' else simulation.MULTIPLAYER_RULES
+    if args.obstacles:
+        rules = simulation.rules_with_obstacles(rules, args.obstacles)
+
+    if args.check:
+        raise SystemExit(1 if check(args.games, args.steps, rules, args.seed) else 0)
+
+    env = BatchEnvPool(args.games, args.workers, rules, args.seed) if args.workers else BatchEnv(args.games, rules, args.seed)
+    rng = np.random.default_rng(args.seed)
+    actions = [random_actions(rng, args.games) for _ in range(8)]
+    started = time.perf_counter()
+    crashes = 0
+    for step in range(args.steps):
+        _, _, dones = env.step(actions[step % len(actions)])
+        crashes += int(dones.sum())
+    elapsed = time.perf_counter() - started
+    if args.workers:
+        env.close()
+    print(f"{args.games} games x {args.steps} steps in {elapsed:.2f} s: "
+          f"{args.games * args.steps / elapsed / 1e6:.2f} M game-steps/s, {crashes} crashes and resets")
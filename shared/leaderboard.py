@@ -0,0 +1,248 @@
+import argparse
+import bisect
+import os
+import queue
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import namedtuple
+
+# --- Leaderboard ---
+# Every finished run of either game (a crash, or leaving a multiplayer match mid-run) is
+# stored for good in a local SQLite database, and the best runs are ranked:
+#
+#   - record() never touches the database: it updates an in-memory index (each player's
+#     stats and a ranking sorted by best score) and queues the row, so it is safe to call
+#     from a game loop or a server tick,
+#   - a background writer thread drains the queue and writes whole batches in one
+#     transaction, at most FLUSH_INTERVAL after a score came in; the database runs in WAL
+#     mode, so readers (e.g. another server process or the CLI below) never block it,
+#   - top() and stats() answer from the index, which is loaded from the database once at
+#     startup and kept up to date by record(), so queries never wait for a write.
+#
+# Look at a database with:
+#
+#     python shared/leaderboard.py [PATH] [--top 20]
+#     python shared/leaderboard.py --bench      # write-behind cost and query speed
+
+DEFAULT_PATH = os.environ.get('WATCHOUT_LEADERBOARD',
+                              os.path.join(os.path.expanduser('~'), '.local', 'share', 'watch-out', 'leaderboard.db'))
+FLUSH_INTERVAL = 1.0 # Seconds a recorded score may wait before it is written
+BATCH_SIZE = 512     # Scores written per transaction at most
+MAX_NAME_LENGTH = 32 # Characters kept of a player name
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scores (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    score INTEGER NOT NULL,
+    mode TEXT NOT NULL,          -- 'single' or 'multi'
+    recorded_at REAL NOT NULL    -- Unix time
+);
+CREATE TABLE IF NOT EXISTS players (
+    name TEXT PRIMARY KEY,
+    best INTEGER NOT NULL,
+    games INTEGER NOT NULL,
+    total_score INTEGER NOT NULL,
+    last_played REAL NOT NULL
+);
+"""
+UPSERT_PLAYER = """
+INSERT INTO players (name, best, games, total_score, last_played) VALUES (?, ?, 1, ?, ?)
+ON CONFLICT (name) DO UPDATE SET best = max(best, excluded.best), games = games + 1,
+    total_score = total_score + excluded.total_score, last_played = excluded.last_played
+"""
+
+PlayerStats = namedtuple('PlayerStats', ['name', 'best', 'games', 'total_score', 'last_played'])
+
+
+def clean_name(name):
+    """Returns a player name as it is stored: stripped, at most MAX_NAME_LENGTH characters."""
+    return ' '.join(str(name).split())[:MAX_NAME_LENGTH] or 'anonymous'
+
+
+class Leaderboard:
+    """
+    Persistent scores with an in-memory ranking.
+    Usage:
+        leaderboard = Leaderboard(path)
+        leaderboard.record('ann', 42, 'single')   # cheap; written in the background
+        leaderboard.top(0, 10)                    # [(rank, PlayerStats), ...]
+        leaderboard.close()                       # writes what is still queued
+    record() and the queries must be called from one thread (the game loop or the event loop).
+    """
+
+    def __init__(self, path=DEFAULT_PATH, flush_interval=FLUSH_INTERVAL):
+        """
+        Args:
+            path (str): Database file, created with its directory if missing.
+            flush_interval (float): Seconds a recorded score may wait before it is written.
+        Raises:
+            sqlite3.Error: If the database cannot be opened or is not a leaderboard.
+        """
+        self.path = path
+        self.flush_interval = flush_interval
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        connection = self._connect()
+        try:
+            connection.executescript(SCHEMA)
+            rows = connection.execute("SELECT name, best, games, total_score, last_played FROM players").fetchall()
+        finally:
+            connection.close()
+
+        self._players = {row[0]: PlayerStats(*row) for row in rows}
+        self._ranking = sorted((-stats.best, name) for name, stats in self._players.items()) # Best first
+
+        self._queue = queue.Queue()
+        self.written = 0          # Scores written so far
+        self.batches = 0          # Transactions committed
+        self.write_seconds = 0.0  # Time the writer spent in the database
+        self._writer = threading.Thread(target=self._write_loop, name='leaderboard-writer', daemon=True)
+        self._writer.start()
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=10.0)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL") # WAL stays consistent; a power cut loses at most the last batch
+        return connection
+
+    # --- Recording ---
+    def record(self, name, score, mode):
+        """
+        Adds a finished run. The ranking reflects it at once; the database a moment later.
+        Args:
+            name (str): Player name.
+            score (int): Obstacles dodged in the run.
+            mode (str): 'single' or 'multi'.
+        """
+        name = clean_name(name)
+        now = time.time()
+        stats = self._players.get(name)
+        if stats is None:
+            stats = PlayerStats(name, score, 1, score, now)
+            bisect.insort(self._ranking, (-score, name))
+        else:
+            if score > stats.best:
+                self._ranking.pop(bisect.bisect_left(self._ranking, (-stats.best, name)))
+                bisect.insort(self._ranking, (-score, name))
+            stats = PlayerStats(name, max(stats.best, score), stats.games + 1, stats.total_score + score, now)
+        self._players[name] = stats
+        self._queue.put((name, score, mode, now))
+
+    # --- Queries ---
+    def __len__(self):
+        """Number of ranked players."""
+        return len(self._ranking)
+
+    def top(self, offset=0, count=10):
+        """
+        Returns one page of the ranking (one entry per player, by best score).
+        Returns:
+            list: (rank, PlayerStats) tuples; rank 1 is the best.
+        """
+        page = self._ranking[offset:offset + count]
+        return [(offset + index + 1, self._players[name]) for index, (_, name) in enumerate(page)]
+
+    def stats(self, name):
+        """
+        Returns:
+            PlayerStats or None: The player's best score, games played and total score.
+        """
+        return self._players.get(clean_name(name))
+
+    def rank(self, name):
+        """Returns the player's rank (1 is the best), or None for unknown players."""
+        stats = self.stats(name)
+        if stats is None:
+            return None
+        return bisect.bisect_left(self._ranking, (-stats.best, stats.name)) + 1
+
+    # --- Writer ---
+    def flush(self):
+        """Blocks until every score recorded so far is written."""
+        self._queue.join()
+
+    def close(self):
+        """Writes what is still queued and stops the writer thread."""
+        if self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join()
+
+    def _write_loop(self):
+        connection = self._connect()
+        stopping = False
+        while not stopping:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < BATCH_SIZE: # Gather what comes in until the flush is due
+                timeout = deadline - time.monotonic()
+                if batch[-1] is None or timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            if batch[-1] is None:
+                stopping = True
+            rows = [row for row in batch if row is not None]
+            if rows:
+                started = time.perf_counter()
+                try:
+                    with connection: # One transaction per batch
+                        connection.executemany("INSERT INTO scores (name, score, mode, recorded_at) VALUES (?, ?, ?, ?)", rows)
+                        connection.executemany(UPSERT_PLAYER, [(name, score, score, now) for name, score, _, now in rows])
+                    self.written += len(rows)
+                    self.batches += 1
+                except sqlite3.Error as e:
+                    print(f"Warning: could not write {len(rows)} scores to {self.path}: {e}")
+                self.write_seconds += time.perf_counter() - started
+            for _ in batch:
+                self._queue.task_done()
+        connection.close()
+
+
+# --- Command Line ---
+def bench(path, scores, players):
+    """Records `scores` runs as fast as possible and reports the caller's cost, the write rate and query speed."""
+    rng = random.Random(1)
+    leaderboard = Leaderboard(path, flush_interval=0.05)
+    started = time.perf_counter()
+    for _ in range(scores):
+        leaderboard.record(f"bot{rng.randrange(players)}", rng.randrange(500), 'multi')
+    record_seconds = time.perf_counter() - started
+    leaderboard.flush()
+    flush_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    for offset in range(0, 1000):
+        leaderboard.top(offset % len(leaderboard), 10)
+    query_seconds = (time.perf_counter() - started) / 1000
+    leaderboard.close()
+    print(f"record(): {record_seconds / scores * 1e6:.1f} us per score on the caller's thread")
+    print(f"Writer: {leaderboard.written} scores in {leaderboard.batches} transactions, "
+          f"{leaderboard.written / flush_seconds:.0f} scores/s, {leaderboard.write_seconds:.2f} s in SQLite")
+    print(f"top(): {query_seconds * 1e6:.1f} us per page of 10 ({len(leaderboard)} players)")
+    started = time.perf_counter()
+    Leaderboard(path).close()
+    print(f"Startup with index load: {(time.perf_counter() - started) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show the Watch Out leaderboard")
+    parser.add_argument('path', nargs='?', default=DEFAULT_PATH, help="Leaderboard database (default: %(default)s)")
+    parser.add_argument('--top', type=int, default=20, help="Players to show")
+    parser.add_argument('--bench', action='store_true', help="Benchmark a throwaway database instead")
+    parser.add_argument('--scores', type=int, default=100000, help="Scores recorded by --bench")
+    args = parser.parse_args()
+
+    if args.bench:
+        with tempfile.TemporaryDirectory() as directory:
+            bench(os.path.join(directory, 'leaderboard.db'), args.scores, players=5000)
+    else:
+        leaderboard = Leaderboard(args.path)
+        for rank, stats in leaderboard.top(0, args.top):
+            print(f"{rank:4}. {stats.name:<{MAX_NAME_LENGTH}} best {stats.best:6}  games {stats.games:6}  "
+                  f"average {stats.total_score / stats.games:8.1f}")
+        leaderboard.close()
@@ -0,0 +1,599 @@
+import argparse
+import atexit
+import bisect
+import json
+import mmap
+import os
+import queue
+import random
+import struct
+import threading
+import time
+
+import simulation
+
+# --- Replays ---
+# A replay is the seed of a game plus everything the players did, so simulation.step() can
+# play the match again exactly. The file is an append-only log:
+#
+#     header:  MAGIC, version, JSON metadata (seed, rules, tick rate, keyframe interval)
+#     records: [type: u8][ticks since the previous record: varint][payload]
+#
+# Only changes are logged: a player joining, leaving or resetting, and a player's held input
+# changing (one byte for both axes). Ticks where nobody touches a key cost nothing. Every
+# KEYFRAME_INTERVAL ticks a keyframe stores the full state, so a viewer can seek to any tick
+# by decoding the nearest keyframe before it and simulating forward from there.
+#
+# The recorder only builds a few bytes per tick on the simulation thread; writing to disk and
+# encoding keyframes (State is immutable, so another thread can read it safely) happen on a
+# writer thread. The writer is a daemon thread, so a recorder that is never closed cannot keep
+# the process from exiting; an atexit hook closes it instead and waits for what is queued to be
+# written. The reader maps the file into memory and indexes its keyframes once.
+#
+#     python shared/replay.py FILE                 # summary
+#     python shared/replay.py FILE --tick 12000    # seek and print the state
+#     python shared/replay.py FILE --verify        # re-simulate and compare every keyframe
+#     python shared/replay.py FILE --view          # watch it (arrows seek, space pauses)
+#     python shared/replay.py --bench              # record a long bot session, report cost and size
+
+MAGIC = b'WOREPLAY'
+FORMAT_VERSION = 2 # 2: obstacles are spawned clear of each other, so version 1 files replay differently
+HEADER = struct.Struct('!8sHI')   # magic, format version, length of the JSON metadata
+DOUBLE = struct.Struct('!d')
+KEYFRAME_INTERVAL = 600 # Ticks between keyframes (30 s at 20 ticks/s, 10 s at 60 frames/s)
+REPLAY_SUFFIX = '.wor'
+
+# Record types
+RECORD_JOIN = 1     # slot, car image index, player id
+RECORD_LEAVE = 2    # slot
+RECORD_RESET = 3    # slot
+RECORD_INPUT = 4    # slot, held axes
+RECORD_KEYFRAME = 5 # length, full state
+RECORD_END = 6      # (nothing) the tick the recording stopped at
+
+HOLD_STILL = 4      # encode_axes(0, 0)
+
+
+def encode_axes(x_axis, y_axis):
+    """Packs a held input (each axis -1, 0 or 1) into one byte, 0..8."""
+    return (x_axis + 1) * 3 + (y_axis + 1)
+
+
+def decode_axes(value):
+    return value // 3 - 1, value % 3 - 1
+
+
+def encode_varint(value, out):
+    """Appends an unsigned LEB128 integer to the bytearray `out`."""
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def read_varint(data, offset):
+    """Returns (value, offset after it)."""
+    value = shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+def replay_path(directory, label):
+    """Returns an unused replay file name in `directory`, e.g. room3-20261017-142501.wor."""
+    base = os.path.join(directory, f"{label}-{time.strftime('%Y%m%d-%H%M%S')}")
+    path, number = base + REPLAY_SUFFIX, 1
+    while os.path.exists(path): # Several games ended within the same second
+        number += 1
+        path = f"{base}-{number}{REPLAY_SUFFIX}"
+    return path
+
+
+# --- Keyframes ---
+def encode_keyframe(state, slots, held):
+    """
+    Serializes a full game state.
+    Args:
+        state (simulation.State): The state at the keyframe's tick.
+        slots (dict): {player_id: slot} of the players in the state.
+        held (dict): {slot: axes byte} held inputs in effect for the next step.
+    Returns:
+        bytearray: The keyframe payload.
+    """
+    out = bytearray(DOUBLE.pack(state.road_offset))
+    encode_varint(state.spawned, out)
+    encode_varint(len(state.players), out)
+    for player_id, player in state.players.items():
+        slot = slots[player_id]
+        encoded_id = player_id.encode('utf-8')
+        encode_varint(slot, out)
+        out.append(len(encoded_id))
+        out += encoded_id
+        out += DOUBLE.pack(player.x)
+        out += DOUBLE.pack(player.y)
+        encode_varint(player.score, out)
+        out.append(player.crashed)
+        encode_varint(player.car_img_index, out)
+        out.append(held.get(slot, HOLD_STILL))
+    encode_varint(len(state.obstacles), out)
+    for obstacle in state.obstacles:
+        encode_varint(obstacle.id, out)
+        encode_varint(obstacle.x, out) # Lanes are whole pixels
+        out += DOUBLE.pack(obstacle.y)
+        encode_varint(obstacle.speed, out)
+        encode_varint(obstacle.img_index, out)
+    return out
+
+
+def decode_keyframe(data, offset, rules, seed, tick):
+    """
+    Returns:
+        tuple: (simulation.State, {slot: player_id}, {player_id: (x_axis, y_axis)})
+    """
+    (road_offset,) = DOUBLE.unpack_from(data, offset)
+    offset += DOUBLE.size
+    spawned, offset = read_varint(data, offset)
+    count, offset = read_varint(data, offset)
+    players, slots, held = {}, {}, {}
+    for _ in range(count):
+        slot, offset = read_varint(data, offset)
+        id_length = data[offset]
+        player_id = bytes(data[offset + 1:offset + 1 + id_length]).decode('utf-8')
+        offset += 1 + id_length
+        (x,) = DOUBLE.unpack_from(data, offset)
+        (y,) = DOUBLE.unpack_from(data, offset + DOUBLE.size)
+        offset += 2 * DOUBLE.size
+        score, offset = read_varint(data, offset)
+        crashed = bool(data[offset])
+        car_img_index, offset = read_varint(data, offset + 1)
+        held[player_id] = decode_axes(data[offset])
+        offset += 1
+        players[player_id] = simulation.Player(x, y, score, crashed, car_img_index)
+        slots[slot] = player_id
+    count, offset = read_varint(data, offset)
+    obstacles = []
+    for _ in range(count):
+        obstacle_id, offset = read_varint(data, offset)
+        x, offset = read_varint(data, offset)
+        (y,) = DOUBLE.unpack_from(data, offset)
+        speed, offset = read_varint(data, offset + DOUBLE.size)
+        img_index, offset = read_varint(data, offset)
+        obstacles.append(simulation.Obstacle(obstacle_id, x, y, speed, img_index))
+    state = simulation.State(rules, seed, tick, road_offset, spawned, players, tuple(obstacles))
+    return state, slots, held
+
+
+# --- Recording ---
+class ReplayRecorder:
+    """
+    Appends one game to a replay file.
+    Usage (on the simulation thread):
+        recorder = ReplayRecorder(path, state.seed, state.rules, tick_rate)
+        recorder.join(state.tick, player_id, car_img_index)   # also leave() / reset()
+        recorder.record_tick(state, inputs)                   # right before state = step(state, inputs)
+        recorder.close(state.tick)
+    """
+
+    def __init__(self, path, seed, rules, tick_rate, keyframe_interval=KEYFRAME_INTERVAL):
+        """
+        Args:
+            path (str): File to create.
+            seed (int): The game's seed.
+            rules (simulation.Rules): The rules the game is played by.
+            tick_rate (int): Ticks per second, for playback speed.
+            keyframe_interval (int): Ticks between full-state keyframes.
+        """
+        self.path = path
+        self.keyframe_interval = keyframe_interval
+        meta = json.dumps({
+            'seed': seed,
+            'rules': rules._asdict(),
+            'tick_rate': tick_rate,
+            'keyframe_interval': keyframe_interval,
+            'recorded_at': time.time(),
+        }).encode('utf-8')
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(path, 'wb')
+        self._file.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(meta)) + meta)
+
+        self._slots = {}      # {player_id: slot}; slots are never reused within a file
+        self._next_slot = 0
+        self._held = {}       # {slot: axes byte} last recorded held input
+        self._last_tick = 0   # Tick of the previous record
+        self._pending = bytearray() # Records of the current tick, handed to the writer once per tick
+        self._queue = queue.SimpleQueue()
+        self._writer = threading.Thread(target=self._write_loop, name=f"replay writer {path}", daemon=True)
+        self._writer.start()
+        self.closed = False
+        atexit.register(self._close_at_exit) # Unregistered by close()
+
+    def _record(self, record_type, tick):
+        pending = self._pending
+        pending.append(record_type)
+        encode_varint(tick - self._last_tick, pending)
+        self._last_tick = tick
+        return pending
+
+    def join(self, tick, player_id, car_img_index):
+        slot = self._slots[player_id] = self._next_slot
+        self._next_slot += 1
+        self._held[slot] = HOLD_STILL
+        encoded_id = player_id.encode('utf-8')
+        pending = self._record(RECORD_JOIN, tick)
+        encode_varint(slot, pending)
+        encode_varint(car_img_index, pending)
+        pending.append(len(encoded_id))
+        pending += encoded_id
+
+    def leave(self, tick, player_id):
+        slot = self._slots.pop(player_id, None)
+        if slot is not None:
+            del self._held[slot]
+            encode_varint(slot, self._record(RECORD_LEAVE, tick))
+
+    def reset(self, tick, player_id):
+        slot = self._slots.get(player_id)
+        if slot is not None:
+            encode_varint(slot, self._record(RECORD_RESET, tick))
+
+    def record_tick(self, state, inputs):
+        """
+        Records the inputs about to be applied to `state` (only the ones that changed), and a
+        keyframe of `state` when one is due.
+        Args:
+            state (simulation.State or simulation.PooledGame): The game before the step. A
+                PooledGame is copied out as a State when a keyframe is due, since it changes in place.
+            inputs (dict): {player_id: (x_axis, y_axis)} passed to the step; missing players hold still.
+        """
+        tick = state.tick
+        held = self._held
+        for player_id, slot in self._slots.items():
+            x_axis, y_axis = inputs.get(player_id, (0, 0))
+            axes = (x_axis + 1) * 3 + (y_axis + 1) # encode_axes(), inlined
+            if axes != held[slot]:
+                held[slot] = axes
+                pending = self._record(RECORD_INPUT, tick)
+                encode_varint(slot, pending)
+                pending.append(axes)
+
+        if self._pending:
+            self._queue.put(bytes(self._pending))
+            self._pending.clear()
+        if tick % self.keyframe_interval == 0:
+            delta = tick - self._last_tick
+            self._last_tick = tick
+            if isinstance(state, simulation.PooledGame):
+                state = state.state()
+            self._queue.put((delta, state, dict(self._slots), dict(held))) # Encoded by the writer
+
+    def close(self, tick):
+        """Marks where the recording stopped and waits for the writer to finish the file."""
+        if self.closed:
+            return
+        self.closed = True
+        atexit.unregister(self._close_at_exit)
+        self._record(RECORD_END, tick)
+        self._queue.put(bytes(self._pending))
+        self._queue.put(None)
+        self._writer.join()
+
+    def _close_at_exit(self):
+        # The process is exiting without close(), e.g. after an uncaught exception: end the file
+        # at the last tick that has a record
+        self.close(self._last_tick)
+
+    def _write_loop(self):
+        write = self._file.write
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    break
+                if isinstance(item, bytes):
+                    write(item)
+                else:
+                    delta, state, slots, held = item
+                    payload = encode_keyframe(state, slots, held)
+                    record = bytearray([RECORD_KEYFRAME])
+                    encode_varint(delta, record)
+                    encode_varint(len(payload), record)
+                    write(record + payload)
+                if self._queue.empty():
+                    self._file.flush() # A crashed process loses at most what is still queued
+        except OSError as e:
+            print(f"Warning: replay {self.path} stopped recording: {e}")
+        finally:
+            self._file.close()
+
+
+# --- Playback ---
+class ReplayReader:
+    """
+    A memory-mapped replay file.
+    Usage:
+        replay = ReplayReader(path)
+        state = replay.seek(tick)     # simulation.State at that tick
+        replay.close()
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, meta_length = HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a version {FORMAT_VERSION} replay file")
+        self.meta = json.loads(self._map[HEADER.size:HEADER.size + meta_length])
+        rules = dict(self.meta['rules'])
+        rules['obstacle_offsets'] = tuple(rules['obstacle_offsets'])
+        self.rules = simulation.Rules(**rules)
+        self.seed = self.meta['seed']
+        self.tick_rate = self.meta['tick_rate']
+        self.records_offset = HEADER.size + meta_length
+        self.keyframe_ticks = [] # Ticks of the keyframes, ascending
+        self.keyframe_offsets = [] # File offset of each keyframe's payload (its length varint)
+        self.last_tick = 0
+        self.joins = 0           # Players who joined during the recording
+        self.finished = False    # False if the recording was cut off (e.g. the server was killed)
+        self._index()
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def _records(self, offset, tick):
+        """
+        Yields (tick, record type, payload offset) from `offset` on; keyframes are skipped over.
+        A record cut off at the end of the file ends the iteration.
+        """
+        data = self._map
+        end = len(data)
+        try:
+            while offset < end:
+                record_type = data[offset]
+                delta, payload = read_varint(data, offset + 1)
+                tick += delta
+                if record_type == RECORD_KEYFRAME:
+                    length, body = read_varint(data, payload)
+                    offset = body + length
+                elif record_type == RECORD_JOIN:
+                    offset = read_varint(data, read_varint(data, payload)[1])[1]
+                    offset += 1 + data[offset]
+                elif record_type == RECORD_INPUT:
+                    offset = read_varint(data, payload)[1] + 1
+                elif record_type in (RECORD_LEAVE, RECORD_RESET):
+                    offset = read_varint(data, payload)[1]
+                elif record_type == RECORD_END:
+                    offset = payload
+                else:
+                    raise ValueError(f"{self.path}: unknown record type {record_type} at offset {offset}")
+                if offset > end:
+                    return
+                yield tick, record_type, payload
+        except IndexError:
+            return # Truncated mid-record
+
+    def _index(self):
+        for tick, record_type, payload in self._records(self.records_offset, 0):
+            self.last_tick = tick
+            if record_type == RECORD_KEYFRAME:
+                self.keyframe_ticks.append(tick)
+                self.keyframe_offsets.append(payload)
+            elif record_type == RECORD_JOIN:
+                self.joins += 1
+            elif record_type == RECORD_END:
+                self.finished = True
+
+    def seek(self, tick):
+        """
+        Returns:
+            simulation.State: The game state at `tick` (clamped to the recording).
+        """
+        return self.states(tick, tick)[0]
+
+    def states(self, first_tick, last_tick, use_keyframes=True):
+        """
+        Simulates from the nearest keyframe at or before `first_tick` (or from the start of the
+        game when use_keyframes is False).
+        Returns:
+            list: The simulation.State of every tick from first_tick to last_tick (clamped).
+        """
+        first_tick = max(0, min(first_tick, self.last_tick))
+        last_tick = max(first_tick, min(last_tick, self.last_tick))
+        data = self._map
+        index = bisect.bisect_right(self.keyframe_ticks, first_tick) - 1 if use_keyframes else -1
+        if index >= 0:
+            start_tick = self.keyframe_ticks[index]
+            length, payload = read_varint(data, self.keyframe_offsets[index])
+            state, slots, held = decode_keyframe(data, payload, self.rules, self.seed, start_tick)
+            records = self._records(payload + length, start_tick)
+        else:
+            state, slots, held = simulation.new_game(self.seed, self.rules), {}, {}
+            records = self._records(self.records_offset, 0)
+
+        states = []
+        for record_tick, record_type, payload in records:
+            while state.tick < record_tick and state.tick < last_tick: # Nothing changes until the next record
+                if state.tick >= first_tick:
+                    states.append(state)
+                state = simulation.step(state, held)
+            if record_tick > last_tick or record_type == RECORD_END:
+                break
+            if record_type == RECORD_INPUT:
+                slot, payload = read_varint(data, payload)
+                held[slots[slot]] = decode_axes(data[payload])
+            elif record_type == RECORD_JOIN:
+                slot, payload = read_varint(data, payload)
+                car_img_index, payload = read_varint(data, payload)
+                player_id = bytes(data[payload + 1:payload + 1 + data[payload]]).decode('utf-8')
+                slots[slot] = player_id
+                held[player_id] = (0, 0)
+                state = simulation.add_player(state, player_id, car_img_index)
+            elif record_type == RECORD_LEAVE:
+                player_id = slots.pop(read_varint(data, payload)[0])
+                held.pop(player_id, None)
+                state = simulation.remove_player(state, player_id)
+            elif record_type == RECORD_RESET:
+                state = simulation.reset_player(state, slots[read_varint(data, payload)[0]])
+        while state.tick < last_tick:
+            if state.tick >= first_tick:
+                states.append(state)
+            state = simulation.step(state, held)
+        states.append(state)
+        return states
+
+    def verify(self):
+        """
+        Re-simulates the recording from its start and compares the result with every keyframe.
+        Returns:
+            list: Ticks of the keyframes the simulation did not reproduce (empty if it matches).
+        """
+        mismatches = []
+        for tick, offset in zip(self.keyframe_ticks, self.keyframe_offsets):
+            length, payload = read_varint(self._map, offset)
+            stored, _, _ = decode_keyframe(self._map, payload, self.rules, self.seed, tick)
+            replayed = self.states(tick, tick, use_keyframes=False)[0]
+            if simulation.checksum(replayed) != simulation.checksum(stored):
+                mismatches.append(tick)
+        return mismatches
+
+
+# --- Viewer ---
+def view(replay, start_tick=0):
+    """Plays a replay in a window. Left/right seek 5 seconds, space pauses, Esc quits."""
+    import pygame
+    from assets import Assets
+
+    pygame.init()
+    screen = pygame.display.set_mode((simulation.DISPLAY_W, simulation.DISPLAY_H))
+    pygame.display.set_caption(f"Watch Out replay: {os.path.basename(replay.path)}")
+    assets = Assets()
+    road = pygame.transform.scale(assets.image('road.jpg'), screen.get_size())
+    player_img, *obstacle_imgs = assets.cars()
+    font = pygame.font.SysFont(None, 25)
+    clock = pygame.time.Clock()
+    seek_ticks = 5 * replay.tick_rate
+
+    state = replay.seek(start_tick)
+    upcoming = [] # States of the next second, simulated in one go
+    playing = True
+    while True:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE):
+                pygame.quit()
+                return
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_SPACE:
+                    playing = not playing
+                elif event.key in (pygame.K_LEFT, pygame.K_RIGHT):
+                    direction = 1 if event.key == pygame.K_RIGHT else -1
+                    state = replay.seek(state.tick + direction * seek_ticks)
+                    upcoming = []
+        if playing and state.tick < replay.last_tick:
+            if not upcoming:
+                upcoming = replay.states(state.tick, state.tick + replay.tick_rate)[:0:-1] # Next first, at the end
+            state = upcoming.pop()
+
+        road_y = int(state.road_offset)
+        screen.blit(road, (0, road_y))
+        screen.blit(road, (0, road_y - simulation.DISPLAY_H))
+        for obstacle in state.obstacles:
+            screen.blit(obstacle_imgs[obstacle.img_index % len(obstacle_imgs)], (obstacle.x, obstacle.y))
+        for row, (player_id, player) in enumerate(state.players.items()):
+            screen.blit(player_img, (player.x, player.y))
+            label = f"{player_id}: SCORE {player.score}" + (" CRASHED!" if player.crashed else "")
+            screen.blit(font.render(label, True, (0, 0, 0)), (0, row * 30))
+        seconds = state.tick / replay.tick_rate
+        status = f"tick {state.tick}/{replay.last_tick}  {seconds:.1f} s" + ("" if playing else "  (paused)")
+        screen.blit(font.render(status, True, (0, 0, 0)), (0, simulation.DISPLAY_H - 25))
+        pygame.display.update()
+        clock.tick(replay.tick_rate)
+
+
+# --- Benchmark ---
+def bench(path, seconds, tick_rate, players):
+    """Records a bot session of `seconds` and reports the recording cost and the file size."""
+    rules = simulation.rules_for_tick_rate(simulation.MULTIPLAYER_RULES, tick_rate, 20)
+    state = simulation.new_game(1, rules)
+    bot = random.Random(1)
+    recorder = ReplayRecorder(path, state.seed, rules, tick_rate)
+    for number in range(1, players + 1):
+        player_id = f"player_{number}"
+        state = simulation.add_player(state, player_id, number % 5)
+        recorder.join(state.tick, player_id, number % 5)
+    inputs = {player_id: (0, 0) for player_id in state.players}
+    ticks = seconds * tick_rate
+    step_seconds = record_seconds = 0.0
+    for _ in range(ticks):
+        for player_id in inputs:
+            if bot.random() < 3 / tick_rate: # About three key changes per second per player
+                inputs[player_id] = simulation.BOT_DIRECTIONS[bot.randrange(len(simulation.BOT_DIRECTIONS))]
+            if state.players[player_id].crashed and bot.random() < 1 / tick_rate:
+                state = simulation.reset_player(state, player_id)
+                recorder.reset(state.tick, player_id)
+        started = time.perf_counter()
+        recorder.record_tick(state, inputs)
+        recorded = time.perf_counter()
+        state = simulation.step(state, inputs)
+        step_seconds += time.perf_counter() - recorded
+        record_seconds += recorded - started
+    recorder.close(state.tick)
+
+    size = os.path.getsize(path)
+    print(f"{ticks} ticks ({seconds} s at {tick_rate} ticks/s, {players} players): {size / 1024:.0f} KiB, "
+          f"recording {record_seconds / ticks * 1e6:.2f} us/tick vs step {step_seconds / ticks * 1e6:.2f} us/tick")
+    replay = ReplayReader(path)
+    started = time.perf_counter()
+    for tick in random.Random(2).sample(range(replay.last_tick), 20):
+        replay.seek(tick)
+    print(f"Random seek: {(time.perf_counter() - started) / 20 * 1000:.1f} ms, "
+          f"final state reproduced: {simulation.checksum(replay.seek(replay.last_tick)) == simulation.checksum(state)}")
+    replay.close()
+
+
+def summary(replay):
+    duration = replay.last_tick / replay.tick_rate
+    return (f"{replay.path}: seed {replay.seed}, {replay.last_tick} ticks ({duration:.1f} s at {replay.tick_rate} ticks/s), "
+            f"{len(replay.keyframe_ticks)} keyframes, {replay.joins} players joined"
+            + ("" if replay.finished else ", cut off"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect, verify and watch Watch Out replays")
+    parser.add_argument('file', nargs='?', help="Replay file (.wor)")
+    parser.add_argument('--tick', type=int, help="Seek to this tick and print the state")
+    parser.add_argument('--verify', action='store_true', help="Re-simulate the whole replay and compare every keyframe")
+    parser.add_argument('--view', action='store_true', help="Watch the replay in a window")
+    parser.add_argument('--bench', action='store_true', help="Record a bot session to FILE (default: a temporary file)")
+    parser.add_argument('--seconds', type=int, default=3600, help="Length of the --bench session")
+    parser.add_argument('--tick-rate', type=int, default=20, help="Tick rate of the --bench session")
+    parser.add_argument('--players', type=int, default=4, help="Players in the --bench session")
+    args = parser.parse_args()
+
+    if args.bench:
+        import tempfile
+        with tempfile.TemporaryDirectory() as directory:
+            bench(args.file or os.path.join(directory, 'bench.wor'), args.seconds, args.tick_rate, args.players)
+    elif not args.file:
+        parser.error("a replay file is needed unless --bench is given")
+    else:
+        replay = ReplayReader(args.file)
+        print(summary(replay))
+        if args.tick is not None:
+            started = time.perf_counter()
+            state = replay.seek(args.tick)
+            print(f"Tick {state.tick} (seek took {(time.perf_counter() - started) * 1000:.1f} ms), "
+                  f"checksum {simulation.checksum(state):016x}")
+            for player_id, player in state.players.items():
+                print(f"  {player_id}: x {player.x:.0f} y {player.y:.0f} score {player.score}"
+                      + (" crashed" if player.crashed else ""))
+        if args.verify:
+            mismatches = replay.verify()
+            print("Verified: every keyframe reproduced" if not mismatches else f"Mismatch at keyframe ticks {mismatches}")
+        if args.view:
+            view(replay, args.tick or 0)
+        replay.close()
@@ -0,0 +1,565 @@
+import argparse
+import random
+import time
+from collections import namedtuple
+
+# --- Simulation Core ---
+# The rules of Watch Out in one place, without pygame, shared by the single-player game, the
+# multiplayer server and headless tools. The whole world is one immutable State; the pure
+#
+#     state = step(state, inputs)
+#
+# returns the next tick's State and never modifies its arguments, so the same seed and the
+# same inputs always give the same game, on any machine.
+#
+# Randomness is counter-based: every random value is a hash of (seed, obstacle spawn number,
+# draw index), so obstacle number n looks the same whichever order or process generates it,
+# and the State carries no RNG object, only the seed and the number of obstacles spawned.
+# Obstacles and the road never depend on the players either, so anyone who knows the seed and
+# the rules can reproduce them for any tick by stepping a State without players.
+#
+# Immutability has a price in allocations: every tick builds a new State, a new obstacles
+# tuple and a new Obstacle for each obstacle that moved, and a respawn builds one more, so
+# allocations per tick grow with the obstacle count. PooledGame below plays the same rules
+# for one player on a preallocated pool of mutable obstacle records instead; the single-player
+# game runs on it, and SinglePlayer/main.py --soak checks that its frames allocate a flat
+# amount. Multiplayer/arrayworld.py does the same for rooms with NumPy arrays.
+#
+# step() runs five phases, in this order; the server calls them one by one to time each:
+#
+#   move_players -> move_obstacles -> respawn_and_score -> detect_collisions -> advance_road
+#
+# Run this file to benchmark it:
+#
+#     python shared/simulation.py --games 2000
+
+# --- Game Constants ---
+DISPLAY_W = 1320    # Width of the road (the game display)
+DISPLAY_H = 680     # Height of the road
+CAR_WIDTH = 77      # Width of the player car
+CAR_HEIGHT = 155    # Height of the player car (approximate)
+THING_WIDTH = 65    # Width of obstacle cars
+THING_HEIGHT = 130  # Height of obstacle cars
+START_X = DISPLAY_W * 0.45 # Where a player's car starts and restarts
+START_Y = DISPLAY_H * 0.7
+SPAWN_GAP = 10      # Minimum free space between obstacles when one is spawned
+SPAWN_LANE_ATTEMPTS = 8 # Lanes tried for a new obstacle before it is moved further up instead
+START_BAND = DISPLAY_H + THING_HEIGHT # Height above the screen the first obstacles are spread over
+
+Rules = namedtuple('Rules', [
+    'obstacle_offsets',      # How far above the screen each initial obstacle starts (also their count)
+    'obstacle_speed',        # Slowest obstacle speed (pixels per tick at speed_scale 1)
+    'obstacle_speed_spread', # Obstacles get 0..spread extra speed at random
+    'image_count',           # Obstacle images to choose from
+    'road_speed',            # Road scroll speed (pixels per tick at speed_scale 1)
+    'player_speed',          # Car speed while a direction is held (pixels per tick at speed_scale 1)
+    'crash_at_edges',        # True: leaving the screen is a crash; False: the car is held inside
+    'speed_scale',           # Factor on every speed, so tick rates other than the tuned one look the same
+])
+
+MULTIPLAYER_TICK_RATE = 20 # Tick rate the multiplayer rules' per-tick speeds were tuned for
+# The multiplayer server's rules, tuned for MULTIPLAYER_TICK_RATE ticks per second
+MULTIPLAYER_RULES = Rules(obstacle_offsets=(0, 200, 400), obstacle_speed=7, obstacle_speed_spread=5,
+                          image_count=5, road_speed=8, player_speed=15, crash_at_edges=False, speed_scale=1.0)
+# The single-player game's rules, tuned for 60 frames per second
+SINGLE_PLAYER_RULES = Rules(obstacle_offsets=(470, 670, 770), obstacle_speed=7, obstacle_speed_spread=6,
+                            image_count=5, road_speed=8, player_speed=5, crash_at_edges=True, speed_scale=1.0)
+
+Player = namedtuple('Player', ['x', 'y', 'score', 'crashed', 'car_img_index'])
+Obstacle = namedtuple('Obstacle', ['id', 'x', 'y', 'speed', 'img_index']) # id is the spawn number
+State = namedtuple('State', [
+    'rules',       # Rules of this game
+    'seed',        # Seed of every random value in the game
+    'tick',        # Ticks simulated so far
+    'road_offset', # Road scroll position, 0..DISPLAY_H
+    'spawned',     # Obstacles spawned so far (the next obstacle's spawn number is spawned + 1)
+    'players',     # {player_id: Player}, never mutated; each step builds a new dict
+    'obstacles',   # tuple of Obstacle; a respawned obstacle takes the slot of the one it replaces
+])
+
+_new = tuple.__new__ # Builds a namedtuple without its Python-level __new__; used on the hot path
+
+MASK64 = (1 << 64) - 1
+GOLDEN_GAMMA = 0x9E3779B97F4A7C15
+DRAWS_PER_SPAWN = 4 # Random values reserved per obstacle spawn (x, speed, image, one spare)
+
+
+def mix64(value):
+    """SplitMix64 finalizer: a well-mixed 64-bit hash of a 64-bit integer."""
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & MASK64
+    return value ^ (value >> 31)
+
+
+def random_draw(seed, spawn, draw):
+    """
+    Returns the `draw`-th random 64-bit value of obstacle spawn number `spawn`.
+    The same arguments always give the same value.
+    """
+    return mix64((seed + (spawn * DRAWS_PER_SPAWN + draw + 1) * GOLDEN_GAMMA) & MASK64)
+
+
+def rules_for_tick_rate(rules, tick_rate, base_tick_rate):
+    """Returns `rules` with speeds scaled so `tick_rate` moves things as fast on screen as `base_tick_rate`."""
+    return rules._replace(speed_scale=base_tick_rate / tick_rate)
+
+
+def clamp_to_screen(x, y):
+    """
+    Keeps a player car within screen bounds. Clients predicting their own car apply the same
+    clamp so prediction and server agree at the edges.
+    Returns:
+        tuple: The clamped (x, y).
+    """
+    return max(0, min(x, DISPLAY_W - CAR_WIDTH)), max(0, min(y, DISPLAY_H - CAR_HEIGHT))
+
+
+def rules_with_obstacles(rules, count):
+    """
+    Returns `rules` with `count` obstacles on the road at once (higher counts are harder).
+    Their first starts are spread evenly over START_BAND above the first one of `rules`.
+    """
+    first = rules.obstacle_offsets[0]
+    return rules._replace(obstacle_offsets=tuple(first + index * START_BAND // count for index in range(count)))
+
+
+def spawn_obstacle(rules, seed, spawn, y, obstacles=()):
+    """
+    Creates obstacle number `spawn` at height `y` or, if it would be in the way of one of
+    `obstacles` there, in another lane or further up. Its lane, speed and image depend only on
+    (seed, spawn) and the obstacles it has to avoid.
+    Returns:
+        Obstacle: The new obstacle.
+    """
+    x, y, speed = _free_spot(rules, seed, spawn, y, obstacles)
+    return Obstacle(spawn, x, y, speed, random_draw(seed, spawn, 2) % rules.image_count)
+
+
+def _free_spot(rules, seed, spawn, y, obstacles):
+    """Returns the (x, y, speed) spawn_obstacle() places obstacle `spawn` at; builds no lists."""
+    x = _spawn_lane(seed, spawn, 0)
+    speed = rules.obstacle_speed + random_draw(seed, spawn, 1) % (rules.obstacle_speed_spread + 1)
+    attempt = 0
+    while True:
+        top = slowest = None # Highest and slowest of the obstacles in the way
+        for other in obstacles:
+            if _in_the_way(x, y, speed, other):
+                if top is None:
+                    top, slowest = other.y, other.speed
+                else:
+                    top, slowest = min(top, other.y), min(slowest, other.speed)
+        if top is None:
+            return x, y, speed
+        attempt += 1
+        if attempt < SPAWN_LANE_ATTEMPTS:
+            x = _spawn_lane(seed, spawn, attempt) # Another lane
+        else:
+            # Queue up above the obstacles in the way, no faster than them. Every round moves it
+            # up or slows it down, so this ends.
+            y = min(y, top - THING_HEIGHT - SPAWN_GAP)
+            speed = min(speed, slowest)
+
+
+def spawn_lanes(seed, spawn):
+    """
+    Returns the x positions obstacle number `spawn` tries, in order: its own draw, then
+    SPAWN_LANE_ATTEMPTS - 1 others from the spare draw. If every one is blocked it stays in
+    the last and queues up. Only obstacles near one of these lanes can be in its way.
+    """
+    return tuple(_spawn_lane(seed, spawn, attempt) for attempt in range(SPAWN_LANE_ATTEMPTS))
+
+
+def _spawn_lane(seed, spawn, attempt):
+    lanes = DISPLAY_W - THING_WIDTH
+    if not attempt:
+        return random_draw(seed, spawn, 0) % lanes
+    return mix64((random_draw(seed, spawn, 3) + attempt) & MASK64) % lanes # From the spare draw
+
+
+def _in_the_way(x, y, speed, other):
+    """
+    True if an obstacle at (x, y) moving at `speed` would overlap `other` now, or would catch
+    up with it (or be caught up) before the lower one of the two has left the screen.
+    """
+    if abs(x - other.x) >= THING_WIDTH + SPAWN_GAP:
+        return False # Different lanes never meet
+    if y <= other.y:
+        upper_y, upper_speed, lower_y, lower_speed = y, speed, other.y, other.speed
+    else:
+        upper_y, upper_speed, lower_y, lower_speed = other.y, other.speed, y, speed
+    gap = lower_y - upper_y - THING_HEIGHT
+    if gap < SPAWN_GAP:
+        return True
+    closing = upper_speed - lower_speed
+    # Ticks until the gap is closed, against ticks until the lower one is off the screen
+    return closing > 0 and gap / closing < (DISPLAY_H - lower_y) / lower_speed
+
+
+def new_game(seed=None, rules=MULTIPLAYER_RULES):
+    """
+    Creates the state of a new game without players.
+    Args:
+        seed (int, optional): Seed of the game; a random one is chosen when omitted.
+        rules (Rules): The rules to play by.
+    Returns:
+        State: The initial state.
+    """
+    if seed is None:
+        seed = random.getrandbits(64)
+    obstacles = []
+    for spawn, offset in enumerate(rules.obstacle_offsets, 1):
+        obstacles.append(spawn_obstacle(rules, seed, spawn, -THING_HEIGHT - offset, obstacles))
+    return State(rules, seed, 0, 0, len(obstacles), {}, tuple(obstacles))
+
+
+# --- Players ---
+def add_player(state, player_id, car_img_index=0):
+    """Returns `state` with a new player at the start position."""
+    players = dict(state.players)
+    players[player_id] = Player(START_X, START_Y, 0, False, car_img_index)
+    return state._replace(players=players)
+
+
+def remove_player(state, player_id):
+    players = dict(state.players)
+    players.pop(player_id, None)
+    return state._replace(players=players)
+
+
+def reset_player(state, player_id):
+    """Returns `state` with the player back at the start, uncrashed and with a zero score."""
+    player = state.players.get(player_id)
+    if player is None:
+        return state
+    players = dict(state.players)
+    players[player_id] = player._replace(x=START_X, y=START_Y, score=0, crashed=False)
+    return state._replace(players=players)
+
+
+# --- Tick Phases ---
+# Each phase exists twice: a public function from State to State, which the server calls to
+# time the phases one by one, and a private one on the parts of the State it changes, which
+# step() chains so that one tick builds a single new State.
+def move_players(state, inputs):
+    """
+    Moves every car that has not crashed by its held input.
+    Args:
+        inputs (dict): {player_id: (x_axis, y_axis)}, each axis -1, 0 or 1; missing players hold still.
+    """
+    players = _move_players(state.rules, state.players, inputs)
+    return state if players is state.players else state._replace(players=players)
+
+
+def move_obstacles(state):
+    return state._replace(obstacles=_move_obstacles(state.rules.speed_scale, state.obstacles))
+
+
+def respawn_and_score(state):
+    """
+    Replaces every obstacle that left the bottom of the screen with a new one above the
+    screen, and gives every player still racing one point per obstacle passed.
+    """
+    spawned, players, obstacles = _respawn_and_score(state.rules, state.seed, state.spawned, state.players, state.obstacles)
+    return state._replace(spawned=spawned, players=players, obstacles=obstacles)
+
+
+def detect_collisions(state, candidates=None):
+    """
+    Marks every racing player whose car overlaps an obstacle as crashed.
+    Args:
+        candidates (callable, optional): candidates(x, y, w, h) returns the obstacles that may
+            overlap a box (a broadphase). Every obstacle is tested when omitted.
+    """
+    players = _detect_collisions(state.players, state.obstacles, candidates)
+    return state if players is state.players else state._replace(players=players)
+
+
+def advance_road(state):
+    """Scrolls the road and counts the tick."""
+    return state._replace(tick=state.tick + 1, road_offset=_advance_road(state.rules, state.road_offset))
+
+
+def step(state, inputs):
+    """
+    Advances the game by one tick.
+    Args:
+        state (State): The current state (left unchanged).
+        inputs (dict): {player_id: (x_axis, y_axis)} held during this tick.
+    Returns:
+        State: The state one tick later.
+    """
+    rules = state.rules
+    players = _move_players(rules, state.players, inputs)
+    obstacles = _move_obstacles(rules.speed_scale, state.obstacles)
+    spawned, players, obstacles = _respawn_and_score(rules, state.seed, state.spawned, players, obstacles)
+    players = _detect_collisions(players, obstacles, None)
+    return _new(State, (rules, state.seed, state.tick + 1, _advance_road(rules, state.road_offset), spawned, players, obstacles))
+
+
+def _move_players(rules, players, inputs):
+    step = rules.player_speed * rules.speed_scale
+    moved = None # Copied on the first car that moves; most ticks most cars hold still
+    for player_id, (x_axis, y_axis) in inputs.items():
+        player = players.get(player_id)
+        if player is None or player.crashed or not (x_axis or y_axis):
+            continue
+        x = player.x + x_axis * step
+        y = player.y + y_axis * step
+        crashed = False
+        if not rules.crash_at_edges:
+            x, y = clamp_to_screen(x, y)
+        elif x < 0 or x > DISPLAY_W - CAR_WIDTH or y < 0 or y > DISPLAY_H:
+            crashed = True # Drove off the road
+        if moved is None:
+            moved = dict(players)
+        moved[player_id] = _new(Player, (x, y, player.score, crashed, player.car_img_index))
+    return players if moved is None else moved
+
+
+def _move_obstacles(scale, obstacles):
+    return tuple([_new(Obstacle, (obstacle_id, x, y + speed * scale, speed, img_index))
+                  for obstacle_id, x, y, speed, img_index in obstacles])
+
+
+def _respawn_and_score(rules, seed, spawned, players, obstacles):
+    passed = 0
+    for obstacle in obstacles:
+        if obstacle.y > DISPLAY_H:
+            passed += 1
+    if not passed:
+        return spawned, players, obstacles
+    # Replaced in place, so each new obstacle avoids the ones on the road, including the ones
+    # spawned before it in this tick
+    respawned = list(obstacles)
+    for slot, obstacle in enumerate(obstacles):
+        if obstacle.y > DISPLAY_H:
+            spawned += 1
+            respawned[slot] = spawn_obstacle(rules, seed, spawned, -THING_HEIGHT, respawned)
+    players = {
+        player_id: player if player.crashed else player._replace(score=player.score + passed)
+        for player_id, player in players.items()
+    }
+    return spawned, players, tuple(respawned)
+
+
+def overlaps(player, obstacle):
+    """Axis-aligned bounding box test between a player car and an obstacle."""
+    return (player.x < obstacle.x + THING_WIDTH and
+            player.x + CAR_WIDTH > obstacle.x and
+            player.y < obstacle.y + THING_HEIGHT and
+            player.y + CAR_HEIGHT > obstacle.y)
+
+
+def _detect_collisions(players, obstacles, candidates):
+    crashed = []
+    for player_id, player in players.items():
+        if player.crashed:
+            continue
+        x, y = player.x, player.y
+        nearby = candidates(x, y, CAR_WIDTH, CAR_HEIGHT) if candidates else obstacles
+        for obstacle in nearby:
+            # overlaps(), inlined: this is the innermost loop of every tick
+            if (x < obstacle.x + THING_WIDTH and x + CAR_WIDTH > obstacle.x and
+                    y < obstacle.y + THING_HEIGHT and y + CAR_HEIGHT > obstacle.y):
+                crashed.append(player_id)
+                break
+    if not crashed:
+        return players
+    players = dict(players)
+    for player_id in crashed:
+        players[player_id] = players[player_id]._replace(crashed=True)
+    return players
+
+
+def _advance_road(rules, road_offset):
+    return (road_offset + rules.road_speed * rules.speed_scale) % DISPLAY_H
+
+
+def new_crashes(before, after):
+    """Returns the ids of the players who crashed between two states."""
+    return [player_id for player_id, player in after.players.items()
+            if player.crashed and not (player_id in before.players and before.players[player_id].crashed)]
+
+
+def checksum(state):
+    """
+    Returns a 64-bit hash of everything that determines the game's future (positions rounded
+    to whole pixels), to compare two runs or two machines cheaply.
+    """
+    value = obstacle_checksum(state.seed, state.tick, state.obstacles)
+    for player_id in sorted(state.players):
+        player = state.players[player_id]
+        for field in (int(player.x), int(player.y), player.score, int(player.crashed)):
+            value = mix64(value ^ (field & MASK64))
+    return value
+
+
+def obstacle_checksum(seed, tick, obstacles):
+    """
+    Returns a 64-bit hash of the obstacles at `tick` (positions rounded to whole pixels). The
+    obstacles follow from the seed and the tick alone, so two machines simulating the same
+    match must agree on it; checksum() continues from this value with the players.
+    """
+    return checksum_fields(mix64(seed ^ tick), (
+        field for obstacle in obstacles
+        for field in (obstacle.id, int(obstacle.x), int(obstacle.y), obstacle.speed, obstacle.img_index)))
+
+
+def checksum_fields(value, fields):
+    """Continues the 64-bit hash `value` with integer `fields`, in order (one mix64 per field)."""
+    for field in fields:
+        value = mix64(value ^ (field & MASK64))
+    return value
+
+
+# --- Pooled Game ---
+# step() builds a new State, obstacles tuple and Obstacle per obstacle every tick. The single-
+# player game runs its one player on a PooledGame instead: the same rules, with the obstacles
+# held in a pool of mutable Obstacle-like records that is allocated once and moved and
+# respawned in place, so a frame allocates no containers whatever the obstacle count (only
+# the float positions are new objects). state() copies it out as a State for replays and
+# checksums; stepping a PooledGame gives exactly the States step() gives.
+
+class PooledObstacle:
+    """One reusable obstacle slot; has the fields of Obstacle, but they change in place."""
+    __slots__ = ('id', 'x', 'y', 'speed', 'img_index')
+
+    def __init__(self, obstacle):
+        self.id, self.x, self.y, self.speed, self.img_index = obstacle
+
+
+class PooledGame:
+    """
+    A one-player game stepped in place.
+    Usage:
+        game = PooledGame(add_player(new_game(seed, rules), player_id), player_id)
+        game.step(x_axis, y_axis)   # then read game.x, game.y, game.score, game.crashed, game.obstacles
+        state = game.state()
+    """
+    __slots__ = ('rules', 'seed', 'tick', 'road_offset', 'spawned', 'obstacles',
+                 'player_id', 'x', 'y', 'score', 'crashed', 'car_img_index')
+
+    def __init__(self, state, player_id):
+        """
+        Args:
+            state (State): The game to continue; must have exactly the one player.
+            player_id (str): That player's ID.
+        """
+        self.rules, self.seed, self.tick, self.road_offset, self.spawned = state[:5]
+        self.obstacles = tuple(PooledObstacle(obstacle) for obstacle in state.obstacles) # The pool
+        self.player_id = player_id
+        self.x, self.y, self.score, self.crashed, self.car_img_index = state.players[player_id]
+
+    def state(self):
+        """Returns the game as a State (a copy; later steps leave it unchanged)."""
+        player = Player(self.x, self.y, self.score, self.crashed, self.car_img_index)
+        obstacles = tuple(Obstacle(obstacle.id, obstacle.x, obstacle.y, obstacle.speed, obstacle.img_index)
+                          for obstacle in self.obstacles)
+        return State(self.rules, self.seed, self.tick, self.road_offset, self.spawned,
+                     {self.player_id: player}, obstacles)
+
+    def step(self, x_axis, y_axis):
+        """Advances the game by one tick with the player holding (x_axis, y_axis); same as step()."""
+        rules = self.rules
+        scale = rules.speed_scale
+        if not self.crashed and (x_axis or y_axis): # _move_players()
+            step = rules.player_speed * scale
+            x = self.x + x_axis * step
+            y = self.y + y_axis * step
+            if not rules.crash_at_edges:
+                x = max(0, min(x, DISPLAY_W - CAR_WIDTH)) # clamp_to_screen(), inlined
+                y = max(0, min(y, DISPLAY_H - CAR_HEIGHT))
+            elif x < 0 or x > DISPLAY_W - CAR_WIDTH or y < 0 or y > DISPLAY_H:
+                self.crashed = True # Drove off the road
+            self.x, self.y = x, y
+
+        obstacles = self.obstacles
+        passed = 0
+        for obstacle in obstacles: # _move_obstacles()
+            obstacle.y += obstacle.speed * scale
+            if obstacle.y > DISPLAY_H:
+                passed += 1
+        if passed: # _respawn_and_score(): each slot is refilled in place, in slot order
+            for obstacle in obstacles:
+                if obstacle.y > DISPLAY_H:
+                    self.spawned += 1
+                    spawn = obstacle.id = self.spawned
+                    obstacle.x, obstacle.y, obstacle.speed = _free_spot(rules, self.seed, spawn, -THING_HEIGHT, obstacles)
+                    obstacle.img_index = random_draw(self.seed, spawn, 2) % rules.image_count
+            if not self.crashed:
+                self.score += passed
+
+        if not self.crashed: # _detect_collisions()
+            x, y = self.x, self.y
+            for obstacle in obstacles:
+                if (x < obstacle.x + THING_WIDTH and x + CAR_WIDTH > obstacle.x and
+                        y < obstacle.y + THING_HEIGHT and y + CAR_HEIGHT > obstacle.y):
+                    self.crashed = True
+                    break
+
+        self.road_offset = _advance_road(rules, self.road_offset)
+        self.tick += 1
+
+
+# --- Benchmark ---
+BOT_DIRECTIONS = tuple((x_axis, y_axis) for x_axis in (-1, 0, 1) for y_axis in (-1, 0, 1))
+BOT_HOLD_TICKS = 10 # Ticks the benchmark bot holds each direction
+
+
+def play_headless(seed, rules, max_ticks, bot_seed=0, pooled=False):
+    """
+    Plays one single-player game with a random held-input bot until it crashes.
+    Args:
+        pooled (bool): Step a PooledGame instead of calling step().
+    Returns:
+        State: The final state.
+    """
+    bot = random.Random(bot_seed)
+    state = add_player(new_game(seed, rules), 'player_1')
+    if pooled:
+        game = PooledGame(state, 'player_1')
+        x_axis = y_axis = 0
+        while game.tick < max_ticks and not game.crashed:
+            if not game.tick % BOT_HOLD_TICKS:
+                x_axis, y_axis = BOT_DIRECTIONS[bot.randrange(len(BOT_DIRECTIONS))]
+            game.step(x_axis, y_axis)
+        return game.state()
+    inputs = {'player_1': (0, 0)}
+    while state.tick < max_ticks and not state.players['player_1'].crashed:
+        if not state.tick % BOT_HOLD_TICKS: # Pick a new held direction now and then
+            inputs = {'player_1': BOT_DIRECTIONS[bot.randrange(len(BOT_DIRECTIONS))]}
+        state = step(state, inputs)
+    return state
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the headless simulation core")
+    parser.add_argument('--games', type=int, default=2000, help="Games to play")
+    parser.add_argument('--max-ticks', type=int, default=3600, help="Ticks after which a game is stopped")
+    parser.add_argument('--rules', choices=('single', 'multi'), default='single', help="Rule set")
+    parser.add_argument('--obstacles', type=int, help="Obstacles on the road at once (default: as in the rule set)")
+    parser.add_argument('--pooled', action='store_true',
+                        help="Play on PooledGame instead of step(), and check both end every game alike")
+    args = parser.parse_args()
+    rules = SINGLE_PLAYER_RULES if args.rules == 'single' else MULTIPLAYER_RULES
+    if args.obstacles:
+        rules = rules_with_obstacles(rules, args.obstacles)
+
+    started = time.perf_counter()
+    ticks = 0
+    checksums = []
+    for game in range(args.games):
+        state = play_headless(game, rules, args.max_ticks, bot_seed=game, pooled=args.pooled)
+        ticks += state.tick
+        checksums.append(checksum(state))
+    elapsed = time.perf_counter() - started
+    print(f"{args.games} games, {ticks} ticks in {elapsed:.2f} s: "
+          f"{args.games / elapsed:.0f} games/s, {ticks / elapsed:.0f} ticks/s")
+
+    # Determinism: replaying the same seeds must end in exactly the same states
+    replayed = [checksum(play_headless(game, rules, args.max_ticks, bot_seed=game)) for game in range(min(args.games, 100))]
+    print("Deterministic:", replayed == checksums[:len(replayed)])
+    if args.pooled:
+        stepped = [checksum(play_headless(game, rules, args.max_ticks, bot_seed=game, pooled=False))
+                   for game in range(args.games)]
+        print("PooledGame matches step():", stepped == checksums)